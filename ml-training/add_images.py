@@ -6,12 +6,20 @@ Helps organize and add images to the correct disease class directories
 """
 
 import os
-import shutil
 from pathlib import Path
 import argparse
 
-def add_images_to_class(class_name, source_dir, target_count=None):
-    """Add images to a specific disease class directory"""
+from config import PREPROCESSING_CONFIG
+from ingest import ingest_archive, ingest_files, is_archive
+
+def add_images_to_class(class_name, source_dir, target_count=None, keep_format=False, num_workers=None):
+    """
+    Add images to a specific disease class directory
+    source_dir may be a directory or a zip/tar(.gz) archive, which is
+    streamed without extraction. Images are ingested in bulk as one
+    transaction (see ingest.py): either all selected images are added under
+    fresh names or none are.
+    """
     print(f"📁 Adding images to {class_name}...")
     
     # Validate class name
@@ -33,9 +41,12 @@ def add_images_to_class(class_name, source_dir, target_count=None):
     # Create class directory if it doesn't exist
     class_dir.mkdir(parents=True, exist_ok=True)
     
-    # Check if source directory exists
+    # Check if source exists
     if not source_path.exists():
-        print(f"❌ Source directory not found: {source_path}")
+        print(f"❌ Source not found: {source_path}")
+        return False
+    if source_path.is_file() and not is_archive(source_path):
+        print(f"❌ Source is neither a directory nor a zip/tar archive: {source_path}")
         return False
     
     # Get existing images in target directory
@@ -44,42 +55,47 @@ def add_images_to_class(class_name, source_dir, target_count=None):
     
     print(f"  📊 Current images in {class_name}: {current_count}")
     
-    # Find next available number
-    next_number = current_count + 1
-    
-    # Get all image files from source
-    image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']
-    source_images = []
-    for ext in image_extensions:
-        source_images.extend(source_path.glob(ext))
-    
-    if not source_images:
-        print(f"❌ No image files found in {source_path}")
-        return False
-    
-    print(f"  📸 Found {len(source_images)} images in source directory")
-    
-    # Copy images
-    copied_count = 0
-    for img_path in source_images:
-        if target_count and copied_count >= target_count:
-            break
+    # Validate, hash, dedupe and place everything as one transaction
+    try:
+        if is_archive(source_path):
+            print(f"  📦 Streaming images from archive {source_path.name}")
+            summary = ingest_archive(
+                class_name, source_path, data_dir=data_dir, limit=target_count,
+                keep_format=keep_format, num_workers=num_workers
+            )
+        else:
+            # Get all image files from source
+            valid_extensions = {ext.lower() for ext in PREPROCESSING_CONFIG['valid_extensions']}
+            source_images = sorted(
+                path for path in source_path.iterdir()
+                if path.is_file() and path.suffix.lower() in valid_extensions
+            )
             
-        # Create new filename
-        new_filename = f"{class_name}_{next_number:03d}.jpg"
-        new_path = class_dir / new_filename
-        
-        try:
-            # Copy file
-            shutil.copy2(img_path, new_path)
-            print(f"  ✅ Copied: {img_path.name} -> {new_filename}")
-            next_number += 1
-            copied_count += 1
+            if not source_images:
+                print(f"❌ No image files found in {source_path}")
+                return False
             
-        except Exception as e:
-            print(f"  ❌ Error copying {img_path.name}: {e}")
+            print(f"  📸 Found {len(source_images)} images in source directory")
+            summary = ingest_files(
+                class_name, source_images, data_dir=data_dir, limit=target_count,
+                keep_format=keep_format, num_workers=num_workers
+            )
+    except KeyboardInterrupt:
+        print(f"\n  ⏹️  Ingest interrupted - nothing was added to {class_name}")
+        return False
+    
+    for src, error in summary['failed']:
+        print(f"  ❌ Error adding {Path(src).name}: {error}")
+    for src, new_filename in summary['added']:
+        print(f"  ✅ Added: {Path(src).name} -> {new_filename}")
     
+    copied_count = len(summary['added'])
     print(f"  🎉 Successfully added {copied_count} images to {class_name}")
+    if summary['transcoded']:
+        print(f"  🔄 Transcoded {summary['transcoded']} image(s) to JPEG")
+    if summary['duplicates']:
+        print(f"  ♻️  Skipped {summary['duplicates']} duplicate(s) "
+              f"({summary['duplicate_bytes'] / (1024 * 1024):.1f} MB saved)")
     print(f"  📊 Total images in {class_name}: {current_count + copied_count}")
     
     return True
@@ -167,7 +183,7 @@ def interactive_mode():
                 continue
             
             # Get source directory
-            source_dir = input("Enter path to source images directory: ").strip()
+            source_dir = input("Enter path to source images directory or archive: ").strip()
             if not source_dir:
                 print("❌ No source directory provided")
                 continue
@@ -198,8 +214,15 @@ def main():
     """Main function"""
     parser = argparse.ArgumentParser(description='Add images to GingerlyAI dataset')
     parser.add_argument('--class', dest='class_name', help='Disease class name')
-    parser.add_argument('--source', help='Source directory containing images')
+    parser.add_argument('--source', help='Source directory or zip/tar archive containing images')
     parser.add_argument('--count', type=int, help='Number of images to add')
+    parser.add_argument('--keep-format', action='store_true',
+                        help='Keep BMP/TIFF/WebP files as-is instead of transcoding them to JPEG')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for hashing/copying (default: PREPROCESSING_CONFIG)')
+    parser.add_argument('--watch', action='store_true',
+                        help='Continuously ingest images dropped into data/inbox/<class> (see ingest_watch.py)')
+    parser.add_argument('--once', action='store_true', help='With --watch: drain the inboxes and exit')
     parser.add_argument('--interactive', '-i', action='store_true', help='Run in interactive mode')
     parser.add_argument('--status', '-s', action='store_true', help='Show dataset status')
     
@@ -207,16 +230,21 @@ def main():
     
     if args.status:
         list_dataset_status()
+    elif args.watch:
+        from ingest_watch import InboxWatcher
+        InboxWatcher(keep_format=args.keep_format, num_workers=args.workers).run(until_empty=args.once)
     elif args.interactive:
         interactive_mode()
     elif args.class_name and args.source:
-        add_images_to_class(args.class_name, args.source, args.count)
+        add_images_to_class(args.class_name, args.source, args.count, args.keep_format, args.workers)
     else:
         print("🔍 GingerlyAI Image Addition Tool")
         print("=" * 50)
         print("Usage:")
         print("  python add_images.py --class healthy --source /path/to/images")
+        print("  python add_images.py --class healthy --source /path/to/batch.zip")
         print("  python add_images.py --interactive")
+        print("  python add_images.py --watch")
         print("  python add_images.py --status")
         print("\nFor help: python add_images.py --help")
 
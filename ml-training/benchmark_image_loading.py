@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark and numeric check for reduced-resolution JPEG decoding
+Compares the original loader (full cv2.imread + cv2.resize) with
+imread_reduced + cv2.resize on the same files: decode time, and how far the
+final target-size pixels drift from the original path and from an
+INTER_AREA resize of the full-resolution image.
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config import *
+from image_loading import imread_reduced, load_rgb
+
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def create_phone_photos(output_dir, count=8, size=(4032, 3024), seed=42):
+    """Synthetic 12MP JPEGs with smooth, leaf-like structure"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    paths = []
+    for i in range(count):
+        # Upsampled low-frequency noise plus a little sensor-like grain
+        base = rng.integers(0, 256, (height // 64, width // 64, 3), dtype=np.uint8)
+        image = cv2.resize(base, (width, height), interpolation=cv2.INTER_CUBIC)
+        grain = rng.normal(0, 4, image.shape)
+        image = np.clip(image + grain, 0, 255).astype(np.uint8)
+        path = Path(output_dir) / f"photo_{i:03d}.jpg"
+        cv2.imwrite(str(path), image, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        paths.append(path)
+    return paths
+
+
+def time_loader(loader, paths, repeats):
+    """Best-of-repeats wall time for loading every path once"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for path in paths:
+            loader(path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(paths, target_size, repeats=3, min_psnr=30.0):
+    """Print timings and pixel agreement; returns True when the check passes"""
+    def original(path):
+        return cv2.resize(cv2.imread(str(path)), target_size)
+
+    def reduced(path):
+        return cv2.resize(imread_reduced(path, target_size, reduced=True), target_size)
+
+    def reduced_pil(path):
+        return cv2.resize(load_rgb(path, target_size, reduced=True), target_size)
+
+    print(f"⏱️  Decoding {len(paths)} images to {target_size[0]}x{target_size[1]} (best of {repeats})")
+    timings = {
+        'cv2.imread + resize': time_loader(original, paths, repeats),
+        'imread_reduced + resize': time_loader(reduced, paths, repeats),
+        'load_rgb (PIL draft) + resize': time_loader(reduced_pil, paths, repeats),
+    }
+    baseline = timings['cv2.imread + resize']
+    for name, seconds in timings.items():
+        print(f"  {name:<32} {seconds / len(paths) * 1000:8.1f} ms/image  ({baseline / seconds:.1f}x)")
+
+    print("\n🔬 Pixel agreement at target size")
+    vs_original, vs_area_original, vs_area_reduced = [], [], []
+    max_abs_diff = 0
+    for path in paths:
+        full = cv2.imread(str(path))
+        area = cv2.resize(full, target_size, interpolation=cv2.INTER_AREA)
+        before, after = original(path), reduced(path)
+        vs_original.append(psnr(before, after))
+        vs_area_original.append(psnr(before, area))
+        vs_area_reduced.append(psnr(after, area))
+        max_abs_diff = max(max_abs_diff, int(np.abs(before.astype(np.int16) - after.astype(np.int16)).max()))
+
+    print(f"  reduced vs original path:    PSNR {np.mean(vs_original):6.2f} dB (max abs diff {max_abs_diff})")
+    print(f"  original vs INTER_AREA:      PSNR {np.mean(vs_area_original):6.2f} dB")
+    print(f"  reduced vs INTER_AREA:       PSNR {np.mean(vs_area_reduced):6.2f} dB")
+
+    passed = np.min(vs_original) >= min_psnr
+    if passed:
+        print(f"\n✅ Reduced decoding stays within {min_psnr:.0f} dB PSNR of the original path")
+    else:
+        print(f"\n❌ Reduced decoding drifts below {min_psnr:.0f} dB PSNR (worst {np.min(vs_original):.2f} dB)")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reduced-resolution JPEG decoding")
+    parser.add_argument('image_dir', nargs='?', help="Directory of JPEGs (default: synthetic 12MP photos)")
+    parser.add_argument('--limit', type=int, default=32, help="Maximum number of images to load")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--min-psnr', type=float, default=30.0, help="Fail below this PSNR vs the original path")
+    args = parser.parse_args()
+
+    target_size = (TRAINING_CONFIG['img_width'], TRAINING_CONFIG['img_height'])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.image_dir:
+            paths = sorted(
+                path for path in Path(args.image_dir).rglob('*')
+                if path.suffix.lower() in ('.jpg', '.jpeg')
+            )[:args.limit]
+        else:
+            print("🎨 No image directory given, generating synthetic 12MP photos...")
+            paths = create_phone_photos(tmp_dir, count=min(args.limit, 8))
+
+        if not paths:
+            print("❌ No JPEG images found")
+            return 1
+        return 0 if run_benchmark(paths, target_size, args.repeats, args.min_psnr) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+"""
+Wall-clock time to a target validation accuracy for each lr_schedule
+Trains the CNN of cnn_model_training.py once per schedule from the same
+seed and data, with the callbacks the trainer uses (EarlyStopping, plus
+ReduceLROnPlateau for 'constant'). The target defaults to the best
+validation accuracy of the 'constant' run, i.e. what training reaches
+today. Results are written to LOGS_DIR/lr_schedule_benchmark.json.
+
+    python benchmark_lr_schedules.py
+    python benchmark_lr_schedules.py --synthetic --img-size 64 --steps-per-epoch 30 --eval-steps 10 \
+        --epochs 24 --schedule-epochs 8 --patience 6 --reduce-lr-patience 3 --max-lr 1.8e-3
+"""
+
+import json
+import time
+import argparse
+from pathlib import Path
+
+from tensorflow import keras
+
+from config import TRAINING_CONFIG, LOGS_DIR, PROCESSED_DATASET_PATH
+from lr_schedule import SCHEDULES, training_epochs, uses_schedule, describe_learning_rate
+from cnn_model_training import CNNGingerDiseaseModel
+
+
+class EpochTimer(keras.callbacks.Callback):
+    """Wall-clock seconds since the start of fit() at the end of every epoch"""
+
+    def on_train_begin(self, logs=None):
+        self.start = time.perf_counter()
+        self.elapsed = []
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.elapsed.append(time.perf_counter() - self.start)
+
+
+def run_schedule(schedule, data_dir, seed):
+    """Train one model with TRAINING_CONFIG['lr_schedule'] = schedule; per-epoch history and timings"""
+    TRAINING_CONFIG['lr_schedule'] = schedule
+    keras.utils.set_random_seed(seed)
+
+    trainer = CNNGingerDiseaseModel()
+    train_gen, val_gen, _ = trainer.create_data_generators(data_dir / 'train', data_dir / 'validation',
+                                                           data_dir / 'test')
+    model = trainer.compile_model(trainer.create_cnn_model(), steps_per_epoch=len(train_gen))
+
+    timer = EpochTimer()
+    callbacks_list = [
+        keras.callbacks.EarlyStopping(monitor='val_accuracy', patience=TRAINING_CONFIG['early_stopping_patience']),
+        timer,
+    ]
+    if not uses_schedule():
+        callbacks_list.insert(1, keras.callbacks.ReduceLROnPlateau(
+            monitor='val_loss',
+            factor=TRAINING_CONFIG['reduce_lr_factor'],
+            patience=TRAINING_CONFIG['reduce_lr_patience'],
+            min_lr=TRAINING_CONFIG['min_lr']
+        ))
+
+    print(f"🏃 {schedule}: up to {training_epochs()} epochs, learning rate {describe_learning_rate()}")
+    history = model.fit(train_gen, epochs=training_epochs(), validation_data=val_gen, callbacks=callbacks_list,
+                        verbose=0)
+    return {
+        'schedule': schedule,
+        'epochs': len(timer.elapsed),
+        'val_accuracy': [float(value) for value in history.history['val_accuracy']],
+        'seconds': timer.elapsed,
+    }
+
+
+def time_to_target(run, target):
+    """(epoch, seconds) when val_accuracy first reached target, or (None, None)"""
+    for epoch, (accuracy, seconds) in enumerate(zip(run['val_accuracy'], run['seconds']), start=1):
+        if accuracy >= target:
+            return epoch, seconds
+    return None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare lr_schedule options by time to a target accuracy')
+    parser.add_argument('--data-dir', type=Path, default=PROCESSED_DATASET_PATH,
+                        help='Split directory with train/validation/test')
+    parser.add_argument('--synthetic', action='store_true', help='Train and validate on rendered images only')
+    parser.add_argument('--schedules', nargs='+', choices=SCHEDULES, default=list(SCHEDULES))
+    parser.add_argument('--target', type=float, default=None,
+                        help="Validation accuracy to reach (default: best of the 'constant' run)")
+    parser.add_argument('--epochs', type=int, default=None, help="Epoch budget of 'constant'")
+    parser.add_argument('--schedule-epochs', type=int, default=None, help='Length of the scheduled runs')
+    parser.add_argument('--max-lr', type=float, default=None, help='Peak learning rate of the scheduled runs')
+    parser.add_argument('--img-size', type=int, default=None, help='Train at a smaller image size')
+    parser.add_argument('--steps-per-epoch', type=int, default=None,
+                        help='Training batches per epoch with --synthetic')
+    parser.add_argument('--eval-steps', type=int, default=None, help='Validation batches with --synthetic')
+    parser.add_argument('--patience', type=int, default=None, help='EarlyStopping patience')
+    parser.add_argument('--reduce-lr-patience', type=int, default=None,
+                        help="ReduceLROnPlateau patience of 'constant'")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        TRAINING_CONFIG['synthetic_ratio'] = 1.0
+    if args.epochs:
+        TRAINING_CONFIG['epochs'] = args.epochs
+    if args.schedule_epochs:
+        TRAINING_CONFIG['schedule_epochs'] = args.schedule_epochs
+    if args.max_lr:
+        TRAINING_CONFIG['max_learning_rate'] = args.max_lr
+    if args.img_size:
+        TRAINING_CONFIG['img_height'] = TRAINING_CONFIG['img_width'] = args.img_size
+    if args.steps_per_epoch:
+        TRAINING_CONFIG['synthetic_steps_per_epoch'] = args.steps_per_epoch
+    if args.eval_steps:
+        TRAINING_CONFIG['synthetic_eval_steps'] = args.eval_steps
+    if args.patience:
+        TRAINING_CONFIG['early_stopping_patience'] = args.patience
+    if args.reduce_lr_patience:
+        TRAINING_CONFIG['reduce_lr_patience'] = args.reduce_lr_patience
+
+    # The baseline first: it sets the default target
+    schedules = sorted(args.schedules, key=lambda schedule: schedule != 'constant')
+    runs = [run_schedule(schedule, args.data_dir, args.seed) for schedule in schedules]
+    target = args.target
+    if target is None:
+        if schedules[0] != 'constant':
+            parser.error("--target is required without the 'constant' baseline")
+        target = max(runs[0]['val_accuracy'])
+
+    print(f"\n⏱️  Time to val_accuracy >= {target:.4f}")
+    print(f"{'schedule':<15}{'epochs':>8}{'best acc':>10}{'to target':>11}{'seconds':>10}{'total s':>10}")
+    baseline_seconds = None
+    for run in runs:
+        run['target_epoch'], run['target_seconds'] = time_to_target(run, target)
+        if run['schedule'] == 'constant':
+            baseline_seconds = run['target_seconds']
+        reached = run['target_seconds'] is not None
+        print(f"{run['schedule']:<15}{run['epochs']:>8}{max(run['val_accuracy']):>10.4f}"
+              f"{run['target_epoch'] if reached else '-':>11}"
+              f"{run['target_seconds'] if reached else float('nan'):>10.1f}{run['seconds'][-1]:>10.1f}")
+    if baseline_seconds:
+        for run in runs:
+            if run['schedule'] != 'constant' and run['target_seconds'] is not None:
+                print(f"🚀 {run['schedule']}: {baseline_seconds / run['target_seconds']:.2f}x faster to target")
+
+    result_path = LOGS_DIR / 'lr_schedule_benchmark.json'
+    with open(result_path, 'w') as f:
+        json.dump({
+            'target': target,
+            'data': 'synthetic' if args.synthetic else str(args.data_dir),
+            'config': {key: TRAINING_CONFIG[key] for key in (
+                'img_height', 'batch_size', 'epochs', 'learning_rate', 'schedule_epochs', 'max_learning_rate',
+                'one_cycle_warmup', 'warmup_epochs', 'early_stopping_patience', 'reduce_lr_patience',
+                'synthetic_steps_per_epoch', 'synthetic_eval_steps')},
+            'seed': args.seed,
+            'runs': runs,
+        }, f, indent=2)
+    print(f"📁 Results saved to {result_path}")
+
+
+if __name__ == "__main__":
+    main()
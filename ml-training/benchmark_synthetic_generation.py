@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark and statistical check for the vectorized synthetic image renderer
+Times create_advanced_dataset.render_images against a verbatim copy of the
+previous per-image renderer (per-pixel Python texture loop, PIL drawing and
+enhancement). Then it compares the two per class: for the per-image channel
+means and stds, it reports the difference in units of its standard error.
+"""
+
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+from create_advanced_dataset import DISEASE_CLASSES, render_images
+
+
+# Reference: the per-image renderer as it was before vectorization, verbatim
+# (including its quirks: healthy highlights are drawn on an image the
+# brightness step has already replaced, and the yellow_disease shift wraps
+# around in uint8 before np.clip).
+
+def create_leaf_texture(image_size=(224, 224)):
+    """Create realistic leaf-like texture as base"""
+    img_array = np.zeros((image_size[0], image_size[1], 3), dtype=np.uint8)
+    
+    # Base green color with variation
+    base_green_r = random.randint(30, 60)
+    base_green_g = random.randint(100, 160)
+    base_green_b = random.randint(30, 60)
+    
+    # Create gradient and texture
+    for i in range(image_size[0]):
+        for j in range(image_size[1]):
+            # Add some natural variation
+            variation = random.randint(-15, 15)
+            r = np.clip(base_green_r + variation, 0, 255)
+            g = np.clip(base_green_g + variation, 0, 255)
+            b = np.clip(base_green_b + variation, 0, 255)
+            img_array[i, j] = [r, g, b]
+    
+    # Add Gaussian noise for texture
+    noise = np.random.normal(0, 10, img_array.shape)
+    img_array = np.clip(img_array + noise, 0, 255).astype(np.uint8)
+    
+    img = Image.fromarray(img_array)
+    
+    # Apply slight blur for organic look
+    img = img.filter(ImageFilter.GaussianBlur(radius=1))
+    
+    return img
+
+def add_veins(img, draw, color=(40, 80, 40)):
+    """Add leaf vein patterns"""
+    width, height = img.size
+    
+    # Main central vein
+    draw.line([(width//2, 0), (width//2, height)], fill=color, width=2)
+    
+    # Side veins
+    for i in range(5, height-5, 30):
+        offset = random.randint(-10, 10)
+        draw.line([(width//2, i), (random.randint(0, width//4), i+offset)], fill=color, width=1)
+        draw.line([(width//2, i), (random.randint(3*width//4, width), i+offset)], fill=color, width=1)
+
+def create_sample_image(class_name, image_size=(224, 224), variation=0):
+    """Create an advanced synthetic image for a given disease class"""
+    
+    # Create base leaf texture
+    img = create_leaf_texture(image_size)
+    draw = ImageDraw.Draw(img)
+    
+    # Add leaf veins for realism
+    if random.random() > 0.3:  # 70% chance to add veins
+        add_veins(img, draw)
+    
+    # Disease-specific modifications
+    if class_name == 'healthy':
+        # Keep mostly green, add slight variations
+        enhancer = ImageEnhance.Brightness(img)
+        img = enhancer.enhance(random.uniform(0.9, 1.1))
+        
+        # Add some random light spots (highlights)
+        for _ in range(random.randint(5, 15)):
+            x = random.randint(0, image_size[0])
+            y = random.randint(0, image_size[1])
+            color = (random.randint(60, 100), random.randint(140, 180), random.randint(60, 100))
+            radius = random.randint(3, 8)
+            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
+    
+    elif class_name == 'bacterial_wilt':
+        # Yellow/brown wilting patches
+        for _ in range(random.randint(10, 25)):
+            x = random.randint(0, image_size[0])
+            y = random.randint(0, image_size[1])
+            # Brown/yellow colors for wilting
+            color = (random.randint(120, 180), random.randint(90, 140), random.randint(40, 80))
+            radius = random.randint(8, 20)
+            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
+        
+        # Reduce overall brightness (wilted look)
+        enhancer = ImageEnhance.Brightness(img)
+        img = enhancer.enhance(0.7)
+    
+    elif class_name == 'rhizome_rot':
+        # Dark brown/black rotting areas
+        for _ in range(random.randint(8, 18)):
+            x = random.randint(0, image_size[0])
+            y = random.randint(0, image_size[1])
+            # Dark brown/black colors
+            color = (random.randint(30, 70), random.randint(20, 50), random.randint(15, 40))
+            radius = random.randint(10, 25)
+            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
+        
+        # Add some lighter brown edges (rot progression)
+        for _ in range(random.randint(5, 10)):
+            x = random.randint(0, image_size[0])
+            y = random.randint(0, image_size[1])
+            color = (random.randint(80, 120), random.randint(60, 90), random.randint(40, 70))
+            radius = random.randint(6, 15)
+            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
+    
+    elif class_name == 'leaf_spot':
+        # Multiple small circular spots
+        num_spots = random.randint(15, 40)
+        for _ in range(num_spots):
+            x = random.randint(0, image_size[0])
+            y = random.randint(0, image_size[1])
+            # Dark brown spots with yellow halo
+            radius = random.randint(3, 8)
+            
+            # Yellow halo
+            halo_color = (random.randint(180, 220), random.randint(180, 220), random.randint(80, 120))
+            draw.ellipse([x-radius-3, y-radius-3, x+radius+3, y+radius+3], fill=halo_color)
+            
+            # Dark center
+            spot_color = (random.randint(60, 100), random.randint(40, 70), random.randint(30, 60))
+            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=spot_color)
+    
+    elif class_name == 'soft_rot':
+        # Water-soaked, translucent appearance
+        for _ in range(random.randint(12, 25)):
+            x = random.randint(0, image_size[0])
+            y = random.randint(0, image_size[1])
+            # Light brownish, watery colors
+            color = (random.randint(140, 200), random.randint(140, 180), random.randint(100, 140))
+            radius = random.randint(12, 22)
+            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
+        
+        # Increase brightness slightly (water-soaked look)
+        enhancer = ImageEnhance.Brightness(img)
+        img = enhancer.enhance(1.1)
+    
+    elif class_name == 'yellow_disease':
+        # Overall yellowing with some green remaining
+        img_array = np.array(img)
+        
+        # Shift colors toward yellow
+        img_array[:, :, 0] = np.clip(img_array[:, :, 0] + random.randint(40, 80), 0, 255)  # More red
+        img_array[:, :, 1] = np.clip(img_array[:, :, 1] + random.randint(30, 60), 0, 255)  # More green
+        img_array[:, :, 2] = np.clip(img_array[:, :, 2] - random.randint(10, 30), 0, 255)  # Less blue
+        
+        img = Image.fromarray(img_array)
+        
+        # Add yellow patches
+        draw = ImageDraw.Draw(img)
+        for _ in range(random.randint(20, 40)):
+            x = random.randint(0, image_size[0])
+            y = random.randint(0, image_size[1])
+            color = (random.randint(200, 240), random.randint(200, 240), random.randint(60, 120))
+            radius = random.randint(5, 15)
+            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
+    
+    elif class_name == 'root_knot_nematode':
+        # Stunted, stressed appearance with swellings
+        for _ in range(random.randint(8, 15)):
+            x = random.randint(0, image_size[0])
+            y = random.randint(0, image_size[1])
+            # Brown/yellowish stress colors
+            color = (random.randint(100, 150), random.randint(90, 130), random.randint(50, 90))
+            radius = random.randint(10, 20)
+            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
+        
+        # Add some swelling-like structures
+        for _ in range(random.randint(3, 8)):
+            x = random.randint(0, image_size[0])
+            y = random.randint(0, image_size[1])
+            color = (random.randint(80, 120), random.randint(70, 110), random.randint(40, 80))
+            width = random.randint(8, 15)
+            height = random.randint(15, 25)
+            draw.ellipse([x-width, y-height, x+width, y+height], fill=color)
+        
+        # Reduce saturation (stressed plant)
+        enhancer = ImageEnhance.Color(img)
+        img = enhancer.enhance(0.7)
+    
+    # Apply final realistic touches
+    img = apply_augmentation(img, variation)
+    
+    return img
+
+def apply_augmentation(img, variation=0):
+    """Apply realistic augmentations to the image"""
+    
+    # Random rotation
+    if random.random() > 0.5:
+        angle = random.uniform(-15, 15)
+        img = img.rotate(angle, fillcolor=(0, 0, 0))
+    
+    # Random flip
+    if random.random() > 0.5:
+        img = img.transpose(Image.FLIP_LEFT_RIGHT)
+    
+    # Random brightness
+    if random.random() > 0.3:
+        enhancer = ImageEnhance.Brightness(img)
+        img = enhancer.enhance(random.uniform(0.7, 1.3))
+    
+    # Random contrast
+    if random.random() > 0.3:
+        enhancer = ImageEnhance.Contrast(img)
+        img = enhancer.enhance(random.uniform(0.8, 1.2))
+    
+    # Random saturation
+    if random.random() > 0.3:
+        enhancer = ImageEnhance.Color(img)
+        img = enhancer.enhance(random.uniform(0.8, 1.2))
+    
+    # Add final noise
+    img_array = np.array(img)
+    noise = np.random.normal(0, random.randint(3, 8), img_array.shape)
+    img_array = np.clip(img_array + noise, 0, 255).astype(np.uint8)
+    img = Image.fromarray(img_array)
+    
+    return img
+
+
+def per_image_stats(images):
+    """(N, 6) per-image channel means and stds"""
+    pixels = np.asarray(images, dtype=np.float64).reshape(len(images), -1, 3)
+    return np.concatenate([pixels.mean(axis=1), pixels.std(axis=1)], axis=1)
+
+
+def compare(legacy, vectorized, max_z):
+    """Largest |difference| / standard error over the six per-image statistics"""
+    a, b = per_image_stats(legacy), per_image_stats(vectorized)
+    stderr = np.sqrt(a.var(axis=0, ddof=1) / len(a) + b.var(axis=0, ddof=1) / len(b)) + 1e-9
+    z = np.abs(a.mean(axis=0) - b.mean(axis=0)) / stderr
+    return a.mean(axis=0), b.mean(axis=0), float(z.max()), bool(z.max() <= max_z)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized synthetic image renderer")
+    parser.add_argument('--legacy-count', type=int, default=6, help="Reference images per class (slow)")
+    parser.add_argument('--count', type=int, default=64, help="Vectorized images per class")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-z', type=float, default=4.0,
+                        help="Fail when a statistic differs by more than this many standard errors")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    legacy_time = vectorized_time = 0.0
+    passed = True
+    print(f"{'Class':20} {'legacy img/s':>12} {'vector img/s':>12}  {'max z':>6}  mean RGB legacy -> vectorized")
+    for class_name in DISEASE_CLASSES:
+        start = time.perf_counter()
+        legacy = [np.array(create_sample_image(class_name)) for _ in range(args.legacy_count)]
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectorized = np.concatenate([
+            render_images(class_name, min(args.batch_size, args.count - offset), rng=rng)
+            for offset in range(0, args.count, args.batch_size)
+        ])
+        vectorized_seconds = time.perf_counter() - start
+
+        legacy_time += legacy_seconds / args.legacy_count
+        vectorized_time += vectorized_seconds / args.count
+        before, after, z, ok = compare(legacy, vectorized, args.max_z)
+        passed &= ok
+        print(f"{class_name:20} {args.legacy_count / legacy_seconds:12.2f} {args.count / vectorized_seconds:12.1f}  "
+              f"{z:6.2f}  ({before[0]:.0f}, {before[1]:.0f}, {before[2]:.0f}) -> "
+              f"({after[0]:.0f}, {after[1]:.0f}, {after[2]:.0f}) {'✅' if ok else '❌'}")
+
+    print(f"\n⏱️  Overall: {len(DISEASE_CLASSES) / legacy_time:.2f} -> {len(DISEASE_CLASSES) / vectorized_time:.1f} "
+          f"images/s ({legacy_time / vectorized_time:.0f}x)")
+    if passed:
+        print(f"✅ Per-image channel statistics agree within {args.max_z:.0f} standard errors for every class")
+    else:
+        print(f"❌ Some classes differ by more than {args.max_z:.0f} standard errors")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
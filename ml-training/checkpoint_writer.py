@@ -0,0 +1,153 @@
+"""
+Best-model checkpoints written in the background
+ModelCheckpoint serializes the whole model on the training thread, which
+stalls large backbones for seconds on every improvement. AsyncModelCheckpoint
+only copies the weights to host memory on the training thread; a writer
+thread saves the copy and renames it into place, so a crash mid-write never
+leaves a truncated checkpoint. While a write is running, only the newest
+pending snapshot is kept.
+
+Formats:
+    'full'     the usual model file (e.g. .h5), written from a private clone
+               of the model that only the writer thread touches
+    'weights'  raw weight arrays in an uncompressed .npz next to it; the
+               fastest to write, loaded with load_weights_snapshot()
+"""
+import os
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+from tensorflow import keras
+
+from config import TRAINING_STATE_CONFIG
+
+
+def weights_snapshot_path(filepath):
+    """Where the 'weights' format puts the checkpoint for a model filepath"""
+    filepath = Path(filepath)
+    return filepath.with_name(f"{filepath.stem}.weights.npz")
+
+
+def load_weights_snapshot(model, path):
+    """Load weights written in the 'weights' format into a model of the same architecture"""
+    with np.load(path) as arrays:
+        model.set_weights([arrays[f"w{i}"] for i in range(len(arrays.files))])
+    return model
+
+
+class AsyncModelCheckpoint(keras.callbacks.Callback):
+    """
+    Save the best model (by monitor) without blocking training on the write.
+    target_model saves another model than the one being fit (e.g. the full
+    hybrid while its head trains on cached features).
+    """
+
+    def __init__(self, filepath, monitor='val_accuracy', mode='max', save_format=None, target_model=None,
+                 verbose=1):
+        super().__init__()
+        self.save_format = save_format or TRAINING_STATE_CONFIG['best_model_format']
+        self.filepath = Path(filepath) if self.save_format == 'full' else weights_snapshot_path(filepath)
+        self.monitor = monitor
+        self.mode = mode
+        self.best = -np.inf if mode == 'max' else np.inf
+        self.target_model = target_model
+        self.verbose = verbose
+        self.blocking_seconds = []
+        self.write_seconds = []
+
+        self._clone = None
+        self._pending = None
+        self._error = None
+        self._condition = threading.Condition()
+        self._writer = None
+        self._closed = False
+
+    def _saved_model(self):
+        return self.target_model if self.target_model is not None else self.model
+
+    def _improved(self, value):
+        return value > self.best if self.mode == 'max' else value < self.best
+
+    def on_train_begin(self, logs=None):
+        if self.save_format == 'full' and self._clone is None:
+            # Built once; the writer thread loads snapshots into it and saves it
+            model = self._saved_model()
+            self._clone = keras.models.clone_model(model)
+            if model.compiled:
+                # Same loss and metrics, so the saved file evaluates like the original
+                self._clone.compile_from_config(model.get_compile_config())
+        self._closed = False
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, name='checkpoint-writer', daemon=True)
+            self._writer.start()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self._raise_write_error()
+        value = (logs or {}).get(self.monitor)
+        if value is None or not self._improved(value):
+            return
+        previous, self.best = self.best, float(value)
+
+        start = time.perf_counter()
+        snapshot = [np.array(weight, copy=True) for weight in self._saved_model().get_weights()]
+        blocked = time.perf_counter() - start
+        self.blocking_seconds.append(blocked)
+        with self._condition:
+            self._pending = (epoch, snapshot)
+            self._condition.notify()
+        if self.verbose:
+            print(f"\nEpoch {epoch + 1}: {self.monitor} improved from {previous:.5f} to {self.best:.5f}, "
+                  f"saving to {self.filepath} in the background (training blocked {blocked * 1000:.1f} ms)")
+
+    def on_train_end(self, logs=None):
+        self.close()
+        if self.verbose and self.blocking_seconds:
+            print(f"💾 {len(self.blocking_seconds)} best-model checkpoints: training blocked "
+                  f"{np.mean(self.blocking_seconds) * 1000:.1f} ms on average "
+                  f"(max {max(self.blocking_seconds) * 1000:.1f} ms), "
+                  f"writes took {np.mean(self.write_seconds):.2f} s on average")
+        self._raise_write_error()
+
+    def close(self):
+        """Wait for the last pending checkpoint to be written"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._writer is not None:
+            self._writer.join()
+
+    def _write_loop(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                epoch, snapshot = self._pending
+                self._pending = None
+            start = time.perf_counter()
+            try:
+                self._write(snapshot)
+            except Exception as e:
+                self._error = e
+            self.write_seconds.append(time.perf_counter() - start)
+
+    def _write(self, snapshot):
+        """Write one snapshot to a temporary file, then rename it over the checkpoint"""
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        # Keep the real suffix last: Keras picks the format from it
+        tmp_path = self.filepath.with_name(f".{self.filepath.stem}.tmp{self.filepath.suffix}")
+        if self.save_format == 'full':
+            self._clone.set_weights(snapshot)
+            self._clone.save(tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **{f"w{i}": weight for i, weight in enumerate(snapshot)})
+        os.replace(tmp_path, self.filepath)
+
+    def _raise_write_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Writing checkpoint {self.filepath} failed: {error}") from error
@@ -7,6 +7,7 @@ Primary approach using custom CNN architecture
 
 import os
 import json
+import argparse
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
@@ -20,11 +21,22 @@ import pandas as pd
 from pathlib import Path
 
 from config import *
+from tensor_cache import TensorCache, TensorCacheSequence
+from tf_data_pipeline import create_dataset
+from shard_records import ShardedSplitReader, ShardSequence, shard_dir_for
+from image_pyramid import flow_from_pyramid
+from synthetic_source import mix_synthetic, synthetic_split
+from feature_cache import FeatureCache, FeatureSequence
+from training_state import TrainingState
+from checkpoint_writer import AsyncModelCheckpoint
+from lr_schedule import learning_rate_for, training_epochs, uses_schedule, describe_learning_rate
 
 class CNNGingerDiseaseModel:
     def __init__(self):
         self.model = None
         self.history = None
+        self.hybrid_head = None
+        self.split_dirs = None
         self.img_height = TRAINING_CONFIG['img_height']
         self.img_width = TRAINING_CONFIG['img_width']
         self.num_classes = NUM_CLASSES
@@ -101,32 +113,40 @@ class CNNGingerDiseaseModel:
         if hybrid_config['freeze_base']:
             base_model.trainable = False
         
+        # Custom head
+        custom_head = hybrid_config['custom_head']
+        head_layers = []
+        for dense_config in custom_head['dense_layers']:
+            head_layers.append(layers.Dense(dense_config['units']))
+            head_layers.append(layers.Activation(dense_config['activation']))
+            head_layers.append(layers.Dropout(dense_config['dropout']))
+        
+        # Output layer
+        head_layers.append(layers.Dense(custom_head['output_units']))
+        head_layers.append(layers.Activation(custom_head['output_activation']))
+        
         # Create model
         inputs = keras.Input(shape=input_shape)
         x = base_model(inputs, training=False)
         
         # Add GlobalAveragePooling2D to flatten the output
         x = layers.GlobalAveragePooling2D()(x)
+        for layer in head_layers:
+            x = layer(x)
         
-        # Custom head
-        custom_head = hybrid_config['custom_head']
-        for dense_config in custom_head['dense_layers']:
-            x = layers.Dense(dense_config['units'])(x)
-            x = layers.Activation(dense_config['activation'])(x)
-            x = layers.Dropout(dense_config['dropout'])(x)
-        
-        # Output layer
-        outputs = layers.Dense(custom_head['output_units'])(x)
-        outputs = layers.Activation(custom_head['output_activation'])(outputs)
+        model = keras.Model(inputs, x)
         
-        model = keras.Model(inputs, outputs)
+        # The same head layers on pooled features, for training from the feature cache
+        features = keras.Input(shape=(base_model.output_shape[-1],))
+        x = features
+        for layer in head_layers:
+            x = layer(x)
+        self.hybrid_head = keras.Model(features, x, name='hybrid_head')
         
         return model, base_model
     
-    def create_data_generators(self, train_dir, val_dir, test_dir):
-        """Create data generators for training, validation, and testing"""
-        print("📊 Creating data generators...")
-        
+    def create_datagens(self):
+        """(augmenting training datagen, plain validation/test datagen)"""
         # Data augmentation for training
         train_datagen = ImageDataGenerator(
             rescale=1./255,
@@ -144,8 +164,64 @@ class CNNGingerDiseaseModel:
         # No augmentation for validation and test
         val_test_datagen = ImageDataGenerator(rescale=1./255)
         
-        # Create generators
-        train_generator = train_datagen.flow_from_directory(
+        return train_datagen, val_test_datagen
+    
+    def create_data_generators(self, train_dir, val_dir, test_dir):
+        """Create data generators for training, validation, and testing"""
+        print("📊 Creating data generators...")
+        
+        if TRAINING_CONFIG['synthetic_ratio'] >= 1.0:
+            # Pretraining on rendered images only: nothing is read from disk.
+            # Sorted class names match the order flow_from_directory assigns.
+            class_names = sorted(DISEASE_CLASSES)
+            return tuple(synthetic_split(split, class_names, 'categorical')
+                         for split in ('train', 'validation', 'test'))
+        
+        train_datagen, val_test_datagen = self.create_datagens()
+        # Kept for the hybrid feature cache, which reads the splits itself
+        if TRAINING_CONFIG['synthetic_ratio'] <= 0:
+            self.split_dirs = {'train': train_dir, 'validation': val_dir, 'test': test_dir}
+        
+        if TRAINING_CONFIG['data_backend'] == 'memmap':
+            # Decode once into uint8 memmaps, then augment from the cache
+            train_generator = TensorCacheSequence(
+                TensorCache.build(train_dir), class_mode='categorical', shuffle=True, datagen=train_datagen
+            )
+            val_generator = TensorCacheSequence(
+                TensorCache.build(val_dir), class_mode='categorical', shuffle=False, datagen=val_test_datagen
+            )
+            test_generator = TensorCacheSequence(
+                TensorCache.build(test_dir), class_mode='categorical', shuffle=False, datagen=val_test_datagen
+            )
+            return mix_synthetic(train_generator, 'categorical'), val_generator, test_generator
+        
+        if TRAINING_CONFIG['data_backend'] == 'tf_data':
+            # Parallel decode, optional cache, batched augmentation and prefetch
+            train_generator = create_dataset(train_dir, class_mode='categorical', shuffle=True, augment=True)
+            val_generator = create_dataset(val_dir, class_mode='categorical', shuffle=False)
+            test_generator = create_dataset(test_dir, class_mode='categorical', shuffle=False)
+            return mix_synthetic(train_generator, 'categorical'), val_generator, test_generator
+        
+        if TRAINING_CONFIG['data_backend'] == 'shards':
+            # Sequential reads from the sharded records written by data_preprocessing.py --shards
+            class_names = sorted(DISEASE_CLASSES)
+            train_generator = ShardSequence(
+                ShardedSplitReader(shard_dir_for(train_dir)), class_mode='categorical', shuffle=True,
+                datagen=train_datagen, classes=class_names
+            )
+            val_generator = ShardSequence(
+                ShardedSplitReader(shard_dir_for(val_dir)), class_mode='categorical', shuffle=False,
+                datagen=val_test_datagen, classes=class_names
+            )
+            test_generator = ShardSequence(
+                ShardedSplitReader(shard_dir_for(test_dir)), class_mode='categorical', shuffle=False,
+                datagen=val_test_datagen, classes=class_names
+            )
+            return mix_synthetic(train_generator, 'categorical'), val_generator, test_generator
+        
+        # Create generators (reading the smallest cached downscaled copies instead of the originals)
+        train_generator = flow_from_pyramid(
+            train_datagen,
             train_dir,
             target_size=(self.img_height, self.img_width),
             batch_size=TRAINING_CONFIG['batch_size'],
@@ -153,7 +229,8 @@ class CNNGingerDiseaseModel:
             shuffle=True
         )
         
-        val_generator = val_test_datagen.flow_from_directory(
+        val_generator = flow_from_pyramid(
+            val_test_datagen,
             val_dir,
             target_size=(self.img_height, self.img_width),
             batch_size=TRAINING_CONFIG['batch_size'],
@@ -161,7 +238,8 @@ class CNNGingerDiseaseModel:
             shuffle=False
         )
         
-        test_generator = val_test_datagen.flow_from_directory(
+        test_generator = flow_from_pyramid(
+            val_test_datagen,
             test_dir,
             target_size=(self.img_height, self.img_width),
             batch_size=TRAINING_CONFIG['batch_size'],
@@ -169,22 +247,22 @@ class CNNGingerDiseaseModel:
             shuffle=False
         )
         
-        return train_generator, val_generator, test_generator
+        return mix_synthetic(train_generator, 'categorical'), val_generator, test_generator
     
-    def compile_model(self, model):
-        """Compile the model with optimizer and loss function"""
+    def compile_model(self, model, steps_per_epoch=None):
+        """Compile the model with optimizer and loss function (steps_per_epoch: length of an epoch for lr_schedule)"""
         print("⚙️  Compiling model...")
         
         model.compile(
-            optimizer=optimizers.Adam(learning_rate=TRAINING_CONFIG['learning_rate']),
+            optimizer=optimizers.Adam(learning_rate=learning_rate_for(steps_per_epoch)),
             loss='categorical_crossentropy',
             metrics=['accuracy']
         )
         
         return model
     
-    def setup_callbacks(self):
-        """Setup training callbacks"""
+    def setup_callbacks(self, checkpoint_model=None):
+        """Setup training callbacks (checkpoint_model: save this model instead of the one being fit)"""
         print("📞 Setting up callbacks...")
         
         callbacks_list = [
@@ -196,21 +274,12 @@ class CNNGingerDiseaseModel:
                 verbose=1
             ),
             
-            # Reduce learning rate on plateau
-            callbacks.ReduceLROnPlateau(
-                monitor='val_loss',
-                factor=TRAINING_CONFIG['reduce_lr_factor'],
-                patience=TRAINING_CONFIG['reduce_lr_patience'],
-                min_lr=TRAINING_CONFIG['min_lr'],
-                verbose=1
-            ),
-            
-            # Model checkpoint
-            callbacks.ModelCheckpoint(
+            # Model checkpoint (written by a background thread)
+            AsyncModelCheckpoint(
                 filepath=MODEL_SAVE_PATH,
                 monitor='val_accuracy',
-                save_best_only=True,
-                save_weights_only=False,
+                mode='max',
+                target_model=checkpoint_model,
                 verbose=1
             ),
             
@@ -229,10 +298,20 @@ class CNNGingerDiseaseModel:
             )
         ]
         
+        if not uses_schedule():
+            # Reduce learning rate on plateau (a scheduled learning rate is fixed in advance)
+            callbacks_list.insert(1, callbacks.ReduceLROnPlateau(
+                monitor='val_loss',
+                factor=TRAINING_CONFIG['reduce_lr_factor'],
+                patience=TRAINING_CONFIG['reduce_lr_patience'],
+                min_lr=TRAINING_CONFIG['min_lr'],
+                verbose=1
+            ))
+        
         return callbacks_list
     
-    def train_model(self, train_generator, val_generator, model_type='cnn'):
-        """Train the CNN model"""
+    def train_model(self, train_generator, val_generator, model_type='cnn', resume=False):
+        """Train the CNN model (resume: continue from the last full-state checkpoint)"""
         print(f"🚀 Training {model_type.upper()} model...")
         
         # Create model
@@ -244,10 +323,15 @@ class CNNGingerDiseaseModel:
             raise ValueError(f"Unsupported model type: {model_type}")
         
         # Compile model
-        model = self.compile_model(model)
+        model = self.compile_model(model, steps_per_epoch=len(train_generator))
+        
+        if model_type == 'hybrid' and self.use_feature_cache():
+            # Frozen backbone: run it once per image and train the head on the cached features
+            return self.train_hybrid_head(model, base_model, resume)
         
         # Setup callbacks
         callbacks_list = self.setup_callbacks()
+        training_state = TrainingState(f'cnn_model_training/{model_type}', train_generator, callbacks_list, resume)
         
         # Print model summary
         print("\n📋 Model Summary:")
@@ -256,25 +340,85 @@ class CNNGingerDiseaseModel:
         # Calculate steps
         steps_per_epoch = len(train_generator)
         validation_steps = len(val_generator)
+        epochs = training_epochs()
         
         print(f"\n📊 Training Configuration:")
-        print(f"  Epochs: {TRAINING_CONFIG['epochs']}")
+        print(f"  Epochs: {epochs}")
         print(f"  Batch Size: {TRAINING_CONFIG['batch_size']}")
         print(f"  Steps per Epoch: {steps_per_epoch}")
         print(f"  Validation Steps: {validation_steps}")
-        print(f"  Learning Rate: {TRAINING_CONFIG['learning_rate']}")
+        print(f"  Learning Rate: {describe_learning_rate()}")
         
         # Train model
         print("\n🏃 Starting training...")
         history = model.fit(
             train_generator,
             steps_per_epoch=steps_per_epoch,
-            epochs=TRAINING_CONFIG['epochs'],
+            epochs=epochs,
+            initial_epoch=training_state.initial_epoch_for(epochs),
             validation_data=val_generator,
             validation_steps=validation_steps,
-            callbacks=callbacks_list,
+            callbacks=callbacks_list + [training_state],
+            verbose=1
+        )
+        history = training_state.merged_history(history)
+        
+        self.model = model
+        self.history = history
+        
+        return model, history
+    
+    def use_feature_cache(self):
+        """Whether hybrid training can run on cached backbone features"""
+        hybrid_config = TRAINING_CONFIG['hybrid_cnn']
+        if not (hybrid_config['freeze_base'] and hybrid_config['feature_cache']):
+            return False
+        if self.split_dirs is None:
+            print("⚠️  Feature cache needs fixed on-disk splits (no synthetic images); running the full backbone")
+            return False
+        return True
+    
+    def train_hybrid_head(self, model, base_model, resume=False):
+        """Train the hybrid head on memory-mapped pooled features of the frozen base"""
+        hybrid_config = TRAINING_CONFIG['hybrid_cnn']
+        extractor = keras.Model(
+            base_model.input, layers.GlobalAveragePooling2D()(base_model.output),
+            name=f"{hybrid_config['base_model']}_{hybrid_config['base_weights']}_pooled"
+        )
+        train_datagen, val_test_datagen = self.create_datagens()
+        train_cache = FeatureCache.build(
+            self.split_dirs['train'], extractor, train_datagen, views=hybrid_config['feature_cache_views']
+        )
+        val_cache = FeatureCache.build(self.split_dirs['validation'], extractor, val_test_datagen)
+        train_features = FeatureSequence(train_cache, class_mode='categorical', shuffle=True)
+        val_features = FeatureSequence(val_cache, class_mode='categorical', shuffle=False)
+        
+        head = self.compile_model(self.hybrid_head, steps_per_epoch=len(train_features))
+        # Checkpoints save the full image model, which shares the head's weights
+        callbacks_list = self.setup_callbacks(checkpoint_model=model)
+        training_state = TrainingState('cnn_model_training/hybrid_head', train_features, callbacks_list, resume)
+        
+        epochs = training_epochs()
+        
+        print(f"\n📊 Training Configuration (cached features):")
+        print(f"  Epochs: {epochs}")
+        print(f"  Batch Size: {TRAINING_CONFIG['batch_size']}")
+        print(f"  Training samples: {train_features.samples} x {train_cache.views} views")
+        print(f"  Feature size: {train_cache.feature_dim}")
+        print(f"  Learning Rate: {describe_learning_rate()}")
+        
+        print("\n🏃 Starting head training...")
+        history = head.fit(
+            train_features,
+            steps_per_epoch=len(train_features),
+            epochs=epochs,
+            initial_epoch=training_state.initial_epoch_for(epochs),
+            validation_data=val_features,
+            validation_steps=len(val_features),
+            callbacks=callbacks_list + [training_state],
             verbose=1
         )
+        history = training_state.merged_history(history)
         
         self.model = model
         self.history = history
@@ -400,12 +544,20 @@ class CNNGingerDiseaseModel:
 
 def main():
     """Main training function"""
+    parser = argparse.ArgumentParser(description='Train the CNN-first Ginger Disease Detection model')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue from the last full-state checkpoint in TRAINING_STATE_DIR')
+    args = parser.parse_args()
+    
     print("🌱 CNN-First Ginger Disease Detection Training")
     print("=" * 60)
     
+    # Synthetic-only pretraining renders its images and needs no dataset
+    synthetic_only = TRAINING_CONFIG['synthetic_ratio'] >= 1.0
+    
     # Check if processed data exists
     processed_dir = PROCESSED_DATASET_PATH
-    if not processed_dir.exists():
+    if not synthetic_only and not processed_dir.exists():
         print("❌ Processed dataset not found!")
         print("Please run data preprocessing first:")
         print("  python data_preprocessing.py")
@@ -416,7 +568,7 @@ def main():
     val_dir = processed_dir / 'validation'
     test_dir = processed_dir / 'test'
     
-    if not all([train_dir.exists(), val_dir.exists(), test_dir.exists()]):
+    if not synthetic_only and not all([train_dir.exists(), val_dir.exists(), test_dir.exists()]):
         print("❌ Train/validation/test directories not found!")
         print("Please run data preprocessing first:")
         print("  python data_preprocessing.py")
@@ -446,14 +598,14 @@ def main():
     
     if choice == '1':
         # Train CNN model
-        model, history = model_trainer.train_model(train_gen, val_gen, 'cnn')
+        model, history = model_trainer.train_model(train_gen, val_gen, 'cnn', resume=args.resume)
         evaluation_results = model_trainer.evaluate_model(test_gen)
         model_trainer.plot_training_history()
         model_trainer.save_model_metadata(evaluation_results, 'cnn')
         
     elif choice == '2':
         # Train Hybrid model
-        model, history = model_trainer.train_model(train_gen, val_gen, 'hybrid')
+        model, history = model_trainer.train_model(train_gen, val_gen, 'hybrid', resume=args.resume)
         evaluation_results = model_trainer.evaluate_model(test_gen)
         model_trainer.plot_training_history()
         model_trainer.save_model_metadata(evaluation_results, 'hybrid')
@@ -461,14 +613,16 @@ def main():
     elif choice == '3':
         # Train both models and compare
         print("\n🔄 Training CNN model...")
-        cnn_model, cnn_history = model_trainer.train_model(train_gen, val_gen, 'cnn')
+        cnn_model, cnn_history = model_trainer.train_model(train_gen, val_gen, 'cnn', resume=args.resume)
         cnn_results = model_trainer.evaluate_model(test_gen)
         model_trainer.plot_training_history()
         model_trainer.save_model_metadata(cnn_results, 'cnn')
         
         print("\n🔄 Training Hybrid model...")
         hybrid_trainer = CNNGingerDiseaseModel()
-        hybrid_model, hybrid_history = hybrid_trainer.train_model(train_gen, val_gen, 'hybrid')
+        # Its own generators, so it also knows the splits the feature cache reads
+        train_gen, val_gen, test_gen = hybrid_trainer.create_data_generators(train_dir, val_dir, test_dir)
+        hybrid_model, hybrid_history = hybrid_trainer.train_model(train_gen, val_gen, 'hybrid', resume=args.resume)
         hybrid_results = hybrid_trainer.evaluate_model(test_gen)
         hybrid_trainer.plot_training_history()
         hybrid_trainer.save_model_metadata(hybrid_results, 'hybrid')
@@ -37,9 +37,21 @@ TRAINING_CONFIG = {
     'img_width': 224,
     'channels': 3,
     'batch_size': 32,
+    'data_backend': 'keras',  # 'keras' (ImageDataGenerator), 'memmap' (pre-decoded tensor cache), 'tf_data' or 'shards' (data_preprocessing.py --shards)
+    'tf_data_cache': None,  # tf_data backend: None, 'memory' or 'disk' cache of decoded images
+    'tf_data_shuffle_buffer': 2048,  # shuffle buffer when decoded images are cached
     'validation_split': 0.2,
     'test_split': 0.1,
-    
+
+    # On-the-fly synthetic images (synthetic_source.py)
+    'synthetic_ratio': 0.0,  # share of each training batch rendered on the fly; 1.0 trains on synthetic images only
+    'synthetic_renderer': 'advanced',  # 'advanced' (create_advanced_dataset) or 'simple' (create_sample_images)
+    'synthetic_seed': 42,
+    'synthetic_steps_per_epoch': 100,  # epoch length when training on synthetic images only
+    'synthetic_eval_steps': 20,  # validation/test batches when training on synthetic images only
+    'synthetic_workers': None,  # render processes (None: PREPROCESSING_CONFIG['num_workers'])
+    'synthetic_prefetch': 4,  # batches rendered ahead of the training loop
+
     # Training
     'epochs': 50,
     'learning_rate': 0.001,
@@ -48,6 +60,15 @@ TRAINING_CONFIG = {
     'reduce_lr_factor': 0.5,
     'min_lr': 1e-7,
     
+    # Learning-rate schedule (lr_schedule.py; run it for a range test that suggests max_learning_rate)
+    'lr_schedule': 'constant',  # 'constant' (ReduceLROnPlateau), 'one_cycle' or 'cosine_warmup'
+    'max_learning_rate': None,  # peak of the scheduled learning rate (None: learning_rate)
+    'schedule_epochs': 15,  # length of the schedule; scheduled runs train this many epochs instead of epochs
+    'one_cycle_warmup': 0.3,  # share of the cycle spent rising to max_learning_rate
+    'one_cycle_div_factor': 25,  # the cycle starts at max_learning_rate / div_factor
+    'one_cycle_final_div_factor': 1e4,  # ... and ends div_factor * final_div_factor below the peak
+    'warmup_epochs': 1,  # cosine_warmup: linear warmup from min_lr
+    
     # Data Augmentation
     'rotation_range': 25,
     'width_shift_range': 0.1,
@@ -88,6 +109,8 @@ TRAINING_CONFIG = {
         'base_weights': 'imagenet',
         'include_top': False,
         'freeze_base': True,
+        'feature_cache': True,  # with a frozen base: train the head on cached pooled features (feature_cache.py)
+        'feature_cache_views': 4,  # training views per image: the plain image plus fixed random augmentations
         'custom_head': {
             'dense_layers': [
                 {'units': 128, 'activation': 'relu', 'dropout': 0.3},
@@ -106,6 +129,80 @@ TRAINING_CONFIG = {
     'fine_tune_from_layer': None,
 }
 
+# Data Preprocessing Configuration
+PREPROCESSING_CONFIG = {
+    'num_workers': os.cpu_count() or 1,  # Worker processes for verify/copy
+    'chunksize': 64,  # Files handed to a worker per task batch
+    'valid_extensions': ['.jpg', '.jpeg', '.png', '.bmp', '.tiff'],
+    'organize_validation_tier': 1,  # 0 header, 1 JPEG/PNG structure, 2 full decode (see image_validation.py)
+    'group_near_duplicates': True,  # Keep near-duplicate groups within one split
+    'near_duplicate_hash': 'dhash',  # 'dhash' or 'phash'
+    'near_duplicate_distance': 6,  # Max Hamming distance (of 64 bits) for a near-duplicate
+    'split_salt': 'ginger-splits-v1',  # Changing it reshuffles only images not yet in the split manifest
+    'write_shards': False,  # Also write splits as sharded records (see shard_records.py)
+    'shard_target_mb': 256,  # Approximate size of each shard file
+    'shard_pre_resize': True,  # Store JPEGs re-encoded at img_height x img_width
+    'shard_jpeg_quality': 95,
+    'reduced_jpeg_decode': True,  # Decode JPEGs at 1/2, 1/4 or 1/8 scale when still >= target size
+    'pyramid_sizes': [160, 256, 384],  # Short sides of the downscaled image cache (see image_pyramid.py)
+    'pyramid_jpeg_quality': 95,
+    'use_pyramid': True,  # Loaders read the smallest cached copy that covers their target size
+    'repair_max_side': 4096,  # image_repair.py downscales oversized images to this long side
+    'repair_jpeg_quality': 92,
+    'normalization': 'dataset',  # 'dataset' (cached channel stats, see dataset_stats.py) or 'imagenet'
+}
+
+# Content-addressed dataset store (deduplicated blobs + links into class dirs)
+DATASET_STORE_CONFIG = {
+    'hash_algorithm': 'sha256',
+    'link_mode': 'hardlink',  # 'hardlink', 'reflink' or 'copy'; falls back in that order
+}
+
+# Continuous ingest from per-class inbox folders (see ingest_watch.py)
+INGEST_WATCH_CONFIG = {
+    'poll_interval': 2.0,  # Seconds between inbox scans
+    'debounce_seconds': 5.0,  # A file must keep the same size and mtime this long before it is ingested
+    'max_batch': 256,  # Files per class ingested in one transaction; the rest wait for the next cycle
+    'throughput_window': 300,  # Seconds covered by the recent throughput counter
+}
+
+# Parallel hyperparameter search with ASHA pruning (see hyperparameter_search.py)
+HYPERPARAMETER_SEARCH_CONFIG = {
+    'trials': 27,  # Trials sampled from the search space
+    'workers': 2,  # Trials trained concurrently, one process each
+    'threads_per_trial': None,  # TensorFlow threads per trial (None: CPU count / workers)
+    'min_epochs': 2,  # Epochs of the first rung
+    'max_epochs': TRAINING_CONFIG['epochs'],  # Epochs of the last rung
+    'reduction_factor': 3,  # Only the top 1/reduction_factor of a rung is promoted to the next
+    'metric': 'val_accuracy',  # Maximized
+    'seed': 0,
+    # Dotted keys address TRAINING_CONFIG; dropout_rate also sets every cnn_architecture dense dropout
+    'space': {
+        'learning_rate': ('log_uniform', 1e-4, 3e-3),
+        'batch_size': ('choice', [16, 32, 64]),
+        'dropout_rate': ('uniform', 0.1, 0.5),
+        'cnn_architecture.conv_layers': ('choice', [
+            TRAINING_CONFIG['cnn_architecture']['conv_layers'],
+            [
+                {'filters': 32, 'kernel_size': (5, 5), 'strides': 2, 'activation': 'relu'},
+                {'filters': 64, 'kernel_size': (3, 3), 'strides': 1, 'activation': 'relu'},
+                {'filters': 64, 'kernel_size': (3, 3), 'strides': 2, 'activation': 'relu'},
+            ],
+        ]),
+        'cnn_architecture.dense_layers': ('choice', [
+            TRAINING_CONFIG['cnn_architecture']['dense_layers'],
+            [{'units': 128, 'activation': 'relu', 'dropout': 0.3}],
+        ]),
+    },
+}
+
+# Full training-state checkpoints for --resume (see training_state.py)
+TRAINING_STATE_CONFIG = {
+    'every_epochs': 1,  # Write a checkpoint every this many epochs (and when training ends)
+    'keep_last': 3,  # Older checkpoints of a run are deleted
+    'best_model_format': 'full',  # Best-model checkpoints (checkpoint_writer.py): 'full' model file or fast 'weights'
+}
+
 # Model Export Configuration
 EXPORT_CONFIG = {
     'tensorflowjs_format': True,
@@ -128,7 +225,21 @@ EXPORT_CONFIG = {
 # Paths
 DATASET_PATH = RAW_DATA_DIR / "ginger_dataset"
 PROCESSED_DATASET_PATH = PROCESSED_DATA_DIR / "ginger_processed"
+DATASET_STORE_PATH = DATA_DIR / "store"
+ORGANIZE_MANIFEST_PATH = PROCESSED_DATASET_PATH / "manifest.json"
+SPLIT_MANIFEST_PATH = PROCESSED_DATASET_PATH / "split_manifest.json"
+TENSOR_CACHE_DIR = DATA_DIR / "cache" / "tensors"
+TF_DATA_CACHE_DIR = DATA_DIR / "cache" / "tf_data"
+FEATURE_CACHE_DIR = DATA_DIR / "cache" / "features"
+IMAGE_PYRAMID_DIR = DATA_DIR / "cache" / "pyramid"
+QUARANTINE_DIR = DATA_DIR / "quarantine"
+INBOX_DIR = DATA_DIR / "inbox"
+DATASET_STATS_PATH = DATA_DIR / "cache" / "dataset_stats.json"
+INGEST_WATCH_STATUS_PATH = DATA_DIR / "cache" / "ingest_watch_status.json"
 MODEL_SAVE_PATH = MODELS_DIR / "ginger_disease_model.h5"
+TRAINING_STATE_DIR = MODELS_DIR / "checkpoints"
+HYPERPARAMETER_SEARCH_DIR = MODELS_DIR / "search"
+HYPERPARAMETER_SEARCH_DB = LOGS_DIR / "hyperparameter_search.sqlite"
 TENSORFLOWJS_EXPORT_PATH = EXPORTS_DIR / "tfjs_model"
 TENSORBOARD_LOG_DIR = LOGS_DIR / "tensorboard"
 
@@ -7,11 +7,14 @@ Version: 2.0 - Production Ready
 """
 
 import os
+import json
+import hashlib
+import argparse
 import numpy as np
-from PIL import Image, ImageDraw, ImageFilter, ImageEnhance
-import random
+from PIL import Image
 from pathlib import Path
-import sys
+
+from parallel_utils import run_parallel_stream
 
 # Disease classes
 DISEASE_CLASSES = [
@@ -24,231 +27,360 @@ DISEASE_CLASSES = [
     'root_knot_nematode'
 ]
 
-def create_leaf_texture(image_size=(224, 224)):
-    """Create realistic leaf-like texture as base"""
-    img_array = np.zeros((image_size[0], image_size[1], 3), dtype=np.uint8)
-    
-    # Base green color with variation
-    base_green_r = random.randint(30, 60)
-    base_green_g = random.randint(100, 160)
-    base_green_b = random.randint(30, 60)
-    
-    # Create gradient and texture
-    for i in range(image_size[0]):
-        for j in range(image_size[1]):
-            # Add some natural variation
-            variation = random.randint(-15, 15)
-            r = np.clip(base_green_r + variation, 0, 255)
-            g = np.clip(base_green_g + variation, 0, 255)
-            b = np.clip(base_green_b + variation, 0, 255)
-            img_array[i, j] = [r, g, b]
-    
-    # Add Gaussian noise for texture
-    noise = np.random.normal(0, 10, img_array.shape)
-    img_array = np.clip(img_array + noise, 0, 255).astype(np.uint8)
-    
-    img = Image.fromarray(img_array)
-    
-    # Apply slight blur for organic look
-    img = img.filter(ImageFilter.GaussianBlur(radius=1))
-    
-    return img
+# Lesions painted per class, layer after layer. Each layer gives the count
+# range, RGB ranges and radius range (or separate x/y radius ranges for
+# elongated shapes), optionally with a halo drawn under every lesion
+# (extra radius, RGB ranges). Ranges are inclusive.
+LESION_LAYERS = {
+    # The original drew light highlights on the image its brightness step
+    # then replaced, so healthy leaves never showed any
+    'healthy': [],
+    'bacterial_wilt': [
+        # Brown/yellow wilting patches
+        {'count': (10, 25), 'color': ((120, 180), (90, 140), (40, 80)), 'radius': (8, 20)},
+    ],
+    'rhizome_rot': [
+        # Dark brown/black rotting areas, then lighter brown edges (rot progression)
+        {'count': (8, 18), 'color': ((30, 70), (20, 50), (15, 40)), 'radius': (10, 25)},
+        {'count': (5, 10), 'color': ((80, 120), (60, 90), (40, 70)), 'radius': (6, 15)},
+    ],
+    'leaf_spot': [
+        # Dark brown spots with a yellow halo
+        {'count': (15, 40), 'color': ((60, 100), (40, 70), (30, 60)), 'radius': (3, 8),
+         'halo': (3, ((180, 220), (180, 220), (80, 120)))},
+    ],
+    'soft_rot': [
+        # Light brownish, watery patches
+        {'count': (12, 25), 'color': ((140, 200), (140, 180), (100, 140)), 'radius': (12, 22)},
+    ],
+    'yellow_disease': [
+        # Yellow patches
+        {'count': (20, 40), 'color': ((200, 240), (200, 240), (60, 120)), 'radius': (5, 15)},
+    ],
+    'root_knot_nematode': [
+        # Brown/yellowish stress patches, then swelling-like structures
+        {'count': (8, 15), 'color': ((100, 150), (90, 130), (50, 90)), 'radius': (10, 20)},
+        {'count': (3, 8), 'color': ((80, 120), (70, 110), (40, 80)), 'radius': ((8, 15), (15, 25))},
+    ],
+}
 
-def add_veins(img, draw, color=(40, 80, 40)):
-    """Add leaf vein patterns"""
-    width, height = img.size
-    
-    # Main central vein
-    draw.line([(width//2, 0), (width//2, height)], fill=color, width=2)
-    
-    # Side veins
-    for i in range(5, height-5, 30):
-        offset = random.randint(-10, 10)
-        draw.line([(width//2, i), (random.randint(0, width//4), i+offset)], fill=color, width=1)
-        draw.line([(width//2, i), (random.randint(3*width//4, width), i+offset)], fill=color, width=1)
+VEIN_COLOR = (40, 80, 40)
+
+# Bump when rendering changes: seeds only reproduce images of the same renderer
+RENDERER_VERSION = 3
+DEFAULT_SEED = 42
+SHARD_SIZE = 64  # Images per worker task and checkpoint unit
+JPEG_QUALITY = 85
+CHECKPOINT_NAME = '.synthetic_checkpoint.json'
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _randint(rng, low, high, size=None):
+    """random.randint equivalent (inclusive bounds) on a numpy Generator"""
+    return rng.integers(low, high + 1, size=size)
+
+
+def _to_uint8(images):
+    return np.clip(images, 0, 255).astype(np.uint8)
+
+
+def _gaussian_blur(images, sigma=1.0):
+    """Separable Gaussian blur of a (N, H, W, C) batch, edges replicated"""
+    radius = int(3 * sigma)
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-offsets ** 2 / (2 * sigma ** 2))
+    kernel = (kernel / kernel.sum()).astype(np.float32)
+    height, width = images.shape[1:3]
+
+    padded = np.pad(images.astype(np.float32), [(0, 0), (radius, radius), (0, 0), (0, 0)], mode='edge')
+    blurred = sum(weight * padded[:, offset:offset + height] for offset, weight in enumerate(kernel))
+    padded = np.pad(blurred, [(0, 0), (0, 0), (radius, radius), (0, 0)], mode='edge')
+    return sum(weight * padded[:, :, offset:offset + width] for offset, weight in enumerate(kernel))
+
+
+def _normal(rng, sigma, shape):
+    """float32 Gaussian noise (half the cost of float64 at this size)"""
+    return rng.standard_normal(shape, dtype=np.float32) * np.float32(sigma)
+
+
+def create_leaf_textures(count, image_size=(224, 224), rng=None):
+    """Realistic leaf-like base textures as a (count, height, width, 3) uint8 batch"""
+    rng = rng or np.random.default_rng()
+    width, height = image_size
+
+    # Base green color with per-pixel variation (shared by the three channels);
+    # base + variation stays within 0-255, so it needs no clipping of its own
+    base = np.stack([
+        _randint(rng, 30, 60, count), _randint(rng, 100, 160, count), _randint(rng, 30, 60, count)
+    ], axis=-1).astype(np.float32)
+    variation = rng.integers(-15, 16, (count, height, width, 1), dtype=np.int16).astype(np.float32)
+
+    # Gaussian noise for texture, then a slight blur for an organic look
+    images = _to_uint8(base[:, None, None, :] + variation + _normal(rng, 10, (count, height, width, 3)))
+    return _to_uint8(_gaussian_blur(images, sigma=1.0))
+
+
+def add_veins(images, mask=None, rng=None, color=VEIN_COLOR):
+    """Draw leaf veins in place on the images selected by mask (default: all)"""
+    rng = rng or np.random.default_rng()
+    count, height, width = images.shape[:3]
+    if mask is None:
+        mask = np.ones(count, dtype=bool)
+
+    # Main central vein (2px) plus side veins every 30 rows towards both edges
+    rows = np.arange(5, height - 5, 30)
+    offsets = _randint(rng, -10, 10, (count, len(rows)))
+    left = _randint(rng, 0, width // 4, (count, len(rows)))
+    right = _randint(rng, 3 * width // 4, width, (count, len(rows)))
+    start_x = np.full((count, 2 * len(rows)), width // 2)
+    start_y = np.tile(rows, (count, 2))
+    end_x = np.concatenate([left, right], axis=1)
+    end_y = start_y + np.concatenate([offsets, offsets], axis=1)
+
+    # Rasterize all segments at once by sampling points along them
+    steps = np.linspace(0, 1, 2 * max(width, height))
+    xs = np.rint(start_x[..., None] + steps * (end_x - start_x)[..., None]).astype(int)
+    ys = np.rint(start_y[..., None] + steps * (end_y - start_y)[..., None]).astype(int)
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height) & mask[:, None, None]
+    image_idx = np.broadcast_to(np.arange(count)[:, None, None], xs.shape)
+    vein_mask = np.zeros((count, height, width), dtype=bool)
+    vein_mask[image_idx[inside], ys[inside], xs[inside]] = True
+    vein_mask[:, :, max(0, width // 2 - 1):width // 2 + 1] |= mask[:, None, None]
+
+    images[vein_mask] = color
+    return images
+
+
+def _paint_ellipses(images, centers, radii, colors, active):
+    """
+    Paint ellipse slot k of every image, for k in order (later slots cover
+    earlier ones). centers/radii are (N, K, 2) as (x, y), colors (N, K, 3),
+    active (N, K). Only the bounding box of each slot is evaluated.
+    """
+    count, height, width = images.shape[:3]
+    box = np.arange(-int(radii.max()) - 1, int(radii.max()) + 2)
+    for k in range(centers.shape[1]):
+        selected = np.nonzero(active[:, k])[0]
+        if not len(selected):
+            continue
+        cx, cy = centers[selected, k, 0], centers[selected, k, 1]
+        rx, ry = radii[selected, k, 0] + 0.5, radii[selected, k, 1] + 0.5
+        xs = cx[:, None] + box  # (S, B)
+        ys = cy[:, None] + box
+        inside = (((xs - cx[:, None]) / rx[:, None])[:, None, :] ** 2
+                  + ((ys - cy[:, None]) / ry[:, None])[:, :, None] ** 2) <= 1
+        inside &= ((ys >= 0) & (ys < height))[:, :, None] & ((xs >= 0) & (xs < width))[:, None, :]
+        s, i, j = np.nonzero(inside)
+        images[selected[s], ys[s, i], xs[s, j]] = colors[selected[s], k]
+    return images
+
+
+def paint_lesions(images, layers, rng=None):
+    """Paint a class' lesion layers (see LESION_LAYERS) in place on a batch"""
+    rng = rng or np.random.default_rng()
+    count, height, width = images.shape[:3]
+    for layer in layers:
+        low, high = layer['count']
+        active = np.arange(high)[None, :] < _randint(rng, low, high, count)[:, None]
+        centers = np.stack([_randint(rng, 0, width, (count, high)), _randint(rng, 0, height, (count, high))], axis=-1)
+        if isinstance(layer['radius'][0], tuple):
+            radii = np.stack([_randint(rng, *layer['radius'][0], (count, high)),
+                              _randint(rng, *layer['radius'][1], (count, high))], axis=-1)
+        else:
+            radii = np.repeat(_randint(rng, *layer['radius'], (count, high))[..., None], 2, axis=-1)
+        colors = np.stack([_randint(rng, *channel, (count, high)) for channel in layer['color']], axis=-1)
+
+        if 'halo' not in layer:
+            _paint_ellipses(images, centers, radii, colors, active)
+            continue
+        # Halo and lesion alternate: halo_0, lesion_0, halo_1, lesion_1, ...
+        pad, halo_color = layer['halo']
+        halo_colors = np.stack([_randint(rng, *channel, (count, high)) for channel in halo_color], axis=-1)
+        interleave = lambda a, b: np.stack([a, b], axis=2).reshape(count, 2 * high, *a.shape[2:])
+        _paint_ellipses(images, interleave(centers, centers), interleave(radii + pad, radii),
+                        interleave(halo_colors, colors), interleave(active, active))
+    return images
+
+
+def _luma(images):
+    return images.astype(np.float32) @ LUMA_WEIGHTS
+
+
+def adjust_brightness(images, factors):
+    """ImageEnhance.Brightness with one factor per image"""
+    return _to_uint8(images * np.asarray(factors, dtype=np.float32).reshape(-1, 1, 1, 1))
+
+
+def adjust_color(images, factors):
+    """ImageEnhance.Color (saturation) with one factor per image"""
+    gray = np.floor(_luma(images))[..., None]
+    factors = np.asarray(factors, dtype=np.float32).reshape(-1, 1, 1, 1)
+    return _to_uint8(gray + factors * (images - gray))
+
+
+def adjust_contrast(images, factors):
+    """ImageEnhance.Contrast with one factor per image"""
+    mean = np.floor(np.floor(_luma(images)).mean(axis=(1, 2)) + 0.5).reshape(-1, 1, 1, 1)
+    factors = np.asarray(factors, dtype=np.float32).reshape(-1, 1, 1, 1)
+    return _to_uint8(mean + factors * (images - mean))
+
+
+def rotate(images, angles):
+    """Rotate each image counter-clockwise by its angle (degrees) about the center, nearest neighbour, black fill"""
+    count, height, width = images.shape[:3]
+    theta = np.radians(np.asarray(angles, dtype=np.float64))[:, None, None]
+    y, x = np.mgrid[0:height, 0:width]
+    x = x + 0.5 - width / 2
+    y = y + 0.5 - height / 2
+    src_x = np.floor(np.cos(theta) * x + np.sin(theta) * y + width / 2).astype(int)
+    src_y = np.floor(-np.sin(theta) * x + np.cos(theta) * y + height / 2).astype(int)
+    valid = (src_x >= 0) & (src_x < width) & (src_y >= 0) & (src_y < height)
+    image_idx = np.broadcast_to(np.arange(count)[:, None, None], src_x.shape)
+    rotated = images[image_idx, np.clip(src_y, 0, height - 1), np.clip(src_x, 0, width - 1)]
+    rotated[~valid] = 0
+    return rotated
+
+
+def apply_augmentation(images, rng=None):
+    """Apply realistic augmentations to a batch, each image drawing its own parameters"""
+    rng = rng or np.random.default_rng()
+    count = len(images)
+
+    # Random rotation
+    angles = np.where(rng.random(count) > 0.5, rng.uniform(-15, 15, count), 0.0)
+    if angles.any():
+        images = rotate(images, angles)
+
+    # Random flip
+    flip = rng.random(count) > 0.5
+    images[flip] = images[flip, :, ::-1]
+
+    # Random brightness, contrast and saturation
+    images = adjust_brightness(images, np.where(rng.random(count) > 0.3, rng.uniform(0.7, 1.3, count), 1.0))
+    images = adjust_contrast(images, np.where(rng.random(count) > 0.3, rng.uniform(0.8, 1.2, count), 1.0))
+    images = adjust_color(images, np.where(rng.random(count) > 0.3, rng.uniform(0.8, 1.2, count), 1.0))
+
+    # Add final noise
+    sigma = _randint(rng, 3, 8, count).reshape(-1, 1, 1, 1).astype(np.float32)
+    return _to_uint8(images + _normal(rng, 1, images.shape) * sigma)
+
+
+def render_images(class_name, count, image_size=(224, 224), rng=None):
+    """Render count synthetic images of class_name as a (count, height, width, 3) uint8 batch"""
+    rng = rng or np.random.default_rng()
+
+    # Base leaf texture, with veins on 70% of the images
+    images = create_leaf_textures(count, image_size, rng)
+    add_veins(images, mask=rng.random(count) > 0.3, rng=rng)
 
-def create_sample_image(class_name, image_size=(224, 224), variation=0):
-    """Create an advanced synthetic image for a given disease class"""
-    
-    # Create base leaf texture
-    img = create_leaf_texture(image_size)
-    draw = ImageDraw.Draw(img)
-    
-    # Add leaf veins for realism
-    if random.random() > 0.3:  # 70% chance to add veins
-        add_veins(img, draw)
-    
     # Disease-specific modifications
     if class_name == 'healthy':
-        # Keep mostly green, add slight variations
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(random.uniform(0.9, 1.1))
-        
-        # Add some random light spots (highlights)
-        for _ in range(random.randint(5, 15)):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(60, 100), random.randint(140, 180), random.randint(60, 100))
-            radius = random.randint(3, 8)
-            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
-    
-    elif class_name == 'bacterial_wilt':
-        # Yellow/brown wilting patches
-        for _ in range(random.randint(10, 25)):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            # Brown/yellow colors for wilting
-            color = (random.randint(120, 180), random.randint(90, 140), random.randint(40, 80))
-            radius = random.randint(8, 20)
-            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
-        
+        # Keep mostly green with slight brightness variation
+        images = adjust_brightness(images, rng.uniform(0.9, 1.1, count))
+    elif class_name == 'yellow_disease':
+        # Overall yellowing with some green remaining: more red and green, less blue.
+        # Wraps around in uint8 like the original, whose np.clip came after the overflow.
+        shift = np.stack([
+            _randint(rng, 40, 80, count), _randint(rng, 30, 60, count), -_randint(rng, 10, 30, count)
+        ], axis=-1)
+        images = ((images.astype(np.int16) + shift[:, None, None, :].astype(np.int16)) % 256).astype(np.uint8)
+
+    paint_lesions(images, LESION_LAYERS[class_name], rng)
+
+    if class_name == 'bacterial_wilt':
         # Reduce overall brightness (wilted look)
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(0.7)
-    
-    elif class_name == 'rhizome_rot':
-        # Dark brown/black rotting areas
-        for _ in range(random.randint(8, 18)):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            # Dark brown/black colors
-            color = (random.randint(30, 70), random.randint(20, 50), random.randint(15, 40))
-            radius = random.randint(10, 25)
-            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
-        
-        # Add some lighter brown edges (rot progression)
-        for _ in range(random.randint(5, 10)):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(80, 120), random.randint(60, 90), random.randint(40, 70))
-            radius = random.randint(6, 15)
-            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
-    
-    elif class_name == 'leaf_spot':
-        # Multiple small circular spots
-        num_spots = random.randint(15, 40)
-        for _ in range(num_spots):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            # Dark brown spots with yellow halo
-            radius = random.randint(3, 8)
-            
-            # Yellow halo
-            halo_color = (random.randint(180, 220), random.randint(180, 220), random.randint(80, 120))
-            draw.ellipse([x-radius-3, y-radius-3, x+radius+3, y+radius+3], fill=halo_color)
-            
-            # Dark center
-            spot_color = (random.randint(60, 100), random.randint(40, 70), random.randint(30, 60))
-            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=spot_color)
-    
+        images = adjust_brightness(images, np.full(count, 0.7))
     elif class_name == 'soft_rot':
-        # Water-soaked, translucent appearance
-        for _ in range(random.randint(12, 25)):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            # Light brownish, watery colors
-            color = (random.randint(140, 200), random.randint(140, 180), random.randint(100, 140))
-            radius = random.randint(12, 22)
-            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
-        
         # Increase brightness slightly (water-soaked look)
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(1.1)
-    
-    elif class_name == 'yellow_disease':
-        # Overall yellowing with some green remaining
-        img_array = np.array(img)
-        
-        # Shift colors toward yellow
-        img_array[:, :, 0] = np.clip(img_array[:, :, 0] + random.randint(40, 80), 0, 255)  # More red
-        img_array[:, :, 1] = np.clip(img_array[:, :, 1] + random.randint(30, 60), 0, 255)  # More green
-        img_array[:, :, 2] = np.clip(img_array[:, :, 2] - random.randint(10, 30), 0, 255)  # Less blue
-        
-        img = Image.fromarray(img_array)
-        
-        # Add yellow patches
-        draw = ImageDraw.Draw(img)
-        for _ in range(random.randint(20, 40)):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(200, 240), random.randint(200, 240), random.randint(60, 120))
-            radius = random.randint(5, 15)
-            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
-    
+        images = adjust_brightness(images, np.full(count, 1.1))
     elif class_name == 'root_knot_nematode':
-        # Stunted, stressed appearance with swellings
-        for _ in range(random.randint(8, 15)):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            # Brown/yellowish stress colors
-            color = (random.randint(100, 150), random.randint(90, 130), random.randint(50, 90))
-            radius = random.randint(10, 20)
-            draw.ellipse([x-radius, y-radius, x+radius, y+radius], fill=color)
-        
-        # Add some swelling-like structures
-        for _ in range(random.randint(3, 8)):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(80, 120), random.randint(70, 110), random.randint(40, 80))
-            width = random.randint(8, 15)
-            height = random.randint(15, 25)
-            draw.ellipse([x-width, y-height, x+width, y+height], fill=color)
-        
         # Reduce saturation (stressed plant)
-        enhancer = ImageEnhance.Color(img)
-        img = enhancer.enhance(0.7)
-    
+        images = adjust_color(images, np.full(count, 0.7))
+
     # Apply final realistic touches
-    img = apply_augmentation(img, variation)
-    
-    return img
+    return apply_augmentation(images, rng)
 
-def apply_augmentation(img, variation=0):
-    """Apply realistic augmentations to the image"""
-    
-    # Random rotation
-    if random.random() > 0.5:
-        angle = random.uniform(-15, 15)
-        img = img.rotate(angle, fillcolor=(0, 0, 0))
-    
-    # Random flip
-    if random.random() > 0.5:
-        img = img.transpose(Image.FLIP_LEFT_RIGHT)
-    
-    # Random brightness
-    if random.random() > 0.3:
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(random.uniform(0.7, 1.3))
-    
-    # Random contrast
-    if random.random() > 0.3:
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(random.uniform(0.8, 1.2))
-    
-    # Random saturation
-    if random.random() > 0.3:
-        enhancer = ImageEnhance.Color(img)
-        img = enhancer.enhance(random.uniform(0.8, 1.2))
-    
-    # Add final noise
-    img_array = np.array(img)
-    noise = np.random.normal(0, random.randint(3, 8), img_array.shape)
-    img_array = np.clip(img_array + noise, 0, 255).astype(np.uint8)
-    img = Image.fromarray(img_array)
-    
-    return img
 
-def create_sample_dataset(images_per_class=100):
-    """Create comprehensive synthetic dataset with images for each class"""
+def create_sample_image(class_name, image_size=(224, 224), variation=0, rng=None):
+    """Create an advanced synthetic image for a given disease class"""
+    return Image.fromarray(render_images(class_name, 1, image_size, rng)[0])
+
+def image_rng(class_name, index, seed=DEFAULT_SEED):
+    """
+    Generator for one image, derived from the master seed, the class and the
+    image index only, so any image can be regenerated on its own.
+    """
+    class_key = int.from_bytes(hashlib.sha256(class_name.encode()).digest()[:8], 'big')
+    return np.random.default_rng(np.random.SeedSequence([seed, class_key, index]))
+
+
+def regenerate_image(class_name, index, seed=DEFAULT_SEED, image_size=(224, 224)):
+    """Exactly re-render image {class_name}_{index:05d} of a dataset generated with seed"""
+    return Image.fromarray(render_images(class_name, 1, image_size, image_rng(class_name, index, seed))[0])
+
+
+def _generate_shard(task):
+    """
+    Worker: render and JPEG-encode images [start, stop) of one class.
+    task is (class_name, start, stop, seed, class_dir, image_size, quality).
+    Returns (shard key, images written, errors).
+    """
+    class_name, start, stop, seed, class_dir, image_size, quality = task
+    written, errors = 0, []
+    for index in range(start, stop):
+        try:
+            image = regenerate_image(class_name, index, seed, image_size)
+            img_path = Path(class_dir) / f"{class_name}_{index:05d}.jpg"
+            tmp_path = img_path.with_name(f".{img_path.name}.tmp")
+            image.save(tmp_path, "JPEG", quality=quality)
+            os.replace(tmp_path, img_path)
+            written += 1
+        except Exception as e:
+            errors.append(f"{class_name} image {index}: {e}")
+    return f"{class_name}:{start}", written, errors
+
+
+class ShardCheckpoint:
+    """Completed shards of a generation run, valid only for identical parameters"""
+
+    def __init__(self, path, params):
+        self.path = Path(path)
+        self.params = params
+        self.completed = set()
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('params') == params:
+                self.completed = set(data['completed'])
+
+    def save(self):
+        """Atomically persist the checkpoint"""
+        tmp_path = self.path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'params': self.params, 'completed': sorted(self.completed)}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def create_sample_dataset(images_per_class=100, seed=DEFAULT_SEED, num_workers=None, restart=False,
+                          dataset_dir="data/raw/ginger_dataset", image_size=(224, 224)):
+    """
+    Create comprehensive synthetic dataset with images for each class
+    Generation is split into shards of SHARD_SIZE images rendered and
+    encoded by worker processes. Every image has its own seed (see
+    image_rng), so the output does not depend on the worker count. Finished
+    shards are checkpointed, and an interrupted run with the same
+    parameters resumes with the missing shards only (unless restart).
+    """
     
     print("🌱 Creating Advanced Synthetic Ginger Disease Dataset")
     print("=" * 60)
     print(f"📊 Target: {images_per_class} images per class")
     print(f"📊 Total: {len(DISEASE_CLASSES) * images_per_class} images")
+    print(f"🎲 Seed: {seed}")
     print("=" * 60)
     
     # Create dataset directory
-    dataset_dir = Path("data/raw/ginger_dataset")
+    dataset_dir = Path(dataset_dir)
     dataset_dir.mkdir(parents=True, exist_ok=True)
     
     # Create class directories
@@ -256,33 +388,38 @@ def create_sample_dataset(images_per_class=100):
         class_dir = dataset_dir / class_name
         class_dir.mkdir(exist_ok=True)
     
-    # Generate sample images with progress tracking
-    total_images = 0
-    
-    for class_name in DISEASE_CLASSES:
-        print(f"\n🎨 Generating {images_per_class} images for '{class_name}'...")
-        
-        class_dir = dataset_dir / class_name
-        
-        for i in range(images_per_class):
-            try:
-                # Create sample image with variation
-                img = create_sample_image(class_name, variation=i)
-                
-                # Save image
-                filename = f"{class_name}_{i:05d}.jpg"
-                img_path = class_dir / filename
-                img.save(img_path, "JPEG", quality=85)
-                
-                total_images += 1
-                
-                # Progress indicator
-                if (i + 1) % 20 == 0:
-                    progress = (i + 1) / images_per_class * 100
-                    print(f"  ✅ Generated {i+1}/{images_per_class} images ({progress:.0f}%)")
-                    
-            except Exception as e:
-                print(f"  ❌ Error creating image {i}: {e}")
+    params = {
+        'seed': seed, 'images_per_class': images_per_class, 'shard_size': SHARD_SIZE,
+        'image_size': list(image_size), 'quality': JPEG_QUALITY, 'renderer_version': RENDERER_VERSION
+    }
+    checkpoint = ShardCheckpoint(dataset_dir / CHECKPOINT_NAME, params)
+    if restart:
+        checkpoint.completed = set()
+    
+    tasks = [
+        (class_name, start, min(start + SHARD_SIZE, images_per_class), seed, str(dataset_dir / class_name),
+         tuple(image_size), JPEG_QUALITY)
+        for class_name in DISEASE_CLASSES
+        for start in range(0, images_per_class, SHARD_SIZE)
+        if f"{class_name}:{start}" not in checkpoint.completed
+    ]
+    if checkpoint.completed:
+        print(f"⏩ Resuming: {len(checkpoint.completed)} shards already done, {len(tasks)} to go")
+    
+    # Render and encode shards in parallel, checkpointing as they finish
+    total_images = sum(
+        min(SHARD_SIZE, images_per_class - int(key.split(':')[1])) for key in checkpoint.completed
+    )
+    errors = []
+    for key, written, shard_errors in run_parallel_stream(_generate_shard, tasks, num_workers, desc="Shards"):
+        total_images += written
+        errors.extend(shard_errors)
+        if not shard_errors:
+            checkpoint.completed.add(key)
+            checkpoint.save()
+    
+    for error in errors:
+        print(f"  ❌ Error creating {error}")
     
     print(f"\n" + "=" * 60)
     print(f"🎉 Synthetic Dataset Created Successfully!")
@@ -303,6 +440,14 @@ def create_sample_dataset(images_per_class=100):
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description='Generate a synthetic ginger disease dataset')
+    parser.add_argument('images_per_class', nargs='?', type=int, help='Images per class (prompted if omitted)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Master seed; same seed, same images')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: PREPROCESSING_CONFIG)')
+    parser.add_argument('--restart', action='store_true', help='Ignore the shard checkpoint and regenerate all')
+    args = parser.parse_args()
+    
     print("🔬 Advanced Synthetic Dataset Generator")
     print("Version: 2.0\n")
     
@@ -313,8 +458,8 @@ def main():
     print("  - Optimal: 200 (best results)")
     
     try:
-        if len(sys.argv) > 1:
-            images_per_class = int(sys.argv[1])
+        if args.images_per_class is not None:
+            images_per_class = args.images_per_class
         else:
             user_input = input("\nEnter number (default: 100): ").strip()
             images_per_class = int(user_input) if user_input else 100
@@ -327,7 +472,8 @@ def main():
         
         print(f"\n✅ Creating {images_per_class} images per class...\n")
         
-        success = create_sample_dataset(images_per_class)
+        success = create_sample_dataset(images_per_class, seed=args.seed, num_workers=args.workers,
+                                        restart=args.restart)
         
         if success:
             print(f"\n🚀 Next Steps:")
@@ -341,7 +487,7 @@ def main():
         print("❌ Invalid input. Please enter a number.")
         return False
     except KeyboardInterrupt:
-        print("\n\n❌ Generation cancelled by user.")
+        print("\n\n❌ Generation cancelled by user. Re-run with the same count and seed to resume.")
         return False
     except Exception as e:
         print(f"\n❌ Error: {e}")
@@ -22,8 +22,14 @@ DISEASE_CLASSES = [
     'root_knot_nematode'
 ]
 
-def create_sample_image(class_name, image_size=(224, 224)):
-    """Create a sample image for a given disease class"""
+def create_sample_image(class_name, image_size=(224, 224), rng=None, np_rng=None):
+    """
+    Create a sample image for a given disease class
+    rng (random.Random) and np_rng (np.random.RandomState) default to the
+    global generators.
+    """
+    rng = rng or random
+    np_rng = np_rng or np.random
     
     # Create base image with green background (ginger plant)
     img = Image.new('RGB', image_size, color=(34, 139, 34))  # Forest green
@@ -33,62 +39,62 @@ def create_sample_image(class_name, image_size=(224, 224)):
     if class_name == 'healthy':
         # Healthy green with some texture
         for _ in range(50):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(20, 60), random.randint(100, 150), random.randint(20, 60))
+            x = rng.randint(0, image_size[0])
+            y = rng.randint(0, image_size[1])
+            color = (rng.randint(20, 60), rng.randint(100, 150), rng.randint(20, 60))
             draw.ellipse([x-2, y-2, x+2, y+2], fill=color)
     
     elif class_name == 'bacterial_wilt':
         # Yellow/brown spots
         for _ in range(30):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(150, 200), random.randint(100, 150), random.randint(50, 100))
+            x = rng.randint(0, image_size[0])
+            y = rng.randint(0, image_size[1])
+            color = (rng.randint(150, 200), rng.randint(100, 150), rng.randint(50, 100))
             draw.ellipse([x-3, y-3, x+3, y+3], fill=color)
     
     elif class_name == 'rhizome_rot':
         # Dark brown/black spots
         for _ in range(25):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(50, 100), random.randint(30, 80), random.randint(30, 80))
+            x = rng.randint(0, image_size[0])
+            y = rng.randint(0, image_size[1])
+            color = (rng.randint(50, 100), rng.randint(30, 80), rng.randint(30, 80))
             draw.ellipse([x-4, y-4, x+4, y+4], fill=color)
     
     elif class_name == 'leaf_spot':
         # Small dark spots
         for _ in range(40):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(80, 120), random.randint(50, 100), random.randint(50, 100))
+            x = rng.randint(0, image_size[0])
+            y = rng.randint(0, image_size[1])
+            color = (rng.randint(80, 120), rng.randint(50, 100), rng.randint(50, 100))
             draw.ellipse([x-2, y-2, x+2, y+2], fill=color)
     
     elif class_name == 'soft_rot':
         # Watery, translucent spots
         for _ in range(35):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(200, 255), random.randint(200, 255), random.randint(150, 200))
+            x = rng.randint(0, image_size[0])
+            y = rng.randint(0, image_size[1])
+            color = (rng.randint(200, 255), rng.randint(200, 255), rng.randint(150, 200))
             draw.ellipse([x-3, y-3, x+3, y+3], fill=color)
     
     elif class_name == 'yellow_disease':
         # Yellow discoloration
         for _ in range(60):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(200, 255), random.randint(200, 255), random.randint(100, 150))
+            x = rng.randint(0, image_size[0])
+            y = rng.randint(0, image_size[1])
+            color = (rng.randint(200, 255), rng.randint(200, 255), rng.randint(100, 150))
             draw.ellipse([x-2, y-2, x+2, y+2], fill=color)
     
     elif class_name == 'root_knot_nematode':
         # Swollen, knotted appearance
         for _ in range(20):
-            x = random.randint(0, image_size[0])
-            y = random.randint(0, image_size[1])
-            color = (random.randint(100, 150), random.randint(80, 120), random.randint(60, 100))
+            x = rng.randint(0, image_size[0])
+            y = rng.randint(0, image_size[1])
+            color = (rng.randint(100, 150), rng.randint(80, 120), rng.randint(60, 100))
             draw.ellipse([x-5, y-5, x+5, y+5], fill=color)
     
     # Add some noise for realism
     img_array = np.array(img)
-    noise = np.random.randint(-20, 20, img_array.shape)
+    noise = np_rng.randint(-20, 20, img_array.shape)
     img_array = np.clip(img_array + noise, 0, 255).astype(np.uint8)
     img = Image.fromarray(img_array)
     
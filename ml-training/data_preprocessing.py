@@ -2,83 +2,268 @@
 Data preprocessing pipeline for Ginger Disease Detection
 """
 import os
+import argparse
 import shutil
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from PIL import Image
 import cv2
-from sklearn.model_selection import train_test_split
 from sklearn.utils.class_weight import compute_class_weight
 import albumentations as A
 from tqdm import tqdm
 import json
+import time
+from functools import partial
 
 from config import *
+from parallel_utils import resolve_num_workers, run_parallel
+from dataset_store import ContentStore, hash_file, store_and_link
+from dataset_manifest import DatasetManifest, scan_image_tree
+from near_duplicates import compute_hashes, find_near_duplicate_groups, summarize_clusters
+from split_assignment import SPLIT_NAMES, SplitManifest, assign_group_splits, stratification_report
+import shard_records
+from image_loading import imread_reduced
+from image_validation import TIER_STRUCTURE, validate_file
+from image_pyramid import ImagePyramid, list_images, resolve_image_path
+from dataset_stats import compute_dataset_stats, normalization_stats
+
+
+def _inspect_image(img_path, tier=TIER_STRUCTURE):
+    """
+    Verify image integrity up to the given validation tier and hash its contents.
+    Returns (digest, size, error) - error is None when the image is valid.
+    """
+    result = validate_file(img_path, tier)
+    if result['error']:
+        return None, 0, result['error']
+    try:
+        return hash_file(img_path), result['size'], None
+    except Exception as e:
+        return None, 0, str(e)
+
 
 class GingerDataPreprocessor:
     def __init__(self):
         self.img_height = TRAINING_CONFIG['img_height']
         self.img_width = TRAINING_CONFIG['img_width']
         self.disease_classes = DISEASE_CLASSES
+        self._normalization = None
         
-    def organize_dataset(self, source_dir):
+    def organize_dataset(self, source_dir, num_workers=None, rebuild=False):
         """
         Organize raw dataset into proper structure
         Expected input structure: source_dir/disease_name/image_files
+        Verification and placement are fanned out over num_workers processes
+        (defaults to PREPROCESSING_CONFIG['num_workers']; 1 runs in-process).
+        Images go through the content-addressed store: class directories get
+        links to deduplicated blobs instead of full copies.
+        Runs are incremental: a persistent manifest records every source file,
+        so only new, changed or deleted files are processed and existing images
+        keep their names. rebuild=True discards the manifest and starts over.
         """
         print("📁 Organizing dataset structure...")
         
         organized_dir = PROCESSED_DATASET_PATH
         organized_dir.mkdir(exist_ok=True, parents=True)
+        num_workers = resolve_num_workers(num_workers)
+        store = ContentStore()
+        manifest = DatasetManifest(ORGANIZE_MANIFEST_PATH)
+        
+        def release(rel_path):
+            """Remove the organized file owned by a manifest entry"""
+            entry = manifest.entries.get(rel_path) or {}
+            if entry.get('dest'):
+                dest_path = organized_dir / entry['dest']
+                if dest_path.exists():
+                    dest_path.unlink()
+                store.forget(dest_path)
+                entry['dest'] = None
+        
+        if rebuild:
+            for rel_path in list(manifest.entries):
+                release(rel_path)
+            manifest.entries = {}
+        
+        for disease_class in self.disease_classes:
+            (organized_dir / disease_class).mkdir(exist_ok=True)
+            if not (Path(source_dir) / disease_class).exists():
+                print(f"⚠️  Warning: {disease_class} directory not found in source")
+        
+        start_time = time.perf_counter()
+        
+        # Single scandir pass over the source tree
+        scanned = scan_image_tree(source_dir, self.disease_classes, PREPROCESSING_CONFIG['valid_extensions'])
+        
+        # Deleted sources: drop their organized files
+        deleted = [rel_path for rel_path in manifest.entries if rel_path not in scanned]
+        released_dests = set()
+        for rel_path in deleted:
+            released_dests.add(manifest.entries[rel_path].get('dest'))
+            release(rel_path)
+            del manifest.entries[rel_path]
+        
+        # New or changed sources, plus anything whose organized file went missing
+        pending = []
+        for rel_path, (_, size, mtime_ns) in scanned.items():
+            entry = manifest.entries.get(rel_path)
+            if (manifest.is_unchanged(rel_path, size, mtime_ns)
+                    and (not entry.get('dest') or (organized_dir / entry['dest']).exists())):
+                continue
+            pending.append(rel_path)
+            if entry:
+                released_dests.add(entry.get('dest'))
+        
+        # Duplicates of released images must be re-evaluated
+        released_dests.discard(None)
+        pending_set = set(pending)
+        for rel_path, entry in manifest.entries.items():
+            if entry.get('duplicate_of') in released_dests and rel_path not in pending_set:
+                pending.append(rel_path)
+        pending.sort()
+        
+        # Verify (tiered, see image_validation.py) and hash pending images in parallel
+        inspected = run_parallel(
+            partial(_inspect_image, tier=PREPROCESSING_CONFIG['organize_validation_tier']),
+            [str(Path(source_dir) / rel_path) for rel_path in pending],
+            num_workers, desc="Verifying"
+        )
         
+        pending_set = set(pending)
+        # Collapsing is per class: the same bytes in two classes are linked into both
+        seen_digests = {
+            (entry['class'], entry['digest']): entry['dest'] for rel_path, entry in manifest.entries.items()
+            if entry.get('dest') and rel_path not in pending_set
+        }
+        next_index = {disease_class: manifest.next_index(disease_class) for disease_class in self.disease_classes}
+        
+        # Assign destinations in source order; existing images keep their names
+        link_tasks = []
+        for rel_path, (digest, _, error) in zip(pending, inspected):
+            disease_class, size, mtime_ns = scanned[rel_path]
+            old_dest = (manifest.entries.get(rel_path) or {}).get('dest')
+            entry = {'class': disease_class, 'size': size, 'mtime_ns': mtime_ns, 'digest': digest, 'dest': None}
+            
+            if error is not None:
+                print(f"❌ Error processing {Path(source_dir) / rel_path}: {error}")
+                release(rel_path)
+                manifest.entries[rel_path] = dict(entry, error=error)
+                continue
+            duplicate_of = seen_digests.get((disease_class, digest))
+            if duplicate_of is not None and duplicate_of != old_dest:
+                # Byte-identical duplicate within the class: collapse onto the first occurrence
+                release(rel_path)
+                manifest.entries[rel_path] = dict(entry, duplicate_of=duplicate_of)
+                continue
+            
+            if old_dest:
+                dest = old_dest
+            else:
+                dest = f"{disease_class}/{disease_class}_{next_index[disease_class]:05d}{Path(rel_path).suffix}"
+                next_index[disease_class] += 1
+            seen_digests[(disease_class, digest)] = dest
+            manifest.entries[rel_path] = entry
+            link_tasks.append((rel_path, dest, digest))
+        
+        # Store blobs and link them into class directories in parallel
+        link_results = run_parallel(
+            store_and_link,
+            [(str(store.root), store.link_mode, str(Path(source_dir) / rel_path), str(organized_dir / dest), digest)
+             for rel_path, dest, digest in link_tasks],
+            num_workers,
+            desc="Linking"
+        )
+        
+        for (rel_path, dest, _), (digest, size, _, method, error) in zip(link_tasks, link_results):
+            entry = manifest.entries[rel_path]
+            if error is not None:
+                print(f"❌ Error copying {Path(source_dir) / rel_path}: {error}")
+                entry['error'] = error
+                continue
+            entry['dest'] = dest
+            entry['link'] = method
+            store.record(organized_dir / dest, digest, size)
+        
+        manifest.save()
+        store.save_manifest()
+        elapsed = time.perf_counter() - start_time
+        
+        # Dataset summary is derived from the manifest, so it is the same however it was built
         dataset_info = {
             'classes': {},
             'total_images': 0,
             'class_distribution': {}
         }
-        
         for disease_class in self.disease_classes:
-            class_dir = organized_dir / disease_class
-            class_dir.mkdir(exist_ok=True)
-            
-            source_class_dir = Path(source_dir) / disease_class
-            if not source_class_dir.exists():
-                print(f"⚠️  Warning: {disease_class} directory not found in source")
+            if not (Path(source_dir) / disease_class).exists():
                 continue
-                
-            image_count = 0
-            valid_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
-            
-            for img_file in source_class_dir.iterdir():
-                if img_file.suffix.lower() in valid_extensions:
-                    try:
-                        # Validate and copy image
-                        img = Image.open(img_file)
-                        img.verify()  # Verify image integrity
-                        
-                        # Copy to organized directory
-                        dest_path = class_dir / f"{disease_class}_{image_count:05d}{img_file.suffix}"
-                        shutil.copy2(img_file, dest_path)
-                        image_count += 1
-                        
-                    except Exception as e:
-                        print(f"❌ Error processing {img_file}: {e}")
-                        continue
-            
+            image_count = len(manifest.destinations(disease_class))
             dataset_info['classes'][disease_class] = image_count
             dataset_info['total_images'] += image_count
             dataset_info['class_distribution'][disease_class] = image_count
             
             print(f"✅ {disease_class}: {image_count} images")
         
+        duplicates = [entry for entry in manifest.entries.values() if entry.get('duplicate_of')]
+        duplicate_bytes = sum(entry['size'] for entry in duplicates)
+        linked_bytes = sum(
+            entry['size'] for entry in manifest.entries.values()
+            if entry.get('dest') and entry.get('link') != 'copy'
+        )
+        dataset_info['deduplication'] = {
+            'duplicates_collapsed': len(duplicates),
+            'duplicate_bytes': duplicate_bytes,
+            'linked_bytes': linked_bytes
+        }
+        
+        # Identical images filed under several classes: kept in each, reported as label conflicts
+        dests_by_digest = {}
+        for entry in manifest.entries.values():
+            if entry.get('dest'):
+                dests_by_digest.setdefault(entry['digest'], []).append(entry['dest'])
+        label_conflicts = [
+            sorted(dests) for dests in dests_by_digest.values()
+            if len({dest.split('/')[0] for dest in dests}) > 1
+        ]
+        dataset_info['label_conflicts'] = sorted(label_conflicts)
+        dataset_info['manifest_fingerprint'] = manifest.fingerprint()
+        
         # Save dataset info
         with open(organized_dir / 'dataset_info.json', 'w') as f:
             json.dump(dataset_info, f, indent=2)
             
         print(f"📊 Total images: {dataset_info['total_images']}")
+        print(f"🔄 Changes: {len(pending)} new/changed, {len(deleted)} deleted, "
+              f"{len(scanned) - len(pending)} unchanged")
+        print(f"♻️  Collapsed {len(duplicates)} duplicate(s), "
+              f"saved {(duplicate_bytes + linked_bytes) / (1024 * 1024):.1f} MB versus plain copies")
+        if label_conflicts:
+            print(f"⚠️  {len(label_conflicts)} image(s) are filed under more than one class "
+                  f"(label conflicts, see label_conflicts in dataset_info.json):")
+            for dests in label_conflicts[:10]:
+                print(f"   {' = '.join(dests)}")
+        pending_bytes = sum(scanned[rel_path][1] for rel_path in pending)
+        self._print_throughput(len(pending), pending_bytes, elapsed, num_workers)
         return dataset_info
     
+    def _print_throughput(self, num_images, num_bytes, elapsed, num_workers):
+        """Report processing throughput"""
+        elapsed = max(elapsed, 1e-9)
+        print(f"⏱️  Processed {num_images} files in {elapsed:.2f}s with {num_workers} worker(s)")
+        print(f"   Throughput: {num_images / elapsed:.1f} images/s, "
+              f"{num_bytes / (1024 * 1024) / elapsed:.2f} MB/s")
+    
+    def normalization(self):
+        """
+        Channel (mean, std) for normalization: the cached statistics of the
+        organized dataset (see dataset_stats.py), or ImageNet values until
+        those have been computed. Resolved once per preprocessor.
+        """
+        if self._normalization is None:
+            mean, std, source = normalization_stats(PROCESSED_DATASET_PATH)
+            print(f"🎨 Normalizing with {source} channel statistics: mean={mean}, std={std}")
+            self._normalization = (mean, std)
+        return self._normalization
+    
     def create_augmentation_pipeline(self):
         """Create data augmentation pipeline"""
         return A.Compose([
@@ -120,14 +305,16 @@ class GingerDataPreprocessor:
             
             # Final resize and normalize
             A.Resize(self.img_height, self.img_width),
-            A.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+            A.Normalize(*self.normalization())
         ])
     
     def preprocess_image(self, image_path, augment=False):
         """Preprocess a single image"""
         try:
-            # Load image
-            image = cv2.imread(str(image_path))
+            # Load image: the smallest cached pyramid level that fits, JPEGs
+            # decoded at the smallest scale still >= target size
+            target_size = (self.img_width, self.img_height)
+            image = imread_reduced(resolve_image_path(image_path, target_size), target_size)
             image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
             if augment:
@@ -140,10 +327,9 @@ class GingerDataPreprocessor:
                 image = cv2.resize(image, (self.img_width, self.img_height))
                 image = image.astype(np.float32) / 255.0
                 
-                # ImageNet normalization
-                mean = np.array([0.485, 0.456, 0.406])
-                std = np.array([0.229, 0.224, 0.225])
-                image = (image - mean) / std
+                # Dataset (or ImageNet) channel normalization
+                mean, std = self.normalization()
+                image = (image - np.array(mean)) / np.array(std)
             
             return image
             
@@ -151,20 +337,33 @@ class GingerDataPreprocessor:
             print(f"❌ Error preprocessing {image_path}: {e}")
             return None
     
-    def create_data_splits(self, dataset_dir, test_size=0.2, val_size=0.2):
-        """Create train/validation/test splits"""
+    def create_data_splits(self, dataset_dir, test_size=0.2, val_size=0.2, group_near_duplicates=None,
+                           num_workers=None):
+        """
+        Create train/validation/test splits
+        Splits are assigned by a stable hash (see split_assignment.py) and
+        pinned in a split manifest, so existing images keep their split as the
+        dataset grows and only new images are hashed.
+        With group_near_duplicates (default: PREPROCESSING_CONFIG), images are
+        grouped by perceptual hash first and whole groups are assigned to a split,
+        so burst shots and re-uploads of the same leaf cannot leak into test.
+        """
         print("🔄 Creating data splits...")
         
+        if group_near_duplicates is None:
+            group_near_duplicates = PREPROCESSING_CONFIG['group_near_duplicates']
+        dataset_dir = Path(dataset_dir)
+        
         all_images = []
         all_labels = []
         
         # Collect all image paths and labels
         for class_idx, class_name in enumerate(self.disease_classes):
-            class_dir = Path(dataset_dir) / class_name
+            class_dir = dataset_dir / class_name
             if not class_dir.exists():
                 continue
                 
-            for img_path in class_dir.glob('*'):
+            for img_path in sorted(class_dir.glob('*')):
                 if img_path.suffix.lower() in {'.jpg', '.jpeg', '.png', '.bmp'}:
                     all_images.append(str(img_path))
                     all_labels.append(class_idx)
@@ -173,38 +372,102 @@ class GingerDataPreprocessor:
         all_images = np.array(all_images)
         all_labels = np.array(all_labels)
         
-        # First split: train+val vs test
-        X_temp, X_test, y_temp, y_test = train_test_split(
-            all_images, all_labels, 
-            test_size=test_size, 
-            stratify=all_labels, 
-            random_state=42
-        )
+        # Content digests: recorded by organize_dataset, hashed only when missing
+        organize_manifest = DatasetManifest(dataset_dir / ORGANIZE_MANIFEST_PATH.name)
+        known_digests = {
+            entry['dest']: entry['digest'] for entry in organize_manifest.entries.values() if entry.get('dest')
+        }
+        rel_paths = [Path(img_path).relative_to(dataset_dir).as_posix() for img_path in all_images]
+        unknown = [img_path for img_path, rel_path in zip(all_images, rel_paths) if rel_path not in known_digests]
+        if unknown:
+            for img_path, digest in zip(unknown, run_parallel(hash_file, unknown, num_workers, desc="Hashing")):
+                known_digests[Path(img_path).relative_to(dataset_dir).as_posix()] = digest
+        all_digests = np.array([known_digests[rel_path] for rel_path in rel_paths])
         
-        # Second split: train vs val
-        val_size_adjusted = val_size / (1 - test_size)
-        X_train, X_val, y_train, y_val = train_test_split(
-            X_temp, y_temp, 
-            test_size=val_size_adjusted, 
-            stratify=y_temp, 
-            random_state=42
+        split_manifest = SplitManifest(dataset_dir / SPLIT_MANIFEST_PATH.name)
+        new_images = sum(split_manifest.split_of(digest) is None for digest in all_digests)
+        print(f"🆕 {new_images} new images, {len(all_images) - new_images} keep their split")
+        
+        hash_method = PREPROCESSING_CONFIG['near_duplicate_hash']
+        hashes = [split_manifest.perceptual_hash(digest, hash_method) for digest in all_digests]
+        if group_near_duplicates:
+            # Perceptual hashes are cached in the split manifest; only new images are decoded
+            missing = [idx for idx, hash_value in enumerate(hashes) if hash_value is None]
+            if missing:
+                computed = compute_hashes([all_images[idx] for idx in missing], num_workers=num_workers)
+                for idx, hash_value in zip(missing, computed):
+                    hashes[idx] = hash_value
+            all_groups = np.array(find_near_duplicate_groups(all_images, hashes=hashes))
+            self._report_duplicate_clusters(all_images, all_labels, all_groups, dataset_dir)
+        else:
+            # Every distinct content is its own group
+            all_groups = all_digests.copy()
+        
+        # Whole groups go to one split: pinned if seen before, else by stable hash
+        assigned, moved = assign_group_splits(
+            all_digests, all_groups, split_manifest, test_size, val_size, PREPROCESSING_CONFIG['split_salt']
         )
+        assigned = np.array(assigned)
+        if moved:
+            print(f"⚠️  {moved} images changed split because new near-duplicates merged their groups")
         
-        splits = {
-            'train': {'images': X_train, 'labels': y_train},
-            'validation': {'images': X_val, 'labels': y_val},
-            'test': {'images': X_test, 'labels': y_test}
+        split_manifest.entries = {
+            digest: {
+                'split': split,
+                'label': self.disease_classes[label],
+                'hash': None if hash_value is None else f"{hash_value:016x}",
+                'hash_method': hash_method
+            }
+            for digest, split, label, hash_value in zip(all_digests, assigned, all_labels, hashes)
         }
+        split_manifest.save()
+        
+        splits = {}
+        for split_name in SPLIT_NAMES:
+            mask = assigned == split_name
+            splits[split_name] = {
+                'images': all_images[mask],
+                'labels': all_labels[mask],
+                'groups': all_groups[mask]
+            }
         
         # Print split information
         for split_name, data in splits.items():
             print(f"📊 {split_name.capitalize()}: {len(data['images'])} images")
-            unique, counts = np.unique(data['labels'], return_counts=True)
-            for class_idx, count in zip(unique, counts):
-                print(f"   {self.disease_classes[class_idx]}: {count}")
+        self._report_stratification(all_labels, assigned, test_size, val_size, dataset_dir)
         
         return splits
     
+    def _report_stratification(self, labels, assigned, test_size, val_size, dataset_dir):
+        """Print and save per-class split fractions against the targets"""
+        report = stratification_report(labels, assigned, self.disease_classes, test_size, val_size)
+        print("📐 Per-class split (train / validation / test):")
+        for class_name, stats in report['classes'].items():
+            counts, fractions = stats['counts'], stats['fractions']
+            print(f"   {class_name}: " + " / ".join(
+                f"{counts[name]} ({fractions[name]:.0%})" for name in SPLIT_NAMES
+            ))
+        for warning in report['warnings']:
+            print(f"⚠️  {warning}")
+        
+        with open(dataset_dir / 'split_report.json', 'w') as f:
+            json.dump(report, f, indent=2)
+    
+    def _report_duplicate_clusters(self, images, labels, groups, dataset_dir):
+        """Print and save near-duplicate clusters found while splitting"""
+        clusters = summarize_clusters(images, labels, groups, self.disease_classes)
+        duplicates = sum(cluster['size'] - 1 for cluster in clusters)
+        cross_class = [cluster for cluster in clusters if cluster['cross_class']]
+        
+        print(f"🔍 Near-duplicates: {len(clusters)} clusters covering {duplicates} extra images")
+        for cluster in clusters[:5]:
+            print(f"   {cluster['group_id']}: {cluster['size']} images ({', '.join(cluster['classes'])})")
+        if cross_class:
+            print(f"⚠️  {len(cross_class)} clusters span more than one class - check their labels")
+        
+        with open(Path(dataset_dir) / 'duplicate_clusters.json', 'w') as f:
+            json.dump(clusters, f, indent=2)
+    
     def compute_class_weights(self, y_train):
         """Compute class weights for handling imbalanced data"""
         class_weights = compute_class_weight(
@@ -220,8 +483,15 @@ class GingerDataPreprocessor:
             
         return class_weight_dict
     
-    def save_preprocessed_data(self, splits, output_dir):
-        """Save preprocessed data splits"""
+    def save_preprocessed_data(self, splits, output_dir, write_shards=None, num_workers=None):
+        """
+        Save preprocessed data splits
+        With write_shards (default: PREPROCESSING_CONFIG['write_shards']) each split
+        is also written as sharded records (see shard_records.py) holding the
+        image bytes, optionally pre-resized to the training resolution.
+        """
+        if write_shards is None:
+            write_shards = PREPROCESSING_CONFIG['write_shards']
         output_dir = Path(output_dir)
         output_dir.mkdir(exist_ok=True, parents=True)
         
@@ -232,6 +502,8 @@ class GingerDataPreprocessor:
             # Save as numpy arrays for fast loading
             np.save(split_dir / 'images.npy', data['images'])
             np.save(split_dir / 'labels.npy', data['labels'])
+            if 'groups' in data:
+                np.save(split_dir / 'groups.npy', data['groups'])
             
             # Save metadata
             metadata = {
@@ -241,6 +513,24 @@ class GingerDataPreprocessor:
                 'image_shape': [self.img_height, self.img_width, 3]
             }
             
+            if write_shards:
+                resize_to = (self.img_height, self.img_width) if PREPROCESSING_CONFIG['shard_pre_resize'] else None
+                shard_info = shard_records.write_shards(
+                    data['images'], data['labels'], split_dir / 'shards',
+                    target_shard_mb=PREPROCESSING_CONFIG['shard_target_mb'],
+                    resize_to=resize_to,
+                    quality=PREPROCESSING_CONFIG['shard_jpeg_quality'],
+                    num_workers=num_workers,
+                    class_names=self.disease_classes
+                )
+                metadata['shards'] = {
+                    'directory': 'shards',
+                    'num_shards': len(shard_info['shards']),
+                    'encoding': shard_info['encoding']
+                }
+                print(f"📦 {split_name}: {len(shard_info['shards'])} shard(s), "
+                      f"{sum(shard_info['shard_bytes']) / (1024 * 1024):.1f} MB")
+            
             with open(split_dir / 'metadata.json', 'w') as f:
                 json.dump(metadata, f, indent=2)
         
@@ -248,13 +538,22 @@ class GingerDataPreprocessor:
 
 def main():
     """Main preprocessing pipeline"""
+    parser = argparse.ArgumentParser(description='Preprocess the ginger disease dataset')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for verification/copying (default: PREPROCESSING_CONFIG)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Ignore the organize manifest and re-process every image')
+    parser.add_argument('--shards', action='store_true', default=None,
+                        help='Also write each split as sharded binary records')
+    args = parser.parse_args()
+    
     print("🚀 Starting Ginger Disease Detection Data Preprocessing Pipeline")
     
     preprocessor = GingerDataPreprocessor()
     
     # Step 1: Organize raw dataset
     if DATASET_PATH.exists():
-        dataset_info = preprocessor.organize_dataset(DATASET_PATH)
+        dataset_info = preprocessor.organize_dataset(DATASET_PATH, num_workers=args.workers, rebuild=args.rebuild)
     else:
         print(f"❌ Dataset not found at {DATASET_PATH}")
         print("📝 Please place your dataset in the following structure:")
@@ -268,14 +567,23 @@ def main():
         print("   └── root_knot_nematode/")
         return
     
-    # Step 2: Create data splits
-    splits = preprocessor.create_data_splits(PROCESSED_DATASET_PATH)
+    # Step 2: Cache downscaled copies for the loaders
+    if PREPROCESSING_CONFIG['use_pyramid']:
+        ImagePyramid().build(list_images([PROCESSED_DATASET_PATH]), num_workers=args.workers)
+    
+    # Step 3: Channel statistics for normalization (cached until the dataset changes)
+    compute_dataset_stats(PROCESSED_DATASET_PATH, num_workers=args.workers)
+    
+    # Step 4: Create data splits
+    splits = preprocessor.create_data_splits(PROCESSED_DATASET_PATH, num_workers=args.workers)
     
-    # Step 3: Compute class weights
+    # Step 5: Compute class weights
     class_weights = preprocessor.compute_class_weights(splits['train']['labels'])
     
-    # Step 4: Save preprocessed data
-    preprocessor.save_preprocessed_data(splits, PROCESSED_DATA_DIR / 'splits')
+    # Step 6: Save preprocessed data
+    preprocessor.save_preprocessed_data(
+        splits, PROCESSED_DATA_DIR / 'splits', write_shards=args.shards, num_workers=args.workers
+    )
     
     # Save class weights
     with open(PROCESSED_DATA_DIR / 'class_weights.json', 'w') as f:
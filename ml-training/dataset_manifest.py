@@ -0,0 +1,88 @@
+"""
+Persistent file manifest for incremental dataset organization
+Tracks source path, size, mtime, content hash and assigned destination
+for every raw image so re-runs only touch new, changed or deleted files.
+"""
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+
+MANIFEST_VERSION = 1
+
+
+def scan_image_tree(root_dir, class_names, valid_extensions):
+    """
+    List class_dir/image files with a single os.scandir pass per directory.
+    Returns {relative_path: (class_name, size, mtime_ns)} in sorted order.
+    """
+    root_dir = Path(root_dir)
+    valid_extensions = {ext.lower() for ext in valid_extensions}
+    class_names = set(class_names)
+    found = {}
+    if not root_dir.exists():
+        return found
+
+    with os.scandir(root_dir) as class_entries:
+        class_dirs = sorted(
+            (entry.name, entry.path) for entry in class_entries
+            if entry.is_dir() and entry.name in class_names
+        )
+
+    for class_name, class_path in class_dirs:
+        with os.scandir(class_path) as entries:
+            for entry in entries:
+                if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in valid_extensions:
+                    continue
+                stat = entry.stat()
+                found[f"{class_name}/{entry.name}"] = (class_name, stat.st_size, stat.st_mtime_ns)
+
+    return dict(sorted(found.items()))
+
+
+class DatasetManifest:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data['entries']
+
+    def save(self):
+        """Atomically persist the manifest"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_unchanged(self, rel_path, size, mtime_ns):
+        """True when the recorded size and mtime still match"""
+        entry = self.entries.get(rel_path)
+        return entry is not None and entry['size'] == size and entry['mtime_ns'] == mtime_ns
+
+    def destinations(self, class_name=None):
+        """Assigned destinations (relative to the organized dir), optionally for one class"""
+        return sorted(
+            entry['dest'] for entry in self.entries.values()
+            if entry.get('dest') and (class_name is None or entry['class'] == class_name)
+        )
+
+    def next_index(self, class_name):
+        """Next free {class}_{index:05d} number; existing numbers are never reused"""
+        pattern = re.compile(rf"^{re.escape(class_name)}/{re.escape(class_name)}_(\d+)\.")
+        indices = [
+            int(match.group(1)) for match in map(pattern.match, self.destinations(class_name)) if match
+        ]
+        return max(indices) + 1 if indices else 0
+
+    def fingerprint(self):
+        """Stable hash of the organized dataset contents (destination + digest)"""
+        digest = hashlib.sha256()
+        for entry in sorted(self.entries.values(), key=lambda e: e.get('dest') or ''):
+            if entry.get('dest'):
+                digest.update(f"{entry['dest']}:{entry['digest']}\n".encode())
+        return digest.hexdigest()
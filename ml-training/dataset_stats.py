@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+
+"""
+Single-pass streaming statistics for the Ginger Disease Detection dataset
+Workers each summarize a chunk of one class. Per-channel pixel moments are
+accumulated with Welford's algorithm, and the partial results are merged
+with Chan's parallel formula, so no worker ever holds more than one image.
+Histograms use fixed bin edges and merge by addition.
+
+The result has per-class and global per-channel mean/std at training
+resolution, short-side and aspect-ratio histograms, and file-size and
+brightness distributions. It is cached in DATASET_STATS_PATH, keyed by a
+fingerprint of the dataset listing (paths, sizes, mtimes). Readers such as
+normalization and validation get the numbers without rescanning pixels
+until the dataset changes.
+"""
+
+import os
+import json
+import hashlib
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from config import *
+from dataset_manifest import scan_image_tree
+from image_loading import load_rgb
+from image_pyramid import resolve_image_path
+from parallel_utils import run_parallel
+
+STATS_VERSION = 1
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# Fixed bin edges so partial histograms merge by addition; the last bin is open-ended
+SHORT_SIDE_EDGES = [0, 128, 224, 256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096]
+ASPECT_RATIO_EDGES = [0, 0.5, 0.67, 0.8, 0.95, 1.05, 1.25, 1.5, 2.0]  # width / height
+FILE_SIZE_EDGES_KB = [0, 1, 16, 64, 128, 256, 512, 1024, 2048, 4096, 10240]
+BRIGHTNESS_EDGES = [round(i * 0.05, 2) for i in range(20)]
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114])
+
+
+class Moments:
+    """Running count, mean and sum of squared deviations (Welford), mergeable across workers"""
+
+    def __init__(self, dims=1):
+        self.n = 0
+        self.mean = np.zeros(dims)
+        self.m2 = np.zeros(dims)
+        self.min = np.full(dims, np.inf)
+        self.max = np.full(dims, -np.inf)
+
+    def add(self, values):
+        """Add a batch of observations, shape (k, dims) or (k,)"""
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.mean))
+        if not len(values):
+            return self
+        batch = Moments(len(self.mean))
+        batch.n = len(values)
+        batch.mean = values.mean(axis=0)
+        batch.m2 = ((values - batch.mean) ** 2).sum(axis=0)
+        batch.min = values.min(axis=0)
+        batch.max = values.max(axis=0)
+        return self.merge(batch)
+
+    def merge(self, other):
+        """Chan et al. pairwise combination"""
+        if other.n == 0:
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n / n
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.n * other.n / n
+        self.n = n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.n) if self.n else np.zeros_like(self.m2)
+
+    def summary(self):
+        if not self.n:
+            return {'n': 0}
+        values = {'mean': self.mean, 'std': self.std, 'min': self.min, 'max': self.max}
+        values = {key: [round(float(x), 6) for x in value] for key, value in values.items()}
+        if len(self.mean) == 1:
+            values = {key: value[0] for key, value in values.items()}
+        return {'n': int(self.n), **values}
+
+
+def _bin(edges, value):
+    return max(0, int(np.searchsorted(edges, value, side='right')) - 1)
+
+
+class ImageSetStats:
+    """Mergeable statistics for a set of images (one class, or the whole dataset)"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.pixels = Moments(3)
+        self.brightness = Moments()
+        self.file_size = Moments()
+        self.width = Moments()
+        self.height = Moments()
+        self.histograms = {
+            'short_side': np.zeros(len(SHORT_SIDE_EDGES), dtype=np.int64),
+            'aspect_ratio': np.zeros(len(ASPECT_RATIO_EDGES), dtype=np.int64),
+            'file_size_kb': np.zeros(len(FILE_SIZE_EDGES_KB), dtype=np.int64),
+            'brightness': np.zeros(len(BRIGHTNESS_EDGES), dtype=np.int64),
+        }
+
+    def add_image(self, path, target_size):
+        """Decode one image at training resolution and fold it in"""
+        size = os.path.getsize(path)
+        image = load_rgb(resolve_image_path(path, target_size), target_size)
+        # Original dimensions, not those of the pyramid level or reduced decode
+        with Image.open(path) as img:
+            width, height = img.size
+        image = cv2.resize(image, tuple(target_size), interpolation=cv2.INTER_AREA)
+        pixels = image.reshape(-1, 3) / 255.0
+        brightness = float(pixels.mean(axis=0) @ LUMA_WEIGHTS)
+
+        self.count += 1
+        self.pixels.add(pixels)
+        self.brightness.add([brightness])
+        self.file_size.add([size])
+        self.width.add([width])
+        self.height.add([height])
+        self.histograms['short_side'][_bin(SHORT_SIDE_EDGES, min(width, height))] += 1
+        self.histograms['aspect_ratio'][_bin(ASPECT_RATIO_EDGES, width / height)] += 1
+        self.histograms['file_size_kb'][_bin(FILE_SIZE_EDGES_KB, size / 1024)] += 1
+        self.histograms['brightness'][_bin(BRIGHTNESS_EDGES, brightness)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.errors += other.errors
+        for name in ('pixels', 'brightness', 'file_size', 'width', 'height'):
+            getattr(self, name).merge(getattr(other, name))
+        for name, counts in other.histograms.items():
+            self.histograms[name] += counts
+        return self
+
+    def summary(self):
+        edges = {'short_side': SHORT_SIDE_EDGES, 'aspect_ratio': ASPECT_RATIO_EDGES,
+                 'file_size_kb': FILE_SIZE_EDGES_KB, 'brightness': BRIGHTNESS_EDGES}
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'channel_mean': [round(float(x), 6) for x in self.pixels.mean],
+            'channel_std': [round(float(x), 6) for x in self.pixels.std],
+            'brightness': self.brightness.summary(),
+            'file_size_bytes': self.file_size.summary(),
+            'width': self.width.summary(),
+            'height': self.height.summary(),
+            'histograms': {
+                name: {'edges': edges[name], 'counts': counts.tolist()}
+                for name, counts in self.histograms.items()
+            },
+        }
+
+
+def _stats_chunk(task):
+    """Worker: statistics for a chunk of images from one class. task is (class_name, paths, target_size)."""
+    class_name, paths, target_size = task
+    stats = ImageSetStats()
+    for path in paths:
+        try:
+            stats.add_image(path, target_size)
+        except Exception:
+            stats.errors += 1
+    return class_name, stats
+
+
+def _cache_key(dataset_dir):
+    dataset_dir = Path(dataset_dir).resolve()
+    try:
+        return str(dataset_dir.relative_to(BASE_DIR.resolve()))
+    except ValueError:
+        return str(dataset_dir)
+
+
+def _fingerprint(listing, target_size):
+    """Hash of the listing (path, size, mtime) and the parameters the numbers depend on"""
+    digest = hashlib.sha256(f"v{STATS_VERSION}:{target_size[0]}x{target_size[1]}".encode())
+    for rel_path, (_, size, mtime_ns) in listing.items():
+        digest.update(f"{rel_path}:{size}:{mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _load_cache():
+    if DATASET_STATS_PATH.exists():
+        with open(DATASET_STATS_PATH, 'r') as f:
+            data = json.load(f)
+        if data.get('version') == STATS_VERSION:
+            return data
+    return {'version': STATS_VERSION, 'datasets': {}}
+
+
+def _save_cache(cache):
+    """Atomically persist the stats cache"""
+    DATASET_STATS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = DATASET_STATS_PATH.with_suffix('.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, DATASET_STATS_PATH)
+
+
+def _target_size():
+    return (TRAINING_CONFIG['img_width'], TRAINING_CONFIG['img_height'])
+
+
+def load_dataset_stats(dataset_dir=None):
+    """Cached statistics for dataset_dir if they still match its contents, else None (no pixels read)"""
+    dataset_dir = Path(dataset_dir or DATASET_PATH)
+    entry = _load_cache()['datasets'].get(_cache_key(dataset_dir))
+    if entry is None:
+        return None
+    listing = scan_image_tree(dataset_dir, DISEASE_CLASSES, PREPROCESSING_CONFIG['valid_extensions'])
+    return entry if entry['fingerprint'] == _fingerprint(listing, _target_size()) else None
+
+
+def compute_dataset_stats(dataset_dir=None, num_workers=None, rebuild=False):
+    """
+    Statistics for every image under dataset_dir/<class>, computed in one
+    parallel pass unless a cached result still matches the listing.
+    """
+    dataset_dir = Path(dataset_dir or DATASET_PATH)
+    target_size = _target_size()
+    listing = scan_image_tree(dataset_dir, DISEASE_CLASSES, PREPROCESSING_CONFIG['valid_extensions'])
+    fingerprint = _fingerprint(listing, target_size)
+
+    cache = _load_cache()
+    key = _cache_key(dataset_dir)
+    entry = cache['datasets'].get(key)
+    if entry and entry['fingerprint'] == fingerprint and not rebuild:
+        print(f"📐 Dataset statistics for {dataset_dir} are up to date ({entry['num_images']} images)")
+        return entry
+
+    # One task per chunk of a single class so workers return per-class partials
+    chunk_size = PREPROCESSING_CONFIG['chunksize']
+    by_class = {}
+    for rel_path, (class_name, _, _) in listing.items():
+        by_class.setdefault(class_name, []).append(str(dataset_dir / rel_path))
+    tasks = [
+        (class_name, paths[start:start + chunk_size], target_size)
+        for class_name, paths in by_class.items()
+        for start in range(0, len(paths), chunk_size)
+    ]
+    print(f"📐 Computing statistics for {len(listing)} images in {dataset_dir}...")
+    partials = run_parallel(_stats_chunk, tasks, num_workers, chunksize=1, desc="Dataset stats")
+
+    per_class = {}
+    overall = ImageSetStats()
+    for class_name, stats in partials:
+        per_class.setdefault(class_name, ImageSetStats()).merge(stats)
+        overall.merge(stats)
+
+    entry = {
+        'fingerprint': fingerprint,
+        'dataset_dir': str(dataset_dir),
+        'image_size': list(target_size),
+        'computed': datetime.now().isoformat(),
+        'num_images': len(listing),
+        'global': overall.summary(),
+        'classes': {class_name: per_class[class_name].summary() for class_name in sorted(per_class)},
+    }
+    cache['datasets'][key] = entry
+    _save_cache(cache)
+
+    print(f"  🎨 Channel mean: {entry['global']['channel_mean']}")
+    print(f"  🎨 Channel std:  {entry['global']['channel_std']}")
+    if overall.errors:
+        print(f"  ⚠️  {overall.errors} images could not be read")
+    return entry
+
+
+def normalization_stats(dataset_dir=None):
+    """
+    (mean, std, source) for input normalization: the dataset's own channel
+    statistics when PREPROCESSING_CONFIG['normalization'] is 'dataset' and
+    cached stats are current, otherwise the ImageNet values.
+    """
+    if PREPROCESSING_CONFIG['normalization'] == 'dataset':
+        stats = load_dataset_stats(dataset_dir)
+        if stats and stats['global']['count']:
+            return stats['global']['channel_mean'], stats['global']['channel_std'], 'dataset'
+    return IMAGENET_MEAN, IMAGENET_STD, 'imagenet'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute per-class and global dataset statistics')
+    parser.add_argument('dataset_dir', nargs='?', default=None, help='Dataset root (default: DATASET_PATH)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: PREPROCESSING_CONFIG)')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute even if the cache is current')
+    args = parser.parse_args()
+
+    stats = compute_dataset_stats(args.dataset_dir, num_workers=args.workers, rebuild=args.rebuild)
+    print(f"\n{'Class':20} {'Images':>7}  {'Mean (R, G, B)':26} {'Std (R, G, B)':26}")
+    for class_name, class_stats in stats['classes'].items():
+        mean = ', '.join(f"{x:.3f}" for x in class_stats['channel_mean'])
+        std = ', '.join(f"{x:.3f}" for x in class_stats['channel_std'])
+        print(f"{class_name:20} {class_stats['count']:7d}  {mean:26} {std:26}")
+    print(f"📝 Cached in {DATASET_STATS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Content-addressed image store for Ginger Disease Detection datasets
+Every unique file is stored once under its hash; class directories hold
+hardlinks (or reflinks/copies when links are not possible) to the blobs.
+"""
+import os
+import json
+import shutil
+import hashlib
+from pathlib import Path
+
+from config import DATASET_STORE_PATH, DATASET_STORE_CONFIG
+
+# Linux ioctl request for copy-on-write clones (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+def hash_file(path, algorithm=None, block_size=1024 * 1024):
+    """Return the hex digest of a file's contents"""
+    digest = hashlib.new(algorithm or DATASET_STORE_CONFIG['hash_algorithm'])
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _reflink(src_path, dest_path):
+    """Clone src to dest sharing extents; raises OSError where unsupported"""
+    import fcntl
+    with open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+        fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+
+
+class ContentStore:
+    def __init__(self, root=None, link_mode=None, load_manifest=True):
+        self.root = Path(root or DATASET_STORE_PATH)
+        self.link_mode = link_mode or DATASET_STORE_CONFIG['link_mode']
+        self.blobs_dir = self.root / 'blobs'
+        self.manifest_path = self.root / 'manifest.json'
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = self._load_manifest() if load_manifest else {'entries': {}}
+
+    def _load_manifest(self):
+        """Load the path -> blob manifest"""
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        return {'entries': {}}
+
+    def save_manifest(self):
+        """Atomically persist the manifest"""
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def blob_path(self, digest):
+        """Location of a blob, fanned out by hash prefix"""
+        return self.blobs_dir / digest[:2] / digest
+
+    def has_blob(self, digest):
+        return self.blob_path(digest).exists()
+
+    def add_file(self, src_path, digest=None):
+        """
+        Add a file to the store.
+        The source is copied (never linked) so later in-place edits of it cannot
+        alter the blob; blobs are made read-only for the same reason.
+        Returns (digest, size, is_new) - is_new is False for byte-identical duplicates.
+        """
+        if digest is None:
+            digest = hash_file(src_path)
+        blob = self.blob_path(digest)
+        size = os.path.getsize(src_path)
+        if blob.exists():
+            return digest, size, False
+
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = blob.with_name(f"{digest}.{os.getpid()}.tmp")
+        shutil.copy2(src_path, tmp_path)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, blob)
+        return digest, size, True
+
+    def adopt_file(self, staged_path, digest=None):
+        """
+        Move a file the caller owns (e.g. staged inside the store root) into
+        the store without copying it. The staged file is consumed either way.
+        Returns (digest, size, is_new) like add_file.
+        """
+        if digest is None:
+            digest = hash_file(staged_path)
+        blob = self.blob_path(digest)
+        size = os.path.getsize(staged_path)
+        if blob.exists():
+            os.remove(staged_path)
+            return digest, size, False
+
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(staged_path, 0o444)
+        os.replace(staged_path, blob)
+        return digest, size, True
+
+    def materialize(self, digest, dest_path):
+        """
+        Place a blob at dest_path using the configured link mode,
+        falling back hardlink -> reflink -> copy. Returns the method used.
+        """
+        blob = self.blob_path(digest)
+        dest_path = Path(dest_path)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        if dest_path.exists() and os.path.samefile(blob, dest_path):
+            # Already linked to this blob (rename onto the same inode would be a no-op)
+            return 'hardlink'
+        tmp_path = dest_path.with_name(f".{dest_path.name}.{os.getpid()}.tmp")
+
+        modes = ['hardlink', 'reflink', 'copy']
+        modes = modes[modes.index(self.link_mode):] if self.link_mode in modes else ['copy']
+        for mode in modes:
+            try:
+                if mode == 'hardlink':
+                    os.link(blob, tmp_path)
+                elif mode == 'reflink':
+                    _reflink(blob, tmp_path)
+                else:
+                    shutil.copy2(blob, tmp_path)
+                os.replace(tmp_path, dest_path)
+                return mode
+            except OSError:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+                if mode == 'copy':
+                    raise
+        return None
+
+    def record(self, dest_path, digest, size):
+        """Record that dest_path holds the given blob"""
+        self.manifest['entries'][self._key(dest_path)] = {'digest': digest, 'size': size}
+
+    def forget(self, dest_path):
+        self.manifest['entries'].pop(self._key(dest_path), None)
+
+    def digest_of(self, dest_path):
+        """Digest recorded for dest_path, or None if unknown"""
+        entry = self.manifest['entries'].get(self._key(dest_path))
+        return entry['digest'] if entry else None
+
+    def digests_in(self, directory):
+        """Digests of every file in a directory, hashing files not yet in the manifest"""
+        digests = set()
+        directory = Path(directory)
+        if not directory.exists():
+            return digests
+        for path in directory.iterdir():
+            if not path.is_file():
+                continue
+            digest = self.digest_of(path)
+            if digest is None:
+                digest = hash_file(path)
+            digests.add(digest)
+        return digests
+
+    def _key(self, path):
+        return os.path.relpath(Path(path).resolve(), self.root.parent.resolve())
+
+
+def store_and_link(task):
+    """
+    Worker entry point: add src to the store and materialize it at dest.
+    task is (store_root, link_mode, src_path, dest_path, digest).
+    Returns (digest, size, is_new, method, error).
+    """
+    store_root, link_mode, src_path, dest_path, digest = task
+    try:
+        store = ContentStore(store_root, link_mode, load_manifest=False)
+        digest, size, is_new = store.add_file(src_path, digest)
+        method = store.materialize(digest, dest_path)
+        return digest, size, is_new, method, None
+    except Exception as e:
+        return digest, 0, False, None, str(e)
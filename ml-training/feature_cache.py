@@ -0,0 +1,169 @@
+"""
+Memory-mapped cache of frozen-backbone features for hybrid head training
+With a frozen base model, every epoch would recompute the same base forward
+pass only to train the small dense head. Instead, each image of a split is
+passed through the base once per view and the pooled features are stored
+as a float32 np.memmap. View 0 is the plain image. Views 1.. are fixed,
+seeded random augmentations from the training ImageDataGenerator, so the
+head still sees augmented data. The images themselves come from the
+TensorCache of the split, so decoding is shared with the memmap backend.
+Builds are published like tensor caches: written to a temporary directory
+and renamed into place, so a process still mapping the old features keeps
+reading them.
+
+Layout of a cache directory:
+    cache.json     key, shape and class names
+    features.f32   raw views x N x D float32 memmap
+    labels.npy     int32 class index per row
+    valid.npy      bool, False for rows that failed to decode
+"""
+import os
+import json
+import shutil
+import hashlib
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+from tensorflow import keras
+
+from config import TRAINING_CONFIG, FEATURE_CACHE_DIR
+from tensor_cache import TensorCache, publish_cache_dir
+
+CACHE_VERSION = 1
+AUGMENTATION_KEYS = ('rotation_range', 'width_shift_range', 'height_shift_range', 'horizontal_flip',
+                     'vertical_flip', 'zoom_range', 'shear_range', 'brightness_range', 'fill_mode')
+
+
+def feature_key(image_key, extractor_name, views, batch_size):
+    """Invalidation key: the image cache key, the backbone and the augmentation settings of the views"""
+    augmentation = {key: TRAINING_CONFIG[key] for key in AUGMENTATION_KEYS} if views > 1 else {}
+    return hashlib.sha256(
+        f"v{CACHE_VERSION}:{image_key}:{extractor_name}:{views}:{batch_size}:"
+        f"{json.dumps(augmentation, sort_keys=True)}".encode()
+    ).hexdigest()
+
+
+class FeatureCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        with open(self.cache_dir / 'cache.json', 'r') as f:
+            self.metadata = json.load(f)
+        self.features = np.memmap(
+            self.cache_dir / 'features.f32', dtype=np.float32, mode='r', shape=tuple(self.metadata['shape'])
+        )
+        self.labels = np.load(self.cache_dir / 'labels.npy')
+        self.valid = np.load(self.cache_dir / 'valid.npy')
+        self.class_names = self.metadata['class_names']
+        self.views, _, self.feature_dim = self.features.shape
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def build(cls, split_dir, extractor, datagen, views=1, cache_dir=None, classes=None, batch_size=None,
+              rebuild=False):
+        """
+        Load the feature cache for split_dir, (re)building it when the split's
+        images, the extractor or the augmentation settings changed.
+        extractor maps an image batch to pooled (N, D) features; datagen is the
+        ImageDataGenerator whose standardize() (and, for views > 1,
+        random_transform()) the image generators apply.
+        """
+        split_dir = Path(split_dir)
+        batch_size = batch_size or TRAINING_CONFIG['batch_size']
+        if cache_dir is None:
+            cache_dir = FEATURE_CACHE_DIR / f"{extractor.name}_{split_dir.name}"
+        cache_dir = Path(cache_dir)
+
+        images = TensorCache.build(split_dir, classes=classes)
+        key = feature_key(images.metadata['key'], extractor.name, views, batch_size)
+
+        metadata_path = cache_dir / 'cache.json'
+        if not rebuild and metadata_path.exists():
+            with open(metadata_path, 'r') as f:
+                if json.load(f).get('key') == key:
+                    return cls(cache_dir)
+
+        feature_dim = int(extractor.output_shape[-1])
+        print(f"🧊 Building feature cache for {split_dir.name}: {len(images)} images x {views} views "
+              f"-> {feature_dim} features ({extractor.name})")
+        tmp_dir = cache_dir.with_name(f".{cache_dir.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        shape = (views, len(images), feature_dim)
+        features = np.memmap(tmp_dir / 'features.f32', dtype=np.float32, mode='w+', shape=shape)
+        with tqdm(total=views * len(images), desc=f"Extracting {split_dir.name}") as progress:
+            for view in range(views):
+                for start in range(0, len(images), batch_size):
+                    stop = min(start + batch_size, len(images))
+                    x = images.images[start:stop].astype(np.float32)
+                    for i in range(len(x)):
+                        if view > 0:
+                            # Fixed augmentation: the same image and view always get the same transform
+                            x[i] = datagen.random_transform(x[i], seed=view * len(images) + start + i)
+                        x[i] = datagen.standardize(x[i])
+                    features[view, start:stop] = extractor.predict_on_batch(x)
+                    progress.update(stop - start)
+        features.flush()
+        del features
+
+        np.save(tmp_dir / 'labels.npy', images.labels)
+        np.save(tmp_dir / 'valid.npy', images.valid)
+        with open(tmp_dir / 'cache.json', 'w') as f:
+            json.dump({
+                'version': CACHE_VERSION,
+                'key': key,
+                'shape': list(shape),
+                'class_names': images.class_names,
+                'extractor': extractor.name,
+                'image_cache': str(images.cache_dir)
+            }, f, indent=2)
+        publish_cache_dir(tmp_dir, cache_dir)
+        return cls(cache_dir)
+
+
+class FeatureSequence(keras.utils.Sequence):
+    """
+    Batches of cached features for training the head. With several views,
+    every epoch draws one view per image at random.
+    """
+
+    def __init__(self, cache, batch_size=None, class_mode='categorical', shuffle=False, seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.batch_size = batch_size or TRAINING_CONFIG['batch_size']
+        self.class_mode = class_mode
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.indices = np.flatnonzero(cache.valid)
+        self.samples = len(self.indices)
+        self.classes = cache.labels[self.indices]
+        self.class_indices = {name: idx for idx, name in enumerate(cache.class_names)}
+        self.num_classes = len(cache.class_names)
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.ceil(self.samples / self.batch_size))
+
+    def __getitem__(self, idx):
+        batch = slice(idx * self.batch_size, (idx + 1) * self.batch_size)
+        rows, views = self.order[batch], self.view_of[batch]
+        x = np.asarray(self.cache.features[views, rows])
+        labels = self.cache.labels[rows]
+        if self.class_mode == 'categorical':
+            y = keras.utils.to_categorical(labels, self.num_classes)
+        else:
+            y = labels.astype(np.float32)
+        return x, y
+
+    def on_epoch_end(self):
+        self.order = self.rng.permutation(self.indices) if self.shuffle else self.indices
+        if self.shuffle and self.cache.views > 1:
+            self.view_of = self.rng.integers(self.cache.views, size=len(self.order))
+        else:
+            self.view_of = np.zeros(len(self.order), dtype=np.int64)
+
+    def reset(self):
+        self.on_epoch_end()
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+
+"""
+Parallel hyperparameter search over TRAINING_CONFIG
+Trials sample learning rate, batch size, dropout and the CNN layer lists from
+HYPERPARAMETER_SEARCH_CONFIG['space'] and train the CNN of
+cnn_model_training.py in worker processes with a limited number of
+TensorFlow threads each. ASHA (asynchronous successive halving) prunes
+them: every trial first trains to the first rung (min_epochs), and only the
+top 1/reduction_factor of the trials that reached a rung continue to the
+next one (x reduction_factor epochs), up to max_epochs. Promoted trials
+continue from their saved model, optimizer state included.
+
+All trials read the same memory-mapped TensorCache (memmap backend), which
+is built once before the workers start, so images are decoded once for the
+whole search. Results go to an SQLite database (HYPERPARAMETER_SEARCH_DB):
+
+    trials(study, trial_id, params, status, epochs, best_metric, started, updated)
+    rungs(study, trial_id, rung, epochs, metric, val_loss, seconds, finished)
+
+Usage:
+    python hyperparameter_search.py --study lr_sweep
+    python hyperparameter_search.py --study lr_sweep --top 10
+    python hyperparameter_search.py --study lr_sweep --export best_config.py
+"""
+
+import os
+import io
+import copy
+import json
+import time
+import pprint
+import sqlite3
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from config import *
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    study TEXT, trial_id INTEGER, params TEXT, status TEXT, epochs INTEGER, best_metric REAL,
+    started TEXT, updated TEXT, PRIMARY KEY (study, trial_id)
+);
+CREATE TABLE IF NOT EXISTS rungs (
+    study TEXT, trial_id INTEGER, rung INTEGER, epochs INTEGER, metric REAL, val_loss REAL,
+    seconds REAL, finished TEXT, PRIMARY KEY (study, trial_id, rung)
+);
+"""
+
+# TRAINING_CONFIG as configured, before a trial overrides it (per worker process)
+BASE_TRAINING_CONFIG = copy.deepcopy(TRAINING_CONFIG)
+
+
+def sample_params(space, seed, trial_id):
+    """Parameters of one trial, derived from the search seed and the trial id only"""
+    rng = np.random.default_rng(np.random.SeedSequence([seed, trial_id]))
+    params = {}
+    for key, (kind, *args) in sorted(space.items()):
+        if kind == 'log_uniform':
+            params[key] = float(np.exp(rng.uniform(np.log(args[0]), np.log(args[1]))))
+        elif kind == 'uniform':
+            params[key] = float(rng.uniform(args[0], args[1]))
+        elif kind == 'int':
+            params[key] = int(rng.integers(args[0], args[1] + 1))
+        elif kind == 'choice':
+            params[key] = copy.deepcopy(args[0][int(rng.integers(len(args[0])))])
+        else:
+            raise ValueError(f"Unknown search space kind '{kind}' for {key}")
+    return params
+
+
+def apply_params(params, base=None):
+    """TRAINING_CONFIG with a trial's parameters applied (dotted keys address nested dicts)"""
+    training_config = copy.deepcopy(base or BASE_TRAINING_CONFIG)
+    for key, value in params.items():
+        *parents, leaf = key.split('.')
+        target = training_config
+        for parent in parents:
+            target = target[parent]
+        target[leaf] = copy.deepcopy(value)
+    if 'dropout_rate' in params:
+        for dense_config in training_config['cnn_architecture']['dense_layers']:
+            dense_config['dropout'] = params['dropout_rate']
+    return training_config
+
+
+def rung_epochs(min_epochs, max_epochs, reduction_factor):
+    """Epoch budget of every rung, e.g. [2, 6, 18, 50]"""
+    rungs = []
+    epochs = min_epochs
+    while epochs < max_epochs:
+        rungs.append(epochs)
+        epochs *= reduction_factor
+    return rungs + [max_epochs]
+
+
+class ASHA:
+    """
+    Asynchronous successive halving: whenever a worker is free, promote the
+    best not-yet-promoted trial of the highest rung that has one in its top
+    1/reduction_factor; otherwise start a new trial at rung 0.
+    """
+
+    def __init__(self, num_trials, rungs, reduction_factor):
+        self.num_trials = num_trials
+        self.rungs = rungs
+        self.reduction_factor = reduction_factor
+        self.results = [{} for _ in rungs]  # per rung: trial_id -> metric
+        self.promoted = [set() for _ in rungs]
+        self.started = 0
+
+    def next_job(self):
+        """(trial_id, rung) to run next, or None if nothing can start yet"""
+        for rung in range(len(self.rungs) - 2, -1, -1):
+            completed = self.results[rung]
+            top = sorted(completed, key=completed.get, reverse=True)[:len(completed) // self.reduction_factor]
+            for trial_id in top:
+                if trial_id not in self.promoted[rung]:
+                    self.promoted[rung].add(trial_id)
+                    return trial_id, rung + 1
+        if self.started < self.num_trials:
+            self.started += 1
+            return self.started - 1, 0
+        return None
+
+    def report(self, trial_id, rung, metric):
+        self.results[rung][trial_id] = metric
+
+
+def _init_worker(threads):
+    """Limit each trial process to its share of the CPU before TensorFlow starts"""
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(min(2, threads))
+
+
+def run_trial(task):
+    """
+    Worker: train one trial from epochs_done to epochs on the shared tensor cache.
+    task is (trial_id, params, epochs_done, epochs, trial_dir, data_dir, metric).
+    Returns the per-epoch history so far.
+    """
+    trial_id, params, epochs_done, epochs, trial_dir, data_dir, metric = task
+    import config
+    from tensorflow import keras
+    from cnn_model_training import CNNGingerDiseaseModel
+
+    # In place, so every module that imported TRAINING_CONFIG sees the trial's values
+    trial_config = apply_params(params)
+    trial_config.update(data_backend='memmap', synthetic_ratio=0.0)
+    config.TRAINING_CONFIG.clear()
+    config.TRAINING_CONFIG.update(trial_config)
+
+    trial_dir = Path(trial_dir)
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    model_path = trial_dir / 'model.keras'
+    history_path = trial_dir / 'history.json'
+    history = {}
+    if epochs_done and history_path.exists():
+        with open(history_path, 'r') as f:
+            history = json.load(f)
+
+    start = time.time()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        trainer = CNNGingerDiseaseModel()
+        train_gen, val_gen, _ = trainer.create_data_generators(
+            Path(data_dir) / 'train', Path(data_dir) / 'validation', Path(data_dir) / 'test'
+        )
+        if epochs_done:
+            model = keras.models.load_model(model_path)
+        else:
+            model = trainer.compile_model(trainer.create_cnn_model(), steps_per_epoch=len(train_gen))
+        fit = model.fit(train_gen, epochs=epochs, initial_epoch=epochs_done, validation_data=val_gen, verbose=0)
+        model.save(model_path)
+    with open(trial_dir / 'trial.log', 'a') as f:
+        f.write(log.getvalue())
+
+    for key, values in fit.history.items():
+        history[key] = history.get(key, [])[:epochs_done] + [float(value) for value in values]
+    with open(history_path, 'w') as f:
+        json.dump(history, f)
+    return {
+        'trial_id': trial_id,
+        'metric': max(history[metric]),
+        'val_loss': min(history['val_loss']),
+        'seconds': time.time() - start,
+    }
+
+
+def open_db(db_path=None):
+    db_path = Path(db_path or HYPERPARAMETER_SEARCH_DB)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def run_search(study, data_dir=None, num_trials=None, num_workers=None, threads=None, db_path=None):
+    """Run an ASHA search and record every trial and rung in the results database"""
+    search_config = HYPERPARAMETER_SEARCH_CONFIG
+    data_dir = Path(data_dir or PROCESSED_DATASET_PATH)
+    num_trials = num_trials or search_config['trials']
+    num_workers = num_workers or search_config['workers']
+    threads = threads or search_config['threads_per_trial'] or max(1, (os.cpu_count() or 1) // num_workers)
+    metric = search_config['metric']
+    rungs = rung_epochs(search_config['min_epochs'], search_config['max_epochs'], search_config['reduction_factor'])
+    scheduler = ASHA(num_trials, rungs, search_config['reduction_factor'])
+    study_dir = HYPERPARAMETER_SEARCH_DIR / study
+
+    print(f"🔎 Hyperparameter search '{study}': {num_trials} trials, {num_workers} workers x {threads} threads, "
+          f"rungs at {rungs} epochs")
+
+    # Decode the splits once; every trial memory-maps the same cache
+    from tensor_cache import TensorCache
+    for split in ('train', 'validation', 'test'):
+        TensorCache.build(data_dir / split)
+
+    conn = open_db(db_path)
+    params_of = {}
+    search_start = time.time()
+    context = multiprocessing.get_context('spawn')  # TensorFlow is not fork-safe
+    with ProcessPoolExecutor(num_workers, mp_context=context, initializer=_init_worker,
+                             initargs=(threads,)) as executor:
+        running = {}
+        while True:
+            while len(running) < num_workers:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                trial_id, rung = job
+                now = datetime.now().isoformat()
+                if rung == 0:
+                    params_of[trial_id] = sample_params(search_config['space'], search_config['seed'], trial_id)
+                    conn.execute("INSERT OR REPLACE INTO trials VALUES (?, ?, ?, 'running', 0, NULL, ?, ?)",
+                                 (study, trial_id, json.dumps(params_of[trial_id]), now, now))
+                else:
+                    conn.execute("UPDATE trials SET status = 'running', updated = ? WHERE study = ? AND trial_id = ?",
+                                 (now, study, trial_id))
+                conn.commit()
+                task = (trial_id, params_of[trial_id], rungs[rung - 1] if rung else 0, rungs[rung],
+                        str(study_dir / f"trial_{trial_id:03d}"), str(data_dir), metric)
+                running[executor.submit(run_trial, task)] = job
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial_id, rung = running.pop(future)
+                now = datetime.now().isoformat()
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"❌ Trial {trial_id} failed at rung {rung}: {e}")
+                    conn.execute("UPDATE trials SET status = 'failed', updated = ? WHERE study = ? AND trial_id = ?",
+                                 (now, study, trial_id))
+                    conn.commit()
+                    continue
+                scheduler.report(trial_id, rung, result['metric'])
+                status = 'completed' if rung == len(rungs) - 1 else 'paused'
+                conn.execute("INSERT OR REPLACE INTO rungs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (study, trial_id, rung, rungs[rung], result['metric'], result['val_loss'],
+                              result['seconds'], now))
+                conn.execute("UPDATE trials SET status = ?, epochs = ?, best_metric = ?, updated = ? "
+                             "WHERE study = ? AND trial_id = ?",
+                             (status, rungs[rung], result['metric'], now, study, trial_id))
+                conn.commit()
+                print(f"🧪 Trial {trial_id:3d} rung {rung} ({rungs[rung]} epochs): {metric} {result['metric']:.4f} "
+                      f"in {result['seconds']:.0f}s")
+
+    # Trials still waiting for a promotion that never came were pruned
+    conn.execute("UPDATE trials SET status = 'pruned' WHERE study = ? AND status = 'paused'", (study,))
+    conn.commit()
+    for trial_id, in conn.execute("SELECT trial_id FROM trials WHERE study = ? AND status = 'pruned'", (study,)):
+        model_path = study_dir / f"trial_{trial_id:03d}" / 'model.keras'
+        if model_path.exists():
+            model_path.unlink()
+
+    epochs_used = sum(rungs[rung] - (rungs[rung - 1] if rung else 0)
+                      for rung, results in enumerate(scheduler.results) for _ in results)
+    print(f"\n✅ Search finished in {(time.time() - search_start) / 60:.1f} min: {epochs_used} epochs trained "
+          f"instead of {num_trials * rungs[-1]} without pruning")
+    print_top(conn, study, 5)
+    conn.close()
+
+
+def top_trials(conn, study, limit=10):
+    """Trials ranked by the furthest rung reached, then by the metric"""
+    return conn.execute(
+        "SELECT trial_id, status, epochs, best_metric, params FROM trials "
+        "WHERE study = ? AND best_metric IS NOT NULL ORDER BY epochs DESC, best_metric DESC LIMIT ?",
+        (study, limit)
+    ).fetchall()
+
+
+def _describe(value):
+    if isinstance(value, float):
+        return f"{value:.3g}"
+    if isinstance(value, list):
+        return f"<{len(value)} layers>"
+    return str(value)
+
+
+def print_top(conn, study, limit=10):
+    rows = top_trials(conn, study, limit)
+    if not rows:
+        print(f"❌ No finished trials for study '{study}'")
+        return rows
+    print(f"\n🏆 Top trials of '{study}' ({HYPERPARAMETER_SEARCH_CONFIG['metric']}):")
+    print(f"{'trial':>5} {'status':10} {'epochs':>6} {'metric':>8}  params")
+    for trial_id, status, epochs, best_metric, params in rows:
+        summary = ', '.join(f"{key}={_describe(value)}" for key, value in sorted(json.loads(params).items()))
+        print(f"{trial_id:5d} {status:10} {epochs:6d} {best_metric:8.4f}  {summary}")
+    return rows
+
+
+def export_best(conn, study, output_path):
+    """Write the best trial's settings as a full TRAINING_CONFIG (.py snippet or .json)"""
+    rows = top_trials(conn, study, 1)
+    if not rows:
+        print(f"❌ No finished trials for study '{study}'")
+        return None
+    trial_id, status, epochs, best_metric, params = rows[0]
+    training_config = apply_params(json.loads(params))
+    output_path = Path(output_path)
+    with open(output_path, 'w') as f:
+        if output_path.suffix == '.json':
+            json.dump(training_config, f, indent=2)
+        else:
+            f.write(f"# Best trial {trial_id} of hyperparameter search '{study}': "
+                    f"{HYPERPARAMETER_SEARCH_CONFIG['metric']} {best_metric:.4f} after {epochs} epochs\n")
+            f.write(f"TRAINING_CONFIG = {pprint.pformat(training_config, sort_dicts=False)}\n")
+    print(f"📝 Exported trial {trial_id} ({status}, {best_metric:.4f}) to {output_path}")
+    return training_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel ASHA hyperparameter search over TRAINING_CONFIG')
+    parser.add_argument('--study', default=None, help='Study name (default: a timestamp for new searches)')
+    parser.add_argument('--data-dir', default=None, help='Dataset with train/validation/test splits')
+    parser.add_argument('--trials', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None, help='Concurrent trials')
+    parser.add_argument('--threads', type=int, default=None, help='TensorFlow threads per trial')
+    parser.add_argument('--top', type=int, default=None, help='Print the best N trials of the study and exit')
+    parser.add_argument('--export', default=None,
+                        help="Write the best trial's TRAINING_CONFIG to this .py or .json file and exit")
+    args = parser.parse_args()
+
+    if args.top or args.export:
+        if args.study is None:
+            parser.error('--top and --export need --study')
+        conn = open_db()
+        if args.top:
+            print_top(conn, args.study, args.top)
+        if args.export:
+            export_best(conn, args.study, args.export)
+        conn.close()
+        return
+
+    study = args.study or datetime.now().strftime("%Y%m%d_%H%M%S")
+    run_search(study, args.data_dir, args.trials, args.workers, args.threads)
+
+
+if __name__ == "__main__":
+    main()
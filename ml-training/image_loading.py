@@ -0,0 +1,76 @@
+"""
+Reduced-resolution image loading for Ginger Disease Detection
+libjpeg can scale by 1/2, 1/4 or 1/8 in the DCT domain while decoding, so a
+multi-megapixel phone photo headed for 224x224 never has to be decoded at
+full size. Loaders decode to the smallest such scale that is still at least
+the target size, then the usual resize finishes the job.
+"""
+import cv2
+import numpy as np
+from PIL import Image
+
+from config import PREPROCESSING_CONFIG
+
+JPEG_SCALE_FACTORS = (8, 4, 2)
+EXIF_ORIENTATION = 0x0112
+
+CV2_REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def jpeg_reduction_factor(image_size, target_size):
+    """
+    Largest libjpeg scale factor (1, 2, 4 or 8) keeping both sides >= target.
+    Sizes are (width, height).
+    """
+    width, height = image_size
+    target_width, target_height = target_size
+    for factor in JPEG_SCALE_FACTORS:
+        # libjpeg rounds scaled dimensions up
+        if -(-width // factor) >= target_width and -(-height // factor) >= target_height:
+            return factor
+    return 1
+
+
+def load_rgb(image_path, target_size=None, reduced=None):
+    """
+    RGB uint8 array of an image, JPEG-decoded at reduced resolution when
+    target_size (width, height) is given. The result is not resized.
+    """
+    if reduced is None:
+        reduced = PREPROCESSING_CONFIG['reduced_jpeg_decode']
+    with Image.open(image_path) as img:
+        if reduced and target_size is not None:
+            # No-op for non-JPEG formats
+            img.draft('RGB', tuple(target_size))
+        return np.asarray(img.convert('RGB'))
+
+
+def imread_reduced(image_path, target_size=None, reduced=None):
+    """
+    Drop-in for cv2.imread(path) (BGR, None on failure) that decodes JPEGs
+    at reduced resolution when target_size (width, height) is given.
+    """
+    if reduced is None:
+        reduced = PREPROCESSING_CONFIG['reduced_jpeg_decode']
+    image_path = str(image_path)
+    if not reduced or target_size is None:
+        return cv2.imread(image_path)
+
+    try:
+        # Header only: size and format without decoding pixels
+        with Image.open(image_path) as img:
+            image_size, image_format = img.size, img.format
+            # cv2.imread applies EXIF rotation, which swaps the sides for orientations 5-8
+            if img.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+                image_size = image_size[::-1]
+    except Exception:
+        return cv2.imread(image_path)
+
+    factor = jpeg_reduction_factor(image_size, target_size) if image_format == 'JPEG' else 1
+    if factor == 1:
+        return cv2.imread(image_path)
+    return cv2.imread(image_path, CV2_REDUCED_FLAGS[factor])
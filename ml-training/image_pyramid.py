@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+
+"""
+Downscaled multi-size image cache (pyramid) for Ginger Disease Detection
+Full-resolution phone photos are downscaled once to a few short-side sizes
+(PREPROCESSING_CONFIG['pyramid_sizes']). Loaders then read the smallest
+cached copy whose short side still covers their target resolution instead
+of the 12-48 MP original.
+
+Layout of the cache directory:
+    manifest.json                   levels per content digest, source index
+    <short_side>/<ab>/<digest>.jpg  one downscaled copy per level
+
+Levels are keyed by content digest, so the organized dataset, split
+directories and raw files that hold the same bytes share one set of copies.
+A source path only resolves to the cache while its size and mtime still
+match the manifest; anything else falls back to the original file.
+"""
+
+import os
+import json
+import argparse
+from pathlib import Path
+
+from PIL import Image
+
+from config import IMAGE_PYRAMID_DIR, PREPROCESSING_CONFIG, PROCESSED_DATASET_PATH, PROCESSED_DATA_DIR
+from dataset_store import hash_file
+from parallel_utils import run_parallel
+
+PYRAMID_VERSION = 1
+EXIF_ORIENTATION = 0x0112
+
+
+def level_size(image_size, short_side):
+    """(width, height) of image_size scaled so its short side is short_side"""
+    width, height = image_size
+    scale = short_side / min(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def level_path(root, short_side, digest):
+    return Path(root) / str(short_side) / digest[:2] / f"{digest}.jpg"
+
+
+def _build_levels(task):
+    """
+    Worker: write the missing pyramid levels for one image.
+    Returns (digest, original_size, {short_side: [width, height]}, error).
+    """
+    root, src, digest, sizes, quality = task
+    try:
+        with Image.open(src) as img:
+            original_size = img.size
+            orientation = img.getexif().get(EXIF_ORIENTATION)
+            sizes = [size for size in sizes if size < min(original_size)]
+            if not sizes:
+                return digest, list(original_size), {}, None
+            # Let libjpeg decode at the smallest scale that still covers the largest level
+            img.draft('RGB', level_size(original_size, max(sizes)))
+            img = img.convert('RGB')
+
+            # Keep the EXIF orientation so cv2 rotates cached copies like the original
+            exif = Image.Exif()
+            if orientation:
+                exif[EXIF_ORIENTATION] = orientation
+
+            levels = {}
+            for size in sorted(sizes, reverse=True):
+                dest = level_path(root, size, digest)
+                target = level_size(original_size, size)
+                if not dest.exists():
+                    dest.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_path = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+                    img.resize(target, Image.LANCZOS).save(tmp_path, 'JPEG', quality=quality, exif=exif)
+                    os.replace(tmp_path, dest)
+                levels[str(size)] = list(target)
+        return digest, list(original_size), levels, None
+    except Exception as e:
+        return digest, None, {}, str(e)
+
+
+class ImagePyramid:
+    def __init__(self, root=None):
+        self.root = Path(root or IMAGE_PYRAMID_DIR)
+        self.manifest_path = self.root / 'manifest.json'
+        self.images = {}
+        self.sources = {}
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == PYRAMID_VERSION:
+                self.images = data['images']
+                self.sources = data['sources']
+
+    def save(self):
+        """Atomically persist the manifest"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': PYRAMID_VERSION,
+                'images': self.images,
+                'sources': self.sources
+            }, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def build(self, image_paths, sizes=None, quality=None, num_workers=None, rebuild=False):
+        """
+        Cache the pyramid levels of image_paths and index them by path.
+        Only files that are new or changed since the last build are hashed,
+        and only missing levels are written.
+        """
+        sizes = sorted(sizes or PREPROCESSING_CONFIG['pyramid_sizes'])
+        quality = quality or PREPROCESSING_CONFIG['pyramid_jpeg_quality']
+        if rebuild:
+            self.images, self.sources = {}, {}
+
+        # Index sources by resolved path; unchanged files keep their digest
+        stats = {}
+        for image_path in image_paths:
+            path = os.path.realpath(image_path)
+            stat = os.stat(path)
+            stats[path] = (stat.st_size, stat.st_mtime_ns)
+        to_hash = [
+            path for path, (size, mtime_ns) in stats.items()
+            if self.sources.get(path, {}).get('size') != size
+            or self.sources.get(path, {}).get('mtime_ns') != mtime_ns
+        ]
+        if to_hash:
+            print(f"🔐 Hashing {len(to_hash)} new or changed images...")
+            for path, digest in zip(to_hash, run_parallel(hash_file, to_hash, num_workers, desc="Hashing")):
+                size, mtime_ns = stats[path]
+                self.sources[path] = {'size': size, 'mtime_ns': mtime_ns, 'digest': digest}
+
+        # One representative source per digest that is still missing levels
+        pending = {}
+        for path in stats:
+            digest = self.sources[path]['digest']
+            entry = self.images.get(digest)
+            if entry is None or self._missing_sizes(digest, entry, sizes):
+                pending.setdefault(digest, path)
+
+        failed = 0
+        if pending:
+            print(f"🗻 Writing pyramid levels {sizes} for {len(pending)} images...")
+            tasks = [(str(self.root), path, digest, sizes, quality) for digest, path in pending.items()]
+            for digest, original_size, levels, error in run_parallel(_build_levels, tasks, num_workers, desc="Downscaling"):
+                if error:
+                    failed += 1
+                    print(f"⚠️  Could not downscale {pending[digest]}: {error}")
+                    continue
+                entry = self.images.setdefault(digest, {'levels': {}})
+                entry['original_size'] = original_size
+                entry['levels'].update(levels)
+
+        self.save()
+        print(f"✅ Pyramid cache: {len(self.images)} images, {len(self.sources)} indexed paths"
+              f"{f', {failed} failed' if failed else ''}")
+        return {'images': len(self.images), 'written': len(pending) - failed, 'failed': failed}
+
+    def _missing_sizes(self, digest, entry, sizes):
+        """Requested sizes that apply to this image but have no cached level file"""
+        if 'original_size' not in entry:
+            return list(sizes)
+        short_side = min(entry['original_size'])
+        return [
+            size for size in sizes
+            if size < short_side and (
+                str(size) not in entry['levels'] or not level_path(self.root, size, digest).exists()
+            )
+        ]
+
+    def prune(self):
+        """Forget vanished sources and delete levels no indexed path refers to"""
+        self.sources = {path: entry for path, entry in self.sources.items() if os.path.exists(path)}
+        referenced = {entry['digest'] for entry in self.sources.values()}
+        removed = 0
+        for digest in [digest for digest in self.images if digest not in referenced]:
+            for size in self.images.pop(digest)['levels']:
+                level_path(self.root, size, digest).unlink(missing_ok=True)
+                removed += 1
+        self.save()
+        return removed
+
+    def resolve(self, image_path, target_size):
+        """
+        Path of the smallest cached level covering target_size (width, height),
+        or image_path itself when nothing suitable is cached or the source changed.
+        """
+        path = os.path.realpath(image_path)
+        source = self.sources.get(path)
+        if source is None:
+            return image_path
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return image_path
+        if stat.st_size != source['size'] or stat.st_mtime_ns != source['mtime_ns']:
+            return image_path
+
+        # Loaders stretch to target_size, so the short side must cover the longer target side
+        needed = max(target_size)
+        levels = self.images.get(source['digest'], {}).get('levels', {})
+        for size in sorted(int(size) for size in levels):
+            if size >= needed:
+                cached = level_path(self.root, size, source['digest'])
+                return str(cached) if cached.exists() else image_path
+        return image_path
+
+    def resolve_many(self, image_paths, target_size):
+        return [self.resolve(image_path, target_size) for image_path in image_paths]
+
+
+_pyramid = None
+
+
+def get_pyramid():
+    """Process-wide pyramid, or None when disabled or not built yet"""
+    global _pyramid
+    if not PREPROCESSING_CONFIG['use_pyramid']:
+        return None
+    if _pyramid is None:
+        if not (IMAGE_PYRAMID_DIR / 'manifest.json').exists():
+            return None
+        _pyramid = ImagePyramid()
+    return _pyramid
+
+
+def resolve_image_path(image_path, target_size):
+    """Cached downscaled copy of image_path for target_size (width, height), if any"""
+    pyramid = get_pyramid()
+    return image_path if pyramid is None else pyramid.resolve(image_path, target_size)
+
+
+def flow_from_pyramid(datagen, directory, target_size=(256, 256), classes=None, **kwargs):
+    """
+    datagen.flow_from_directory(directory, target_size, classes, **kwargs),
+    reading the smallest cached downscaled copies. The directory listing fixes
+    the files, labels and order; the images are then served by
+    flow_from_dataframe over the resolved paths, so the iterator's filenames
+    are the files it actually loads.
+    """
+    generator = datagen.flow_from_directory(directory, target_size=target_size, classes=classes, **kwargs)
+    pyramid = get_pyramid()
+    if pyramid is None:
+        return generator
+    import pandas as pd
+
+    class_names = sorted(generator.class_indices, key=generator.class_indices.get)
+    dataframe = pd.DataFrame({
+        'filename': pyramid.resolve_many(generator.filepaths, (target_size[1], target_size[0])),
+        'class': [class_names[label] for label in generator.classes],
+    })
+    return datagen.flow_from_dataframe(
+        dataframe, x_col='filename', y_col='class', target_size=target_size, classes=class_names,
+        validate_filenames=False, **kwargs
+    )
+
+
+def list_images(directories):
+    """All image files below the given directories"""
+    valid_extensions = {ext.lower() for ext in PREPROCESSING_CONFIG['valid_extensions']}
+    images = []
+    for directory in directories:
+        directory = Path(directory)
+        if directory.exists():
+            images.extend(
+                path for path in sorted(directory.rglob('*'))
+                if path.is_file() and path.suffix.lower() in valid_extensions
+            )
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the downscaled image pyramid cache')
+    parser.add_argument('directories', nargs='*',
+                        help='Image directories (default: organized dataset and train/validation/test)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: PREPROCESSING_CONFIG)')
+    parser.add_argument('--rebuild', action='store_true', help='Discard the manifest and rebuild')
+    parser.add_argument('--prune', action='store_true', help='Delete levels of images that no longer exist')
+    args = parser.parse_args()
+
+    directories = args.directories or [
+        PROCESSED_DATASET_PATH,
+        PROCESSED_DATA_DIR / 'train',
+        PROCESSED_DATA_DIR / 'validation',
+        PROCESSED_DATA_DIR / 'test',
+    ]
+    images = list_images(directories)
+    print(f"🗻 Building image pyramid for {len(images)} images in {IMAGE_PYRAMID_DIR}")
+
+    pyramid = ImagePyramid()
+    pyramid.build(images, num_workers=args.workers, rebuild=args.rebuild)
+    if args.prune:
+        print(f"🧹 Removed {pyramid.prune()} unreferenced level files")
+
+
+if __name__ == "__main__":
+    main()
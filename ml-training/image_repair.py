@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+"""
+Quarantine and auto-repair of corrupt or non-conforming dataset images
+Files that fail validation are either repaired in place or moved to the
+quarantine directory. Repairs cover non-RGB modes (CMYK, RGBA, L, P),
+EXIF rotation, truncated-but-decodable files, foreign formats and oversized
+images. The original bytes of every touched file are kept in quarantine,
+and each action is appended to repair_manifest.json so a run can be
+audited and reproduced.
+"""
+
+import os
+import json
+import shutil
+import argparse
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+
+from PIL import Image, ImageFile, ImageOps
+
+from config import *
+from dataset_manifest import scan_image_tree
+from dataset_store import hash_file
+from image_validation import TIER_HEADER, TIER_STRUCTURE, validate_file
+from parallel_utils import run_parallel
+from validate_images import MIN_RESOLUTION, MIN_FILE_SIZE, MAX_FILE_SIZE
+
+REPAIR_MANIFEST_VERSION = 1
+EXIF_ORIENTATION = 0x0112
+
+# Problems a re-encode cannot fix
+UNFIXABLE = {'unreadable', 'undecodable', 'undersized', 'tiny_file', 'still_oversized'}
+
+
+def diagnose(img_path, max_side):
+    """Problem codes for one file from its header and structure (no pixel decode)"""
+    result = validate_file(img_path, TIER_STRUCTURE)
+    if result['failed_tier'] == TIER_HEADER:
+        return ['unreadable']
+
+    problems = []
+    if result['error']:
+        problems.append('truncated')
+    if result['format'] not in ('JPEG', 'PNG'):
+        problems.append(f"format:{result['format']}")
+    if result['mode'] != 'RGB':
+        problems.append(f"mode:{result['mode']}")
+    try:
+        with Image.open(img_path) as img:
+            orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        if orientation not in (0, 1):
+            problems.append(f"exif_orientation:{orientation}")
+    except Exception:
+        pass
+    if min(result['width'], result['height']) < MIN_RESOLUTION:
+        problems.append('undersized')
+    if result['size'] < MIN_FILE_SIZE:
+        problems.append('tiny_file')
+    elif result['size'] > MAX_FILE_SIZE:
+        problems.append('oversized_file')
+    if max(result['width'], result['height']) > max_side:
+        problems.append('oversized_dimensions')
+    return problems
+
+
+def _quarantine_path(quarantine_dir, rel_path, digest):
+    rel_path = Path(rel_path)
+    return Path(quarantine_dir) / rel_path.parent / f"{digest[:12]}_{rel_path.name}"
+
+
+def _to_rgb(img):
+    """Convert any mode to RGB, flattening transparency onto white"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def repair_image(task, quarantine_dir, max_side, quality, dry_run=False):
+    """
+    Worker: diagnose one file and repair or quarantine it.
+    Returns a manifest record describing what was (or would be) done.
+    """
+    rel_path, src = task
+    record = {'file': rel_path, 'action': 'ok', 'problems': [], 'fixes': [], 'original_digest': None,
+              'output': None, 'output_digest': None, 'quarantine': None, 'error': None}
+    try:
+        problems = diagnose(src, max_side)
+        record['problems'] = problems
+        if not problems:
+            return record
+        record['original_digest'] = hash_file(src)
+        quarantine_path = _quarantine_path(quarantine_dir, rel_path, record['original_digest'])
+
+        image = None
+        if not UNFIXABLE.intersection(problems):
+            # Truncated files: keep whatever the decoder can recover
+            previous = ImageFile.LOAD_TRUNCATED_IMAGES
+            ImageFile.LOAD_TRUNCATED_IMAGES = True
+            try:
+                with Image.open(src) as img:
+                    img.load()
+                    image = img.copy()
+            except Exception as e:
+                problems.append('undecodable')
+                record['error'] = str(e)
+            finally:
+                ImageFile.LOAD_TRUNCATED_IMAGES = previous
+
+        if image is None:
+            record.update(action='quarantined', quarantine=str(quarantine_path))
+            if not dry_run:
+                quarantine_path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(src, quarantine_path)
+            return record
+
+        # Re-encode: upright, RGB, within the size caps
+        fixes = record['fixes']
+        if any(problem.startswith('exif_orientation') for problem in problems):
+            image = ImageOps.exif_transpose(image)
+            fixes.append('exif_transpose')
+        if image.mode != 'RGB':
+            fixes.append(f"convert:{image.mode}->RGB")
+            image = _to_rgb(image)
+        if max(image.size) > max_side:
+            scale = max_side / max(image.size)
+            new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            fixes.append(f"downscale:{image.width}x{image.height}->{new_size[0]}x{new_size[1]}")
+            image = image.resize(new_size, Image.LANCZOS)
+        if 'truncated' in problems:
+            fixes.append('recover_truncated')
+
+        keep_png = Path(src).suffix.lower() == '.png' and 'oversized_file' not in problems
+        dest = Path(src) if keep_png or Path(src).suffix.lower() in ('.jpg', '.jpeg') else Path(src).with_suffix('.jpg')
+        if dest != Path(src) and dest.exists():
+            # Never overwrite a different image that already has the new name
+            dest = dest.with_name(f"{dest.stem}_{record['original_digest'][:8]}.jpg")
+        fixes.append('encode:PNG' if keep_png else f"encode:JPEG:q{quality}")
+        record.update(action='repaired', output=str(dest), quarantine=str(quarantine_path))
+        if dry_run:
+            return record
+
+        tmp_path = dest.with_name(f".{dest.name}.repair.tmp")
+        if keep_png:
+            image.save(tmp_path, 'PNG')
+        else:
+            image.save(tmp_path, 'JPEG', quality=quality)
+        if os.path.getsize(tmp_path) > MAX_FILE_SIZE:
+            os.remove(tmp_path)
+            record['problems'].append('still_oversized')
+            record.update(action='quarantined', output=None)
+            quarantine_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(src, quarantine_path)
+            return record
+
+        # Original bytes go to quarantine before the repaired file takes their place
+        quarantine_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, quarantine_path)
+        os.replace(tmp_path, dest)
+        if dest != Path(src):
+            os.remove(src)
+        record['output_digest'] = hash_file(dest)
+    except Exception as e:
+        record.update(action='failed', error=str(e))
+    return record
+
+
+class RepairManifest:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.runs = []
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == REPAIR_MANIFEST_VERSION:
+                self.runs = data['runs']
+
+    def save(self):
+        """Atomically persist the manifest"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': REPAIR_MANIFEST_VERSION, 'runs': self.runs}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def repair_dataset(dataset_dir=None, quarantine_dir=None, num_workers=None, dry_run=False):
+    """Diagnose every image in dataset_dir in parallel and repair or quarantine the bad ones"""
+    dataset_dir = Path(dataset_dir or DATASET_PATH)
+    quarantine_dir = Path(quarantine_dir or QUARANTINE_DIR)
+    max_side = PREPROCESSING_CONFIG['repair_max_side']
+    quality = PREPROCESSING_CONFIG['repair_jpeg_quality']
+
+    listing = scan_image_tree(dataset_dir, DISEASE_CLASSES, PREPROCESSING_CONFIG['valid_extensions'])
+    print(f"🩺 Checking {len(listing)} images in {dataset_dir}{' (dry run)' if dry_run else ''}...")
+
+    # Cheap header/structure pass first; only flagged files reach the repair workers
+    problems = run_parallel(
+        partial(diagnose, max_side=max_side), [str(dataset_dir / rel_path) for rel_path in listing],
+        num_workers, desc="Diagnosing"
+    )
+    flagged = [(rel_path, str(dataset_dir / rel_path)) for rel_path, found in zip(listing, problems) if found]
+    print(f"🔎 {len(flagged)} images need attention")
+
+    records = run_parallel(
+        partial(repair_image, quarantine_dir=str(quarantine_dir), max_side=max_side, quality=quality,
+                dry_run=dry_run),
+        flagged, num_workers, desc="Repairing"
+    )
+
+    counts = {}
+    for record in records:
+        counts[record['action']] = counts.get(record['action'], 0) + 1
+    for record in records:
+        if record['action'] == 'failed':
+            print(f"❌ {record['file']}: {record['error']}")
+
+    print(f"🔧 Repaired: {counts.get('repaired', 0)}")
+    print(f"🚧 Quarantined: {counts.get('quarantined', 0)}")
+    if counts.get('failed'):
+        print(f"❌ Failed: {counts['failed']}")
+
+    if not dry_run and records:
+        manifest = RepairManifest(quarantine_dir / 'repair_manifest.json')
+        manifest.runs.append({
+            'timestamp': datetime.now().isoformat(),
+            'dataset_dir': str(dataset_dir),
+            'params': {'max_side': max_side, 'jpeg_quality': quality, 'min_resolution': MIN_RESOLUTION,
+                       'min_file_size': MIN_FILE_SIZE, 'max_file_size': MAX_FILE_SIZE},
+            'records': records
+        })
+        manifest.save()
+        print(f"📝 Actions recorded in {manifest.path}")
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Repair or quarantine non-conforming dataset images')
+    parser.add_argument('dataset_dir', nargs='?', default=None, help='Dataset root (default: DATASET_PATH)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: PREPROCESSING_CONFIG)')
+    parser.add_argument('--dry-run', action='store_true', help='Report planned actions without touching files')
+    args = parser.parse_args()
+
+    repair_dataset(args.dataset_dir, num_workers=args.workers, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Tiered image validation engine for Ginger Disease Detection
+Each tier costs more I/O than the one before and callers pick how deep to go:
+
+    tier 0  header     format, dimensions and mode from the first few KB
+    tier 1  structure  JPEG marker walk + end-of-image marker, PNG chunk walk
+                       to IEND (reads segment headers and the file tail only)
+    tier 2  decode     full pixel decode
+
+Tiers are cumulative and stop at the first failure.
+"""
+import os
+import struct
+from functools import partial
+
+from PIL import Image
+
+from parallel_utils import run_parallel
+
+TIER_HEADER = 0
+TIER_STRUCTURE = 1
+TIER_DECODE = 2
+TIER_NAMES = {TIER_HEADER: 'header', TIER_STRUCTURE: 'structure', TIER_DECODE: 'decode'}
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# JPEG markers without a length field
+JPEG_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+JPEG_TAIL_BYTES = 1024
+
+
+def _check_jpeg_structure(f, file_size):
+    """Walk the header segments up to start-of-scan and look for the end-of-image marker"""
+    if f.read(2) != b'\xff\xd8':
+        return "JPEG: missing start-of-image marker"
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return "JPEG: truncated before image data"
+        if byte != b'\xff':
+            return f"JPEG: corrupt marker at offset {f.tell() - 1}"
+        marker = f.read(1)
+        while marker == b'\xff':  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return "JPEG: truncated before image data"
+        marker = marker[0]
+        if marker == 0xD9:
+            return "JPEG: end-of-image before image data"
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return "JPEG: truncated segment header"
+        length = struct.unpack('>H', length_bytes)[0]
+        if length < 2 or f.tell() + length - 2 > file_size:
+            return f"JPEG: segment 0x{marker:02X} runs past end of file"
+        if marker == 0xDA:  # start of scan: entropy-coded data follows
+            break
+        f.seek(length - 2, os.SEEK_CUR)
+
+    # Truncated downloads lose the end-of-image marker; allow trailing padding
+    f.seek(max(0, file_size - JPEG_TAIL_BYTES))
+    if b'\xff\xd9' not in f.read(JPEG_TAIL_BYTES):
+        return "JPEG: truncated (no end-of-image marker)"
+    return None
+
+
+def _check_png_structure(f, file_size):
+    """Walk the chunk headers to IEND without reading chunk data"""
+    if f.read(8) != PNG_SIGNATURE:
+        return "PNG: bad signature"
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return "PNG: truncated (no IEND chunk)"
+        length, chunk_type = struct.unpack('>I4s', header)
+        if f.tell() + length + 4 > file_size:
+            return f"PNG: chunk {chunk_type.decode('latin-1')} runs past end of file"
+        if chunk_type == b'IEND':
+            return None
+        f.seek(length + 4, os.SEEK_CUR)
+
+
+def validate_file(img_path, tier=TIER_HEADER):
+    """
+    Validate one image up to the given tier.
+    Returns a dict with size, format, width, height, mode, the tier reached
+    and error (None when every requested tier passed).
+    """
+    result = {
+        'tier': tier, 'size': None, 'format': None, 'width': None, 'height': None, 'mode': None,
+        'error': None, 'failed_tier': None
+    }
+
+    def fail(failed_tier, error):
+        result.update(error=error, failed_tier=failed_tier)
+        return result
+
+    try:
+        result['size'] = os.path.getsize(img_path)
+        with Image.open(img_path) as img:
+            result.update(format=img.format, width=img.size[0], height=img.size[1], mode=img.mode)
+    except Exception as e:
+        return fail(TIER_HEADER, str(e))
+    if tier < TIER_STRUCTURE:
+        return result
+
+    try:
+        with open(img_path, 'rb', buffering=0) as f:
+            if result['format'] == 'JPEG':
+                error = _check_jpeg_structure(f, result['size'])
+            elif result['format'] == 'PNG':
+                error = _check_png_structure(f, result['size'])
+            else:
+                error = None
+        if error is None and result['format'] not in ('JPEG', 'PNG'):
+            # No cheap structural check for other formats; fall back to PIL's verify
+            with Image.open(img_path) as img:
+                img.verify()
+    except Exception as e:
+        error = str(e)
+    if error:
+        return fail(TIER_STRUCTURE, error)
+    if tier < TIER_DECODE:
+        return result
+
+    try:
+        with Image.open(img_path) as img:
+            img.load()
+    except Exception as e:
+        return fail(TIER_DECODE, str(e))
+    return result
+
+
+def validate_files(paths, tier=TIER_HEADER, num_workers=None, desc=None):
+    """validate_file over many paths in parallel, results in input order"""
+    return run_parallel(partial(validate_file, tier=tier), [str(path) for path in paths], num_workers, desc=desc)
@@ -0,0 +1,376 @@
+"""
+Bulk transactional ingest of new images into a dataset class directory
+Sources are validated, (optionally) transcoded, hashed and added to the
+content store in parallel; nothing in the class directory changes during
+that phase. Names are then allocated under a per-class lock, written to a
+journal, linked into place in parallel, and committed to the store
+manifest in one atomic write. An interrupted ingest is rolled back from
+the journal, either immediately or at the start of the next ingest.
+Zip and tar archives are streamed member by member into the store's
+staging area, so their contents are never extracted to a temporary tree.
+"""
+import io
+import os
+import re
+import json
+import uuid
+import shutil
+import tarfile
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+
+from PIL import Image
+
+from config import DATASET_PATH, PREPROCESSING_CONFIG
+from dataset_store import ContentStore, hash_file
+from image_validation import TIER_STRUCTURE, validate_file
+from parallel_utils import run_parallel, run_parallel_stream
+
+JOURNAL_NAME = '.ingest-journal.json'
+LOCK_NAME = '.ingest.lock'
+
+# Formats stored as-is; anything else is transcoded to JPEG unless keep_format is set
+NATIVE_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+KEEP_EXTENSIONS = {'BMP': '.bmp', 'TIFF': '.tiff', 'WEBP': '.webp', 'GIF': '.gif'}
+TRANSCODE_QUALITY = 95
+
+
+def _prepare(src, path, staging_dir, keep_format, tier, store, owned):
+    """
+    Validate path, transcode it if needed and add it to the store.
+    owned paths (staged copies) are moved into the store instead of copied.
+    Returns a dict with src, digest, size, ext, transcoded, is_new and error.
+    """
+    result = {'src': src, 'digest': None, 'size': 0, 'ext': None, 'transcoded': False, 'is_new': False,
+              'error': None}
+    validation = validate_file(path, tier)
+    if validation['error']:
+        result['error'] = validation['error']
+        return result
+
+    image_format = validation['format']
+    if image_format in NATIVE_EXTENSIONS:
+        result['ext'] = NATIVE_EXTENSIONS[image_format]
+    elif keep_format:
+        result['ext'] = KEEP_EXTENSIONS.get(image_format, Path(src).suffix.lower())
+    else:
+        # Transcode through memory into the staging area
+        buffer = io.BytesIO()
+        with Image.open(path) as img:
+            img.convert('RGB').save(buffer, 'JPEG', quality=TRANSCODE_QUALITY)
+        if owned:
+            os.remove(path)
+        path = Path(staging_dir) / f"{uuid.uuid4().hex}.jpg"
+        path.write_bytes(buffer.getvalue())
+        owned = True
+        result.update(ext='.jpg', transcoded=True)
+
+    if owned:
+        digest, size, is_new = store.adopt_file(path, hash_file(path))
+    else:
+        digest, size, is_new = store.add_file(path, hash_file(path))
+    result.update(digest=digest, size=size, is_new=is_new)
+    return result
+
+
+def prepare_source(task):
+    """
+    Worker: validate one source file, transcode it if needed and add it to the store.
+    task is (src, store_root, link_mode, staging_dir, keep_format, tier).
+    """
+    src, store_root, link_mode, staging_dir, keep_format, tier = task
+    store = ContentStore(store_root, link_mode, load_manifest=False)
+    try:
+        return _prepare(src, src, staging_dir, keep_format, tier, store, owned=False)
+    except Exception as e:
+        return {'src': src, 'digest': None, 'size': 0, 'ext': None, 'transcoded': False, 'is_new': False,
+                'error': str(e)}
+
+
+def prepare_member(task):
+    """
+    Worker: stage the bytes of one archive member inside the store root and
+    prepare it like prepare_source. The staged file becomes the blob by
+    rename, so member bytes are written to disk exactly once.
+    task is (src, data, store_root, link_mode, staging_dir, keep_format, tier).
+    """
+    src, data, store_root, link_mode, staging_dir, keep_format, tier = task
+    store = ContentStore(store_root, link_mode, load_manifest=False)
+    staged_path = Path(staging_dir) / f"{uuid.uuid4().hex}{PurePosixPath(src).suffix.lower()}"
+    try:
+        staged_path.write_bytes(data)
+        result = _prepare(src, staged_path, staging_dir, keep_format, tier, store, owned=True)
+    except Exception as e:
+        result = {'src': src, 'digest': None, 'size': 0, 'ext': None, 'transcoded': False, 'is_new': False,
+                  'error': str(e)}
+    finally:
+        if staged_path.exists():
+            staged_path.unlink()
+    if result['error']:
+        # Report the member name, not the staging path
+        result['error'] = result['error'].replace(str(staged_path), src)
+    return result
+
+
+def iter_archive_members(archive_path, extensions):
+    """
+    Yield (name, bytes) for every image member of a zip or tar(.gz/.bz2/.xz)
+    archive, reading it front to back without extracting to disk.
+    """
+    archive_path = Path(archive_path)
+    extensions = {ext.lower() for ext in extensions}
+
+    def wanted(name):
+        path = PurePosixPath(name)
+        # Skip macOS resource forks and other hidden entries
+        return (path.suffix.lower() in extensions and not path.name.startswith('.')
+                and '__MACOSX' not in path.parts)
+
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and wanted(info.filename):
+                    yield info.filename, archive.read(info)
+    elif tarfile.is_tarfile(archive_path):
+        # Stream mode: members are read strictly in order, no seeking back
+        with tarfile.open(archive_path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and wanted(member.name):
+                    yield member.name, archive.extractfile(member).read()
+    else:
+        raise ValueError(f"Not a zip or tar archive: {archive_path}")
+
+
+def is_archive(path):
+    path = Path(path)
+    return path.is_file() and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+
+def _place(task):
+    """Worker: materialize one blob at its allocated name. task is (store_root, link_mode, digest, dest)."""
+    store_root, link_mode, digest, dest = task
+    store = ContentStore(store_root, link_mode, load_manifest=False)
+    return store.materialize(digest, dest)
+
+
+@contextmanager
+def class_lock(class_dir):
+    """Exclusive per-class lock so concurrent ingests never allocate the same name"""
+    lock_path = Path(class_dir) / LOCK_NAME
+    with open(lock_path, 'w') as lock_file:
+        try:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        except ImportError:
+            pass
+        yield
+
+
+def _write_journal(path, data):
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _rollback(class_dir, journal, store):
+    """Remove names placed by an uncommitted transaction; returns how many were removed"""
+    removed = 0
+    for entry in journal['entries']:
+        dest = Path(class_dir) / entry['name']
+        if not dest.exists():
+            continue
+        blob = store.blob_path(entry['digest'])
+        # Only remove what this transaction placed (same inode, or same bytes for copies)
+        if (blob.exists() and os.path.samefile(blob, dest)) or hash_file(dest) == entry['digest']:
+            dest.unlink()
+            removed += 1
+    return removed
+
+
+def recover_interrupted(class_dir, store):
+    """Finish or roll back a transaction left behind by an interrupted ingest"""
+    journal_path = Path(class_dir) / JOURNAL_NAME
+    if not journal_path.exists():
+        return None
+    with open(journal_path, 'r') as f:
+        journal = json.load(f)
+
+    committed = all(store.digest_of(Path(class_dir) / entry['name']) == entry['digest']
+                    for entry in journal['entries'])
+    if committed:
+        outcome = 'committed'
+    else:
+        removed = _rollback(class_dir, journal, store)
+        outcome = f"rolled back ({removed} files removed)"
+    journal_path.unlink()
+    print(f"  🩹 Recovered interrupted ingest {journal['txn']}: {outcome}")
+    return outcome
+
+
+def next_free_number(class_dir, class_name):
+    """One past the highest {class}_{number} in the directory, so gaps are never refilled"""
+    pattern = re.compile(rf"^{re.escape(class_name)}_(\d+)\.")
+    numbers = [int(match.group(1)) for match in map(pattern.match, os.listdir(class_dir)) if match]
+    return max(numbers) + 1 if numbers else 1
+
+
+@contextmanager
+def _staging(store, txn):
+    """Per-transaction staging directory inside the store root (same filesystem as the blobs)"""
+    staging_dir = store.root / 'staging' / txn
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        yield staging_dir
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _class_digests(class_dir, store, num_workers):
+    """Digests already in the class, hashing files unknown to the manifest in parallel"""
+    existing = sorted(path for path in class_dir.iterdir() if path.is_file() and not path.name.startswith('.'))
+    class_digests = {store.digest_of(path) for path in existing}
+    unknown = [str(path) for path in existing if store.digest_of(path) is None]
+    class_digests.update(run_parallel(hash_file, unknown, num_workers))
+    class_digests.discard(None)
+    return class_digests
+
+
+def _discard_orphans(store, prepared):
+    """Remove blobs this ingest created that no manifest entry ended up referencing"""
+    referenced = {entry['digest'] for entry in store.manifest['entries'].values()}
+    for result in prepared:
+        if result['is_new'] and result['digest'] not in referenced:
+            store.blob_path(result['digest']).unlink(missing_ok=True)
+
+
+def _commit(class_name, class_dir, store, prepared, txn, limit, num_workers, verbose):
+    """Dedupe prepared results, allocate names and place them as one journaled transaction"""
+    summary = {'added': [], 'duplicates': 0, 'duplicate_bytes': 0, 'failed': [], 'transcoded': 0}
+    with class_lock(class_dir):
+        # Re-read the manifest under the lock so concurrent commits are not lost
+        store.manifest = store._load_manifest()
+        recover_interrupted(class_dir, store)
+
+        class_digests = _class_digests(class_dir, store, num_workers)
+
+        # Select, dedupe and allocate names
+        number = next_free_number(class_dir, class_name)
+        planned = []
+        for result in prepared:
+            if result['error']:
+                summary['failed'].append((result['src'], result['error']))
+                continue
+            if result['digest'] in class_digests:
+                summary['duplicates'] += 1
+                summary['duplicate_bytes'] += result['size']
+                if verbose:
+                    print(f"  ♻️  Skipped duplicate: {Path(result['src']).name}")
+                continue
+            if limit is not None and len(planned) >= limit:
+                break
+            name = f"{class_name}_{number:03d}{result['ext']}"
+            number += 1
+            class_digests.add(result['digest'])
+            summary['transcoded'] += result['transcoded']
+            planned.append({'name': name, 'digest': result['digest'], 'size': result['size'],
+                            'src': result['src']})
+
+        if not planned:
+            _discard_orphans(store, prepared)
+            return summary
+
+        # Phase 2: journal, place, commit
+        journal_path = class_dir / JOURNAL_NAME
+        journal = {'txn': txn, 'entries': [{'name': entry['name'], 'digest': entry['digest']} for entry in planned]}
+        _write_journal(journal_path, journal)
+        try:
+            run_parallel(
+                _place,
+                [(str(store.root), store.link_mode, entry['digest'], str(class_dir / entry['name']))
+                 for entry in planned],
+                num_workers, desc="Placing" if verbose else None
+            )
+            for entry in planned:
+                store.record(class_dir / entry['name'], entry['digest'], entry['size'])
+            store.save_manifest()
+        except BaseException:
+            # Undo every placed name before surfacing the error (including Ctrl-C)
+            _rollback(class_dir, journal, store)
+            journal_path.unlink()
+            raise
+        journal_path.unlink()
+        _discard_orphans(store, prepared)
+
+    summary['added'] = [(entry['src'], entry['name']) for entry in planned]
+    return summary
+
+
+def ingest_files(class_name, sources, data_dir=None, limit=None, keep_format=False, tier=TIER_STRUCTURE,
+                 num_workers=None, verbose=True):
+    """
+    Ingest image files into data_dir/class_name as one transaction.
+    Returns a summary dict: added (list of (source, name)), duplicates,
+    duplicate_bytes, failed (list of (source, error)) and transcoded.
+    """
+    class_dir = Path(data_dir or DATASET_PATH) / class_name
+    class_dir.mkdir(parents=True, exist_ok=True)
+    store = ContentStore()
+    txn = uuid.uuid4().hex[:12]
+
+    with _staging(store, txn) as staging_dir:
+        # Phase 1: validate, transcode, hash and store blobs in parallel (class dir untouched)
+        tasks = [(str(src), str(store.root), store.link_mode, str(staging_dir), keep_format, tier)
+                 for src in sources]
+        prepared = run_parallel(prepare_source, tasks, num_workers, desc="Preparing" if verbose else None)
+    return _commit(class_name, class_dir, store, prepared, txn, limit, num_workers, verbose)
+
+
+def ingest_archive(class_name, archive_path, data_dir=None, limit=None, keep_format=False, tier=TIER_STRUCTURE,
+                   num_workers=None, verbose=True):
+    """
+    Ingest the images inside a zip or tar archive without extracting it.
+    Members are read sequentially in this process while workers validate,
+    hash and store the ones already read; the commit is the same
+    transaction as ingest_files. With a limit, reading stops once that many
+    new images are prepared. Sources in the summary are
+    'archive.zip:member/path.jpg'; failed_members repeats the failures as
+    (member name, error) pairs.
+    """
+    archive_path = Path(archive_path)
+    class_dir = Path(data_dir or DATASET_PATH) / class_name
+    class_dir.mkdir(parents=True, exist_ok=True)
+    store = ContentStore()
+    txn = uuid.uuid4().hex[:12]
+    # Snapshot of the class for the limit; _commit re-checks under the lock
+    seen = _class_digests(class_dir, store, num_workers) if limit is not None else set()
+    prepared, accepted = [], 0
+
+    def tasks():
+        members = iter_archive_members(archive_path, PREPROCESSING_CONFIG['valid_extensions'])
+        try:
+            # Checked before each read; members still in flight at the limit are dropped by _commit
+            while limit is None or accepted < limit:
+                name, data = next(members, (None, None))
+                if name is None:
+                    return
+                yield (f"{archive_path.name}:{name}", data, str(store.root), store.link_mode, str(staging_dir),
+                       keep_format, tier)
+        finally:
+            members.close()
+
+    with _staging(store, txn) as staging_dir:
+        for result in run_parallel_stream(prepare_member, tasks(), num_workers,
+                                          desc="Streaming" if verbose else None):
+            prepared.append(result)
+            if not result['error'] and result['digest'] not in seen:
+                seen.add(result['digest'])
+                accepted += 1
+    summary = _commit(class_name, class_dir, store, prepared, txn, limit, num_workers, verbose)
+    # Sliced by the known prefix: archive names may contain ':' themselves
+    prefix_length = len(archive_path.name) + 1
+    summary['failed_members'] = [(src[prefix_length:], error) for src, error in summary['failed']]
+    return summary
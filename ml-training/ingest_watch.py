@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+"""
+Continuous ingest from per-class inbox folders
+Images (or zip/tar archives) dropped into INBOX_DIR/<class_name>/ are
+picked up by a polling loop. A file is only taken once its size and mtime
+have stayed unchanged for debounce_seconds, so half-copied uploads are
+left alone. Ready files are ingested per class in batches through the same
+transactional path as add_images.py (ingest.py). Ingested and duplicate
+sources are removed from the inbox; rejected ones move to
+<class_name>/.rejected/ with the reason next to them. Members of an
+archive that fail are extracted to .rejected/<archive name>/ the same way
+while the rest of the archive is ingested. Backlog and
+throughput counters are written to INGEST_WATCH_STATUS_PATH every cycle.
+"""
+
+import os
+import json
+import time
+import shutil
+import signal
+import argparse
+from collections import deque
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+
+from config import *
+from ingest import ingest_archive, ingest_files, is_archive, iter_archive_members
+
+REJECTED_DIR_NAME = '.rejected'
+# Suffixes browsers, rsync and copy tools use while a file is still being written
+PARTIAL_SUFFIXES = {'.part', '.partial', '.tmp', '.crdownload', '.download', '.filepart'}
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tgz', '.tar.gz', '.tar.bz2', '.tar.xz')
+
+
+class InboxWatcher:
+    def __init__(self, inbox_dir=None, data_dir=None, classes=None, keep_format=False, num_workers=None,
+                 status_path=None):
+        self.inbox_dir = Path(inbox_dir or INBOX_DIR)
+        self.data_dir = Path(data_dir or DATASET_PATH)
+        self.classes = list(classes or DISEASE_CLASSES)
+        self.keep_format = keep_format
+        self.num_workers = num_workers
+        self.status_path = Path(status_path or INGEST_WATCH_STATUS_PATH)
+        self.poll_interval = INGEST_WATCH_CONFIG['poll_interval']
+        self.debounce_seconds = INGEST_WATCH_CONFIG['debounce_seconds']
+        self.max_batch = INGEST_WATCH_CONFIG['max_batch']
+        self.throughput_window = INGEST_WATCH_CONFIG['throughput_window']
+        self.image_extensions = {ext.lower() for ext in PREPROCESSING_CONFIG['valid_extensions']}
+
+        # path -> ((size, mtime_ns), time the signature was first seen)
+        self.pending = {}
+        self.recent = deque()  # (finish time, files processed) per batch
+        self.counters = {
+            'started': datetime.now().isoformat(), 'updated': None, 'cycles': 0, 'batches': 0,
+            'ingested': 0, 'duplicates': 0, 'rejected': 0, 'errors': 0, 'busy_seconds': 0.0,
+            'last_batch': None, 'last_error': None
+        }
+        self._stop = False
+
+        for class_name in self.classes:
+            (self.inbox_dir / class_name).mkdir(parents=True, exist_ok=True)
+
+    def _is_candidate(self, name):
+        lower = name.lower()
+        if name.startswith('.') or Path(lower).suffix in PARTIAL_SUFFIXES:
+            return False
+        return Path(lower).suffix in self.image_extensions or lower.endswith(ARCHIVE_SUFFIXES)
+
+    def scan(self, now=None):
+        """
+        Refresh the pending set and return {class_name: [ready paths]}.
+        A path is ready once its (size, mtime) signature has been unchanged
+        for debounce_seconds.
+        """
+        now = time.monotonic() if now is None else now
+        seen = set()
+        ready = {}
+        for class_name in self.classes:
+            try:
+                entries = list(os.scandir(self.inbox_dir / class_name))
+            except FileNotFoundError:
+                continue
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if not entry.is_file() or not self._is_candidate(entry.name):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                path = entry.path
+                seen.add(path)
+                signature = (stat.st_size, stat.st_mtime_ns)
+                previous = self.pending.get(path)
+                if previous is None or previous[0] != signature:
+                    self.pending[path] = (signature, now)
+                elif now - previous[1] >= self.debounce_seconds:
+                    ready.setdefault(class_name, []).append(path)
+
+        # Files that disappeared (moved away by the uploader) are no longer pending
+        for path in set(self.pending) - seen:
+            del self.pending[path]
+        return ready
+
+    def _reject(self, path, errors):
+        """Move a source to .rejected/ and write why next to it"""
+        rejected_dir = Path(path).parent / REJECTED_DIR_NAME
+        rejected_dir.mkdir(exist_ok=True)
+        dest = rejected_dir / Path(path).name
+        if dest.exists():
+            dest = rejected_dir / f"{int(time.time())}_{Path(path).name}"
+        shutil.move(path, dest)
+        with open(dest.with_name(f"{dest.name}.error.txt"), 'w') as f:
+            f.write('\n'.join(errors) + '\n')
+
+    def _reject_members(self, archive, errors):
+        """Extract the failed members of an ingested archive to .rejected/<archive name>/ with their reasons"""
+        rejected_dir = Path(archive).parent / REJECTED_DIR_NAME / Path(archive).name
+        if rejected_dir.exists():
+            rejected_dir = rejected_dir.with_name(f"{int(time.time())}_{Path(archive).name}")
+        rejected_dir.mkdir(parents=True)
+        for name, data in iter_archive_members(archive, PREPROCESSING_CONFIG['valid_extensions']):
+            if name not in errors:
+                continue
+            # Flatten the member path so nothing lands outside the rejected directory
+            dest = rejected_dir / '__'.join(part for part in PurePosixPath(name).parts if part not in ('/', '..'))
+            dest.write_bytes(data)
+            with open(dest.with_name(f"{dest.name}.error.txt"), 'w') as f:
+                f.write(f"{name}: {errors[name]}\n")
+
+    def _settle(self, sources, summary):
+        """Remove ingested/duplicate sources from the inbox and reject failed ones"""
+        failed = {}
+        for src, error in summary['failed']:
+            failed.setdefault(src, []).append(f"{src}: {error}")
+        # ingest_archive also reports (member, error) pairs; sources is then that archive
+        # alone, and only its failed members are rejected
+        failed_members = dict(summary.get('failed_members', []))
+        for path in sources:
+            self.pending.pop(path, None)
+            if not os.path.exists(path):
+                continue
+            if path in failed:
+                self._reject(path, failed[path])
+                continue
+            if failed_members:
+                self._reject_members(path, failed_members)
+            os.remove(path)
+        self.counters['ingested'] += len(summary['added'])
+        self.counters['duplicates'] += summary['duplicates']
+        self.counters['rejected'] += len(summary['failed'])
+
+    def ingest_batch(self, class_name, paths):
+        """Ingest one class' ready files; returns the number of images processed"""
+        images = [path for path in paths if not path.lower().endswith(ARCHIVE_SUFFIXES)]
+        archives = [path for path in paths if path.lower().endswith(ARCHIVE_SUFFIXES)]
+        start = time.monotonic()
+        processed = 0
+        try:
+            if images:
+                summary = ingest_files(class_name, images, data_dir=self.data_dir, keep_format=self.keep_format,
+                                       num_workers=self.num_workers, verbose=False)
+                self._settle(images, summary)
+                processed += len(images)
+            for archive in archives:
+                if not is_archive(archive):
+                    summary = {'added': [], 'duplicates': 0, 'failed': [(archive, 'not a zip or tar archive')]}
+                else:
+                    summary = ingest_archive(class_name, archive, data_dir=self.data_dir,
+                                             keep_format=self.keep_format, num_workers=self.num_workers,
+                                             verbose=False)
+                self._settle([archive], summary)
+                processed += len(summary['added']) + summary['duplicates'] + len(summary['failed'])
+        except Exception as e:
+            # The transaction rolled back; the files stay in the inbox and are retried next cycle
+            self.counters['errors'] += 1
+            self.counters['last_error'] = f"{datetime.now().isoformat()} {class_name}: {e}"
+            print(f"❌ Ingest into {class_name} failed, will retry: {e}")
+            for path in paths:
+                self.pending.pop(path, None)
+            return 0
+
+        seconds = time.monotonic() - start
+        self.counters['batches'] += 1
+        self.counters['busy_seconds'] += seconds
+        self.counters['last_batch'] = {
+            'class': class_name, 'files': processed, 'seconds': round(seconds, 3),
+            'files_per_second': round(processed / seconds, 2) if seconds > 0 else None,
+            'finished': datetime.now().isoformat()
+        }
+        self.recent.append((time.monotonic(), processed))
+        return processed
+
+    def status(self):
+        """Counters plus the current backlog and recent throughput"""
+        now = time.monotonic()
+        while self.recent and now - self.recent[0][0] > self.throughput_window:
+            self.recent.popleft()
+        backlog = {}
+        for path in self.pending:
+            class_name = Path(path).parent.name
+            backlog[class_name] = backlog.get(class_name, 0) + 1
+        status = dict(self.counters)
+        status.update(
+            backlog=sum(backlog.values()),
+            backlog_per_class=backlog,
+            recent_files_per_minute=round(sum(count for _, count in self.recent) * 60 / self.throughput_window, 2),
+        )
+        return status
+
+    def write_status(self):
+        """Atomically write the status file"""
+        self.counters['updated'] = datetime.now().isoformat()
+        self.status_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.status_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.status(), f, indent=2)
+        os.replace(tmp_path, self.status_path)
+
+    def run_once(self):
+        """One scan + ingest cycle; returns the number of images processed"""
+        processed = 0
+        for class_name, paths in self.scan().items():
+            if self._stop:
+                break
+            processed += self.ingest_batch(class_name, paths[:self.max_batch])
+        self.counters['cycles'] += 1
+        self.write_status()
+        return processed
+
+    def stop(self, *args):
+        self._stop = True
+
+    def run(self, until_empty=False):
+        """
+        Poll until stopped (Ctrl-C or SIGTERM finish the current batch first).
+        With until_empty, return once the inboxes have been drained.
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        print(f"👀 Watching {self.inbox_dir}/<class> for new images "
+              f"(poll {self.poll_interval}s, debounce {self.debounce_seconds}s)")
+        try:
+            while not self._stop:
+                processed = self.run_once()
+                if processed:
+                    status = self.status()
+                    print(f"📥 {datetime.now():%H:%M:%S} +{processed} files | ingested {status['ingested']} | "
+                          f"duplicates {status['duplicates']} | rejected {status['rejected']} | "
+                          f"backlog {status['backlog']} | {status['recent_files_per_minute']} files/min")
+                if until_empty and not self.pending:
+                    break
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            print("\n⏹️  Stopping watcher")
+        self.write_status()
+        return self.status()
+
+
+def print_status(status_path=None):
+    """Show the counters last written by a running (or finished) watcher"""
+    status_path = Path(status_path or INGEST_WATCH_STATUS_PATH)
+    if not status_path.exists():
+        print(f"❌ No watcher status at {status_path}")
+        return None
+    with open(status_path, 'r') as f:
+        status = json.load(f)
+    print("📊 Inbox Watcher Status")
+    print("=" * 50)
+    for key in ('started', 'updated', 'backlog', 'ingested', 'duplicates', 'rejected', 'errors', 'batches',
+                'recent_files_per_minute'):
+        print(f"{key:25} {status.get(key)}")
+    for class_name, count in sorted(status.get('backlog_per_class', {}).items()):
+        print(f"  waiting in {class_name:15} {count}")
+    if status.get('last_error'):
+        print(f"⚠️  Last error: {status['last_error']}")
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Continuously ingest images dropped into per-class inboxes')
+    parser.add_argument('--inbox', default=None, help='Inbox root with one folder per class (default: INBOX_DIR)')
+    parser.add_argument('--once', action='store_true', help='Drain the inboxes and exit')
+    parser.add_argument('--keep-format', action='store_true',
+                        help='Keep BMP/TIFF/WebP files as-is instead of transcoding them to JPEG')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes per batch (default: PREPROCESSING_CONFIG)')
+    parser.add_argument('--status', action='store_true', help='Print the last written counters and exit')
+    args = parser.parse_args()
+
+    if args.status:
+        print_status()
+        return
+    watcher = InboxWatcher(args.inbox, keep_format=args.keep_format, num_workers=args.workers)
+    watcher.run(until_empty=args.once)
+
+
+if __name__ == "__main__":
+    main()
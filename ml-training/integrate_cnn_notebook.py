@@ -13,10 +13,13 @@ from sklearn.preprocessing import LabelBinarizer
 from sklearn.model_selection import train_test_split
 import matplotlib.pyplot as plt
 import json
+from tensorflow.keras.preprocessing.image import img_to_array
 
 # Import our existing modules
 from config import *
 from data_preprocessing import GingerDataPreprocessor
+from image_loading import imread_reduced
+from image_pyramid import resolve_image_path
 
 class CNNNotebookIntegrator:
     def __init__(self):
@@ -32,7 +35,7 @@ class CNNNotebookIntegrator:
             target_size = self.target_size
             
         try:
-            image = cv2.imread(image_dir)
+            image = imread_reduced(resolve_image_path(image_dir, target_size), target_size)
             if image is not None:
                 image = cv2.resize(image, target_size)
                 return img_to_array(image)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+"""
+Learning-rate schedules and the learning-rate range test
+With TRAINING_CONFIG['lr_schedule'] = 'constant', the trainers run up to
+TRAINING_CONFIG['epochs'] at a fixed Adam learning rate and leave the rest
+to ReduceLROnPlateau. The scheduled options run a fixed budget of
+schedule_epochs instead:
+
+    'one_cycle'      linear warmup from max_learning_rate / div_factor to
+                     max_learning_rate, then cosine annealing far below the
+                     start (Smith, super-convergence)
+    'cosine_warmup'  linear warmup from min_lr, then cosine decay to min_lr
+
+The range test picks max_learning_rate: it trains a fresh model for a hundred
+or so batches while raising the learning rate exponentially and records
+the loss per batch. The loss falls, flattens and then diverges; the
+learning rate where it falls fastest, before its minimum, is a good
+one-cycle maximum.
+
+    python lr_schedule.py                 # range test of the CNN trainer
+    python lr_schedule.py --trainer transfer --steps 200
+"""
+
+import json
+import math
+import argparse
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from config import TRAINING_CONFIG, LOGS_DIR, PROCESSED_DATASET_PATH
+
+SCHEDULES = ('constant', 'one_cycle', 'cosine_warmup')
+
+
+@keras.utils.register_keras_serializable(package='ginger')
+class OneCycleSchedule(keras.optimizers.schedules.LearningRateSchedule):
+    """One cycle over total_steps; stays at the final learning rate afterwards"""
+
+    def __init__(self, max_learning_rate, total_steps, warmup_fraction=0.3, div_factor=25.0,
+                 final_div_factor=1e4):
+        self.max_learning_rate = max_learning_rate
+        self.total_steps = total_steps
+        self.warmup_fraction = warmup_fraction
+        self.div_factor = div_factor
+        self.final_div_factor = final_div_factor
+
+    def __call__(self, step):
+        step = tf.cast(step, tf.float32)
+        peak = tf.constant(self.max_learning_rate, tf.float32)
+        start = peak / self.div_factor
+        end = start / self.final_div_factor
+        warmup_steps = max(1.0, float(self.total_steps) * self.warmup_fraction)
+        decay_steps = max(1.0, float(self.total_steps) - warmup_steps)
+
+        warmup = start + (peak - start) * tf.minimum(step / warmup_steps, 1.0)
+        progress = tf.clip_by_value((step - warmup_steps) / decay_steps, 0.0, 1.0)
+        annealing = end + (peak - end) * 0.5 * (1.0 + tf.cos(math.pi * progress))
+        return tf.where(step < warmup_steps, warmup, annealing)
+
+    def get_config(self):
+        return {
+            'max_learning_rate': self.max_learning_rate,
+            'total_steps': self.total_steps,
+            'warmup_fraction': self.warmup_fraction,
+            'div_factor': self.div_factor,
+            'final_div_factor': self.final_div_factor,
+        }
+
+
+def uses_schedule():
+    """Whether the configured learning rate follows a fixed-length schedule"""
+    schedule = TRAINING_CONFIG['lr_schedule']
+    if schedule not in SCHEDULES:
+        raise ValueError(f"Unknown lr_schedule '{schedule}', expected one of {SCHEDULES}")
+    return schedule != 'constant'
+
+
+def training_epochs():
+    """Epochs to pass to fit(): the schedule length, or the plain epoch budget"""
+    return TRAINING_CONFIG['schedule_epochs'] if uses_schedule() else TRAINING_CONFIG['epochs']
+
+
+def peak_learning_rate(scale=1.0):
+    """Maximum (or constant) learning rate of the configured schedule"""
+    if uses_schedule() and TRAINING_CONFIG['max_learning_rate'] is not None:
+        return TRAINING_CONFIG['max_learning_rate'] * scale
+    return TRAINING_CONFIG['learning_rate'] * scale
+
+
+def learning_rate_for(steps_per_epoch=None, epochs=None, scale=1.0):
+    """
+    The learning_rate argument for the optimizer: a float for 'constant',
+    otherwise a schedule over epochs (default schedule_epochs) of
+    steps_per_epoch batches. scale multiplies every learning rate (e.g.
+    0.1 for fine-tuning).
+    """
+    peak = peak_learning_rate(scale)
+    if not uses_schedule():
+        return peak
+    if not steps_per_epoch:
+        raise ValueError(f"lr_schedule '{TRAINING_CONFIG['lr_schedule']}' needs steps_per_epoch")
+    total_steps = int(steps_per_epoch) * (epochs or TRAINING_CONFIG['schedule_epochs'])
+
+    if TRAINING_CONFIG['lr_schedule'] == 'one_cycle':
+        return OneCycleSchedule(
+            peak, total_steps,
+            warmup_fraction=TRAINING_CONFIG['one_cycle_warmup'],
+            div_factor=TRAINING_CONFIG['one_cycle_div_factor'],
+            final_div_factor=TRAINING_CONFIG['one_cycle_final_div_factor'],
+        )
+    floor = min(TRAINING_CONFIG['min_lr'] * scale, peak)
+    warmup_steps = min(int(steps_per_epoch) * TRAINING_CONFIG['warmup_epochs'], total_steps - 1)
+    return keras.optimizers.schedules.CosineDecay(
+        initial_learning_rate=floor,
+        decay_steps=total_steps - warmup_steps,
+        alpha=floor / peak,
+        warmup_target=peak,
+        warmup_steps=warmup_steps,
+    )
+
+
+def describe_learning_rate(scale=1.0):
+    """One line for the training configuration printout"""
+    if not uses_schedule():
+        return f"{peak_learning_rate(scale)}"
+    return (f"{TRAINING_CONFIG['lr_schedule']} over {TRAINING_CONFIG['schedule_epochs']} epochs, "
+            f"peak {peak_learning_rate(scale)}")
+
+
+def _cycle_batches(data):
+    """Endless (x, y) batches from a Sequence or a tf.data.Dataset"""
+    if isinstance(data, tf.data.Dataset):
+        for batch in data.repeat():
+            yield batch[0], batch[1]
+        return
+    while True:
+        for idx in range(len(data)):
+            batch = data[idx]
+            yield batch[0], batch[1]
+
+
+def smoothed_losses(losses, beta=0.98):
+    """Bias-corrected exponential moving average of the per-batch losses"""
+    average, smoothed = 0.0, []
+    for i, loss in enumerate(losses, start=1):
+        average = beta * average + (1 - beta) * loss
+        smoothed.append(average / (1 - beta ** i))
+    return smoothed
+
+
+def lr_range_test(model, train_data, min_lr=1e-7, max_lr=1.0, steps=100, diverge_factor=4.0):
+    """
+    Train model for up to steps batches with an exponentially rising Adam
+    learning rate; stop early once the smoothed loss exceeds diverge_factor
+    times its minimum. The model is recompiled for the sweep (same loss)
+    and its weights are restored afterwards.
+    """
+    initial_weights = model.get_weights()
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=min_lr), loss=model.loss)
+    factor = (max_lr / min_lr) ** (1.0 / max(1, steps - 1))
+
+    learning_rates, losses = [], []
+    best = math.inf
+    batches = _cycle_batches(train_data)
+    for step in range(steps):
+        learning_rate = min_lr * factor ** step
+        model.optimizer.learning_rate.assign(learning_rate)
+        x, y = next(batches)
+        loss = float(model.train_on_batch(x, y, return_dict=True)['loss'])
+        if not math.isfinite(loss):
+            break
+        learning_rates.append(learning_rate)
+        losses.append(loss)
+        smoothed = smoothed_losses(losses)[-1]
+        if smoothed > diverge_factor * best:
+            break
+        best = min(best, smoothed)
+    model.set_weights(initial_weights)
+
+    smoothed = smoothed_losses(losses)
+    minimum = int(np.argmin(smoothed))
+    # Steepest descent of the smoothed loss over log(lr), before the minimum
+    slopes = np.gradient(smoothed[:minimum + 1], np.log(learning_rates[:minimum + 1])) if minimum > 1 else [0.0]
+    return {
+        'learning_rates': learning_rates,
+        'losses': losses,
+        'smoothed_losses': smoothed,
+        'min_loss_lr': learning_rates[minimum],
+        'suggested_max_lr': learning_rates[int(np.argmin(slopes))],
+    }
+
+
+def plot_range_test(result, path):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(8, 5))
+    plt.plot(result['learning_rates'], result['losses'], alpha=0.3, label='Batch loss')
+    plt.plot(result['learning_rates'], result['smoothed_losses'], label='Smoothed loss')
+    plt.axvline(result['suggested_max_lr'], color='green', linestyle='--', label='Suggested max LR')
+    plt.xscale('log')
+    plt.xlabel('Learning rate')
+    plt.ylabel('Loss')
+    plt.title('Learning-Rate Range Test')
+    plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    plt.close()
+
+
+def _range_test_setup(trainer_name):
+    """(model, training data) of one of the trainers, built from TRAINING_CONFIG"""
+    if trainer_name == 'transfer':
+        from model_training import GingerDiseaseModel
+
+        trainer = GingerDiseaseModel()
+        train_gen, _ = trainer.create_data_generators(PROCESSED_DATASET_PATH)
+        return trainer.build_model('EfficientNetB0', steps_per_epoch=len(train_gen)), train_gen
+
+    from cnn_model_training import CNNGingerDiseaseModel
+
+    trainer = CNNGingerDiseaseModel()
+    train_gen, _, _ = trainer.create_data_generators(
+        PROCESSED_DATASET_PATH / 'train', PROCESSED_DATASET_PATH / 'validation', PROCESSED_DATASET_PATH / 'test'
+    )
+    if trainer_name == 'hybrid':
+        model, _ = trainer.create_hybrid_cnn_model()
+    else:
+        model = trainer.create_cnn_model()
+    return trainer.compile_model(model, steps_per_epoch=len(train_gen)), train_gen
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Learning-rate range test for the training pipelines')
+    parser.add_argument('--trainer', choices=['cnn', 'hybrid', 'transfer'], default='cnn',
+                        help='cnn/hybrid: cnn_model_training.py, transfer: model_training.py')
+    parser.add_argument('--min-lr', type=float, default=1e-7)
+    parser.add_argument('--max-lr', type=float, default=1.0)
+    parser.add_argument('--steps', type=int, default=100, help='Batches in the sweep')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    keras.utils.set_random_seed(args.seed)
+    model, train_gen = _range_test_setup(args.trainer)
+    print(f"🔎 LR range test ({args.trainer}): {args.min_lr:g} -> {args.max_lr:g} over up to {args.steps} batches")
+    result = lr_range_test(model, train_gen, args.min_lr, args.max_lr, args.steps)
+
+    result_path = LOGS_DIR / f'lr_range_test_{args.trainer}.json'
+    with open(result_path, 'w') as f:
+        json.dump({'trainer': args.trainer, **result}, f, indent=2)
+    plot_range_test(result, LOGS_DIR / f'lr_range_test_{args.trainer}.png')
+
+    print(f"📉 Lowest loss at lr={result['min_loss_lr']:.2e} ({len(result['losses'])} batches)")
+    print(f"✅ Suggested max_learning_rate: {result['suggested_max_lr']:.2e}")
+    print(f"📁 Results saved to {result_path}")
+    print("\n🔄 To use it, set in config.py TRAINING_CONFIG:")
+    print(f"    'lr_schedule': 'one_cycle',")
+    print(f"    'max_learning_rate': {result['suggested_max_lr']:.2e},")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,10 @@ import cv2
 from tqdm import tqdm
 
 from config import *
+from tensor_cache import TensorCache, TensorCacheSequence
+from tf_data_pipeline import create_dataset
+from shard_records import ShardedSplitReader, ShardSequence, shard_dir_for
+from image_pyramid import flow_from_pyramid
 
 class ModelEvaluator:
     def __init__(self):
@@ -38,7 +42,23 @@ class ModelEvaluator:
         
         test_datagen = ImageDataGenerator(rescale=1./255)
         
-        test_generator = test_datagen.flow_from_directory(
+        if TRAINING_CONFIG['data_backend'] == 'memmap':
+            return TensorCacheSequence(
+                TensorCache.build(test_data_dir, classes=self.class_names),
+                class_mode='sparse', shuffle=False, datagen=test_datagen
+            )
+        
+        if TRAINING_CONFIG['data_backend'] == 'tf_data':
+            return create_dataset(test_data_dir, classes=self.class_names, class_mode='sparse', shuffle=False)
+        
+        if TRAINING_CONFIG['data_backend'] == 'shards':
+            return ShardSequence(
+                ShardedSplitReader(shard_dir_for(test_data_dir)),
+                class_mode='sparse', shuffle=False, datagen=test_datagen, classes=self.class_names
+            )
+        
+        test_generator = flow_from_pyramid(
+            test_datagen,
             test_data_dir,
             target_size=(TRAINING_CONFIG['img_height'], TRAINING_CONFIG['img_width']),
             batch_size=TRAINING_CONFIG['batch_size'],
@@ -12,10 +12,12 @@ import hashlib
 from datetime import datetime
 
 from config import *
+from dataset_stats import normalization_stats
 
 class ModelExporter:
     def __init__(self):
         self.model = None
+        self._normalization = None
         
     def load_trained_model(self, model_path=None):
         """Load the trained Keras model"""
@@ -31,6 +33,15 @@ class ModelExporter:
         print("✅ Model loaded successfully!")
         return self.model
     
+    def normalization(self):
+        """
+        (mean, std, source) of the channel normalization DataPreprocessor
+        applies, so exported instructions match training. Resolved once.
+        """
+        if self._normalization is None:
+            self._normalization = normalization_stats(PROCESSED_DATASET_PATH)
+        return self._normalization
+    
     def optimize_model_for_mobile(self):
         """Apply optimizations for mobile deployment"""
         print("⚡ Optimizing model for mobile...")
@@ -129,9 +140,16 @@ class ModelExporter:
             input_shape = [TRAINING_CONFIG['img_height'], TRAINING_CONFIG['img_width'], 3]
             output_shape = [NUM_CLASSES]
         
+        # Channel statistics the preprocessing pipeline normalizes with
+        mean, std, source = self.normalization()
+        
         # Create comprehensive metadata
         metadata = {
             **EXPORT_CONFIG['metadata'],
+            'preprocessing': {
+                **EXPORT_CONFIG['metadata']['preprocessing'],
+                'channel_normalization': {'source': source, 'mean': mean, 'std': std}
+            },
             'export_info': {
                 'export_date': datetime.now().isoformat(),
                 'tensorflow_version': tf.__version__,
@@ -162,7 +180,7 @@ class ModelExporter:
                 'preprocessing': [
                     "Resize image to 224x224 pixels",
                     "Normalize pixel values to [0, 1] range",
-                    "Apply ImageNet normalization: mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]"
+                    f"Apply {source} channel normalization: mean={mean}, std={std}"
                 ],
                 'postprocessing': [
                     "Apply softmax to get probabilities",
@@ -221,9 +239,9 @@ class GingerDiseaseDetector {
       // Normalize to [0, 1]
       tensor = tensor.div(255.0);
       
-      // Apply ImageNet normalization
-      const mean = tf.tensor([0.485, 0.456, 0.406]);
-      const std = tf.tensor([0.229, 0.224, 0.225]);
+      // Apply __SOURCE__ channel normalization (same statistics as training)
+      const mean = tf.tensor(__MEAN__);
+      const std = tf.tensor(__STD__);
       tensor = tensor.sub(mean).div(std);
       
       // Add batch dimension
@@ -284,6 +302,11 @@ class GingerDiseaseDetector {
 // console.log('Detected:', result.topPrediction, 'Confidence:', result.confidence);
 '''
         
+        mean, std, source = self.normalization()
+        sample_code = (sample_code.replace('__SOURCE__', source)
+                       .replace('__MEAN__', json.dumps([round(x, 4) for x in mean]))
+                       .replace('__STD__', json.dumps([round(x, 4) for x in std])))
+        
         sample_path = Path(export_path) / 'sample_usage.js'
         with open(sample_path, 'w') as f:
             f.write(sample_code)
@@ -3,6 +3,7 @@ Model training pipeline for Ginger Disease Detection
 """
 import os
 import json
+import argparse
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
@@ -15,6 +16,14 @@ from datetime import datetime
 import pandas as pd
 
 from config import *
+from tensor_cache import TensorCache, TensorCacheSequence
+from tf_data_pipeline import create_dataset
+from shard_records import ShardedSplitReader, ShardSequence, shard_dir_for
+from image_pyramid import flow_from_pyramid
+from synthetic_source import mix_synthetic, synthetic_split
+from training_state import TrainingState
+from checkpoint_writer import AsyncModelCheckpoint
+from lr_schedule import learning_rate_for, training_epochs, uses_schedule, describe_learning_rate
 
 class GingerDiseaseModel:
     def __init__(self):
@@ -57,8 +66,8 @@ class GingerDiseaseModel:
         
         return base_model
     
-    def build_model(self, base_model_name='EfficientNetB0'):
-        """Build complete model architecture"""
+    def build_model(self, base_model_name='EfficientNetB0', steps_per_epoch=None):
+        """Build complete model architecture (steps_per_epoch: length of an epoch for lr_schedule)"""
         print("🔨 Building model architecture...")
         
         base_model = self.create_base_model(base_model_name)
@@ -110,7 +119,7 @@ class GingerDiseaseModel:
         # Compile model
         self.model.compile(
             optimizer=optimizers.Adam(
-                learning_rate=TRAINING_CONFIG['learning_rate']
+                learning_rate=learning_rate_for(steps_per_epoch)
             ),
             loss='sparse_categorical_crossentropy',
             metrics=['accuracy', 'top_3_accuracy']
@@ -123,6 +132,11 @@ class GingerDiseaseModel:
         """Create data generators for training"""
         print("📊 Creating data generators...")
         
+        if TRAINING_CONFIG['synthetic_ratio'] >= 1.0:
+            # Pretraining on rendered images only: nothing is read from disk
+            return (synthetic_split('train', self.class_names, 'sparse'),
+                    synthetic_split('validation', self.class_names, 'sparse'))
+        
         # Training data generator with augmentation
         train_datagen = ImageDataGenerator(
             rescale=1./255,
@@ -140,8 +154,43 @@ class GingerDiseaseModel:
         # Validation data generator (no augmentation)
         val_datagen = ImageDataGenerator(rescale=1./255)
         
-        # Create generators
-        train_generator = train_datagen.flow_from_directory(
+        if TRAINING_CONFIG['data_backend'] == 'memmap':
+            # Decode once into uint8 memmaps, then augment from the cache
+            train_generator = TensorCacheSequence(
+                TensorCache.build(data_dir / 'train', classes=self.class_names),
+                class_mode='sparse', shuffle=True, datagen=train_datagen
+            )
+            validation_generator = TensorCacheSequence(
+                TensorCache.build(data_dir / 'validation', classes=self.class_names),
+                class_mode='sparse', shuffle=False, datagen=val_datagen
+            )
+            return mix_synthetic(train_generator, 'sparse'), validation_generator
+        
+        if TRAINING_CONFIG['data_backend'] == 'tf_data':
+            # Parallel decode, optional cache, batched augmentation and prefetch
+            train_generator = create_dataset(
+                data_dir / 'train', classes=self.class_names, class_mode='sparse', shuffle=True, augment=True
+            )
+            validation_generator = create_dataset(
+                data_dir / 'validation', classes=self.class_names, class_mode='sparse', shuffle=False
+            )
+            return mix_synthetic(train_generator, 'sparse'), validation_generator
+        
+        if TRAINING_CONFIG['data_backend'] == 'shards':
+            # Sequential reads from the sharded records written by data_preprocessing.py --shards
+            train_generator = ShardSequence(
+                ShardedSplitReader(shard_dir_for(data_dir / 'train')), class_mode='sparse', shuffle=True,
+                datagen=train_datagen, classes=self.class_names
+            )
+            validation_generator = ShardSequence(
+                ShardedSplitReader(shard_dir_for(data_dir / 'validation')), class_mode='sparse', shuffle=False,
+                datagen=val_datagen, classes=self.class_names
+            )
+            return mix_synthetic(train_generator, 'sparse'), validation_generator
+        
+        # Create generators (reading the smallest cached downscaled copies instead of the originals)
+        train_generator = flow_from_pyramid(
+            train_datagen,
             data_dir / 'train',
             target_size=(self.img_height, self.img_width),
             batch_size=TRAINING_CONFIG['batch_size'],
@@ -150,7 +199,8 @@ class GingerDiseaseModel:
             shuffle=True
         )
         
-        validation_generator = val_datagen.flow_from_directory(
+        validation_generator = flow_from_pyramid(
+            val_datagen,
             data_dir / 'validation',
             target_size=(self.img_height, self.img_width),
             batch_size=TRAINING_CONFIG['batch_size'],
@@ -159,7 +209,7 @@ class GingerDiseaseModel:
             shuffle=False
         )
         
-        return train_generator, validation_generator
+        return mix_synthetic(train_generator, 'sparse'), validation_generator
     
     def create_callbacks(self):
         """Create training callbacks"""
@@ -177,21 +227,11 @@ class GingerDiseaseModel:
                 verbose=1
             ),
             
-            # Reduce learning rate
-            callbacks.ReduceLROnPlateau(
-                monitor='val_loss',
-                factor=TRAINING_CONFIG['reduce_lr_factor'],
-                patience=TRAINING_CONFIG['reduce_lr_patience'],
-                min_lr=TRAINING_CONFIG['min_lr'],
-                verbose=1
-            ),
-            
-            # Model checkpointing
-            callbacks.ModelCheckpoint(
+            # Model checkpointing (written by a background thread)
+            AsyncModelCheckpoint(
                 filepath=MODELS_DIR / f'best_model_{timestamp}.h5',
                 monitor='val_accuracy',
-                save_best_only=True,
-                save_weights_only=False,
+                mode='max',
                 verbose=1
             ),
             
@@ -209,38 +249,53 @@ class GingerDiseaseModel:
             )
         ]
         
+        if not uses_schedule():
+            # Reduce learning rate (a scheduled learning rate is fixed in advance)
+            callbacks_list.insert(1, callbacks.ReduceLROnPlateau(
+                monitor='val_loss',
+                factor=TRAINING_CONFIG['reduce_lr_factor'],
+                patience=TRAINING_CONFIG['reduce_lr_patience'],
+                min_lr=TRAINING_CONFIG['min_lr'],
+                verbose=1
+            ))
+        
         return callbacks_list
     
-    def train_model(self, train_generator, validation_generator, class_weights=None):
-        """Train the model"""
+    def train_model(self, train_generator, validation_generator, class_weights=None, resume=False):
+        """Train the model (resume: continue from the last full-state checkpoint)"""
         print("🚀 Starting model training...")
         
         callbacks_list = self.create_callbacks()
+        training_state = TrainingState('model_training/train', train_generator, callbacks_list, resume)
         
         # Calculate steps
         steps_per_epoch = len(train_generator)
         validation_steps = len(validation_generator)
+        epochs = training_epochs()
         
         print(f"📈 Training steps per epoch: {steps_per_epoch}")
         print(f"📈 Validation steps: {validation_steps}")
+        print(f"📈 Epochs: {epochs}, learning rate: {describe_learning_rate()}")
         
         # Train the model
-        self.history = self.model.fit(
+        history = self.model.fit(
             train_generator,
-            epochs=TRAINING_CONFIG['epochs'],
+            epochs=epochs,
+            initial_epoch=training_state.initial_epoch_for(epochs),
             validation_data=validation_generator,
             steps_per_epoch=steps_per_epoch,
             validation_steps=validation_steps,
-            callbacks=callbacks_list,
+            callbacks=callbacks_list + [training_state],
             class_weight=class_weights,
             verbose=1
         )
+        self.history = training_state.merged_history(history)
         
         print("✅ Training completed!")
         return self.history
     
-    def fine_tune_model(self, train_generator, validation_generator, class_weights=None):
-        """Fine-tune the model with unfrozen layers"""
+    def fine_tune_model(self, train_generator, validation_generator, class_weights=None, resume=False):
+        """Fine-tune the model with unfrozen layers (resume: continue from the last full-state checkpoint)"""
         print("🔧 Starting fine-tuning...")
         
         # Unfreeze the base model
@@ -251,9 +306,11 @@ class GingerDiseaseModel:
         for layer in self.model.layers[4].layers[:fine_tune_at]:
             layer.trainable = False
         
-        # Recompile with lower learning rate
+        # Recompile with lower learning rate (a schedule runs a second cycle at a tenth of the peak)
+        fine_tune_epochs = training_epochs() if uses_schedule() else 20
+        learning_rate = learning_rate_for(len(train_generator), fine_tune_epochs, scale=0.1)
         self.model.compile(
-            optimizer=optimizers.Adam(learning_rate=TRAINING_CONFIG['learning_rate'] / 10),
+            optimizer=optimizers.Adam(learning_rate=learning_rate),
             loss='sparse_categorical_crossentropy',
             metrics=['accuracy', 'top_3_accuracy']
         )
@@ -266,25 +323,27 @@ class GingerDiseaseModel:
                 patience=5,
                 restore_best_weights=True
             ),
-            callbacks.ModelCheckpoint(
+            AsyncModelCheckpoint(
                 filepath=MODELS_DIR / f'fine_tuned_model_{timestamp}.h5',
                 monitor='val_accuracy',
-                save_best_only=True
+                mode='max'
             )
         ]
         
+        training_state = TrainingState('model_training/fine_tune', train_generator, fine_tune_callbacks, resume)
+        
         # Fine-tune training
-        fine_tune_epochs = 20
         history_fine = self.model.fit(
             train_generator,
             epochs=fine_tune_epochs,
+            initial_epoch=training_state.initial_epoch_for(fine_tune_epochs),
             validation_data=validation_generator,
-            callbacks=fine_tune_callbacks,
+            callbacks=fine_tune_callbacks + [training_state],
             class_weight=class_weights,
             verbose=1
         )
         
-        return history_fine
+        return training_state.merged_history(history_fine)
     
     def evaluate_model(self, test_generator):
         """Evaluate model performance"""
@@ -377,18 +436,28 @@ class GingerDiseaseModel:
 
 def main():
     """Main training pipeline"""
+    parser = argparse.ArgumentParser(description='Train the Ginger Disease Detection model')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue from the last full-state checkpoint in TRAINING_STATE_DIR')
+    args = parser.parse_args()
+    
     print("🚀 Starting Ginger Disease Detection Model Training")
     
     # Check if processed data exists
-    if not (PROCESSED_DATA_DIR / 'splits').exists():
+    if TRAINING_CONFIG['synthetic_ratio'] < 1.0 and not (PROCESSED_DATA_DIR / 'splits').exists():
         print("❌ Processed data not found. Please run data_preprocessing.py first")
         return
     
     # Initialize model
     model_trainer = GingerDiseaseModel()
     
-    # Build model
-    model = model_trainer.build_model('EfficientNetB0')
+    # Create data generators (assuming organized directory structure)
+    # You'll need to organize your data into train/validation/test folders
+    data_dir = PROCESSED_DATASET_PATH
+    train_gen, val_gen = model_trainer.create_data_generators(data_dir)
+    
+    # Build model (a learning-rate schedule is laid out over the epoch length)
+    model = model_trainer.build_model('EfficientNetB0', steps_per_epoch=len(train_gen))
     model.summary()
     
     # Load class weights
@@ -400,16 +469,11 @@ def main():
         print("⚠️  Class weights not found, using balanced weights")
         class_weights = None
     
-    # Create data generators (assuming organized directory structure)
-    # You'll need to organize your data into train/validation/test folders
-    data_dir = PROCESSED_DATASET_PATH
-    train_gen, val_gen = model_trainer.create_data_generators(data_dir)
-    
     # Train model
-    history = model_trainer.train_model(train_gen, val_gen, class_weights)
+    history = model_trainer.train_model(train_gen, val_gen, class_weights, resume=args.resume)
     
     # Fine-tune model
-    history_fine = model_trainer.fine_tune_model(train_gen, val_gen, class_weights)
+    history_fine = model_trainer.fine_tune_model(train_gen, val_gen, class_weights, resume=args.resume)
     
     # Plot training history
     model_trainer.plot_training_history()
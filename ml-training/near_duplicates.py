@@ -0,0 +1,174 @@
+"""
+Perceptual-hash near-duplicate index for Ginger Disease Detection datasets
+Burst shots and resized re-uploads of the same leaf hash to nearby 64-bit
+values; a BK-tree over Hamming distance finds them in sub-linear time.
+"""
+from collections import defaultdict
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+from config import PREPROCESSING_CONFIG
+from parallel_utils import run_parallel
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(image, hash_size=8):
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 thumbnail"""
+    gray = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image, hash_size=8, highfreq_factor=4):
+    """64-bit perceptual hash: low-frequency DCT coefficients above their median"""
+    import cv2
+    size = hash_size * highfreq_factor
+    gray = image.convert('L').resize((size, size), Image.LANCZOS)
+    dct = cv2.dct(np.asarray(gray, dtype=np.float32))[:hash_size, :hash_size]
+    return _bits_to_int(dct > np.median(dct))
+
+
+HASH_FUNCTIONS = {'dhash': dhash, 'phash': phash}
+
+
+def hash_image(img_path, method='dhash'):
+    """Perceptual hash of an image file, or None if it cannot be decoded"""
+    try:
+        with Image.open(img_path) as img:
+            # Hashes only need a tiny thumbnail; let the JPEG decoder downscale
+            img.draft('L', (64, 64))
+            return HASH_FUNCTIONS[method](img)
+    except Exception:
+        return None
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance"""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, hash_value, item):
+        node = [hash_value, [item], {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming_distance(hash_value, current[0])
+            if distance == 0:
+                current[1].append(item)
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def query(self, hash_value, max_distance):
+        """All (distance, item) pairs within max_distance of hash_value"""
+        results = []
+        if self.root is None:
+            return results
+        stack = [self.root]
+        while stack:
+            node_hash, items, children = stack.pop()
+            distance = hamming_distance(hash_value, node_hash)
+            if distance <= max_distance:
+                results.extend((distance, item) for item in items)
+            # Triangle inequality: only subtrees in [d - r, d + r] can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return results
+
+
+def compute_hashes(paths, method=None, num_workers=None):
+    """Perceptual hashes for many images in parallel (None for unreadable files)"""
+    method = method or PREPROCESSING_CONFIG['near_duplicate_hash']
+    return run_parallel(partial(hash_image, method=method), paths, num_workers, desc="Hashing")
+
+
+def find_near_duplicate_groups(paths, max_distance=None, method=None, num_workers=None, hashes=None):
+    """
+    Group images whose perceptual hashes are within max_distance bits.
+    Returns a list of group ids aligned with paths; an image with no
+    near-duplicate gets its own group. Group ids are the hex hash of the
+    group's first member in sorted path order, so they are stable.
+    Precomputed hashes (aligned with paths) skip the hashing pass.
+    """
+    if max_distance is None:
+        max_distance = PREPROCESSING_CONFIG['near_duplicate_distance']
+    paths = [str(path) for path in paths]
+    if hashes is None:
+        hashes = compute_hashes(paths, method, num_workers)
+
+    # Union-find over indices
+    parent = list(range(len(paths)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    tree = BKTree()
+    for idx, hash_value in enumerate(hashes):
+        if hash_value is None:
+            continue
+        for _, other in tree.query(hash_value, max_distance):
+            root_a, root_b = find(idx), find(other)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+        tree.add(hash_value, idx)
+
+    members = defaultdict(list)
+    for idx in range(len(paths)):
+        members[find(idx)].append(idx)
+
+    group_ids = [None] * len(paths)
+    for indices in members.values():
+        first = min(indices, key=lambda i: paths[i])
+        if hashes[first] is None:
+            group_id = f"unhashed:{paths[first]}"
+        else:
+            group_id = f"{hashes[first]:016x}"
+        for idx in indices:
+            group_ids[idx] = group_id
+    return group_ids
+
+
+def summarize_clusters(paths, labels, group_ids, class_names):
+    """Describe groups with more than one member, largest first"""
+    members = defaultdict(list)
+    for path, label, group_id in zip(paths, labels, group_ids):
+        members[group_id].append((str(path), class_names[label]))
+
+    clusters = []
+    for group_id, items in members.items():
+        if len(items) < 2:
+            continue
+        classes = sorted({class_name for _, class_name in items})
+        clusters.append({
+            'group_id': group_id,
+            'size': len(items),
+            'classes': classes,
+            'cross_class': len(classes) > 1,
+            'files': sorted(path for path, _ in items)
+        })
+    clusters.sort(key=lambda c: (-c['size'], c['group_id']))
+    return clusters
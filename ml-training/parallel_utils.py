@@ -0,0 +1,76 @@
+"""
+Parallel execution helpers for the Ginger Disease Detection data pipeline
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from tqdm import tqdm
+
+from config import PREPROCESSING_CONFIG
+
+
+def resolve_num_workers(num_workers=None):
+    """Resolve the worker count, falling back to PREPROCESSING_CONFIG"""
+    if num_workers is None:
+        num_workers = PREPROCESSING_CONFIG['num_workers']
+    if not num_workers or num_workers < 1:
+        num_workers = os.cpu_count() or 1
+    return int(num_workers)
+
+
+def run_parallel(func, items, num_workers=None, chunksize=None, desc=None):
+    """
+    Apply func to every item across a process pool.
+    Results are returned in input order so callers can aggregate deterministically.
+    func must be a picklable module-level function.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    num_workers = min(resolve_num_workers(num_workers), len(items))
+    if chunksize is None:
+        chunksize = PREPROCESSING_CONFIG['chunksize']
+    # Keep every worker busy even on small inputs
+    chunksize = max(1, min(chunksize, len(items) // (num_workers * 4) or 1))
+
+    if num_workers == 1:
+        results = map(func, items)
+        return list(tqdm(results, total=len(items), desc=desc, disable=desc is None))
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        results = executor.map(func, items, chunksize=chunksize)
+        return list(tqdm(results, total=len(items), desc=desc, disable=desc is None))
+
+
+def run_parallel_stream(func, items, num_workers=None, max_pending=None, desc=None, mp_context=None):
+    """
+    Like run_parallel, but items are consumed lazily and results are yielded
+    in input order as they complete. At most max_pending tasks are in flight,
+    so producing items (e.g. reading an archive) overlaps with the work on
+    earlier ones without buffering the whole input. mp_context (e.g.
+    multiprocessing.get_context('spawn')) is passed to the process pool.
+    """
+    num_workers = resolve_num_workers(num_workers)
+    max_pending = max_pending or num_workers * 4
+    progress = tqdm(desc=desc, disable=desc is None)
+    try:
+        if num_workers == 1:
+            for item in items:
+                yield func(item)
+                progress.update()
+            return
+
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=mp_context) as executor:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+                    progress.update()
+            while pending:
+                yield pending.popleft().result()
+                progress.update()
+    finally:
+        progress.close()
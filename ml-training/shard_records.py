@@ -0,0 +1,279 @@
+"""
+Sharded binary record format for preprocessed Ginger Disease Detection splits
+Each split is written as a few large shard files of back-to-back encoded
+images plus an index (shard, offset, length, label) for random access, so
+training can stream with large sequential reads instead of opening
+thousands of small JPEGs.
+
+Layout of a split directory:
+    shards.json                 format metadata and shard file names
+    index.npy                   structured array, one row per record
+    shard-00000-of-00004.bin    concatenated encoded image bytes
+
+The 'shards' data_backend trains and evaluates from these records through
+ShardSequence; records are resized to the training resolution on decode
+when they were stored at another size.
+"""
+import io
+import os
+import json
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from tensorflow import keras
+
+from config import TRAINING_CONFIG, DISEASE_CLASSES, PROCESSED_DATA_DIR
+from parallel_utils import run_parallel
+
+FORMAT_VERSION = 1
+
+INDEX_DTYPE = np.dtype([
+    ('shard', np.uint32),
+    ('offset', np.uint64),
+    ('length', np.uint32),
+    ('label', np.int32),
+])
+
+
+def encode_record(img_path, resize_to=None, quality=95):
+    """
+    Bytes stored for one image: the original file, or a JPEG re-encoded at
+    resize_to (height, width) when pre-resizing is requested.
+    """
+    if resize_to is None:
+        with open(img_path, 'rb') as f:
+            return f.read()
+    with Image.open(img_path) as img:
+        img.draft('RGB', (resize_to[1], resize_to[0]))
+        img = img.convert('RGB').resize((resize_to[1], resize_to[0]), Image.BILINEAR)
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=quality)
+        return buffer.getvalue()
+
+
+def decode_record(data, target_size=None):
+    """Decode record bytes to an RGB uint8 array, resized to target_size (height, width) if given"""
+    with Image.open(io.BytesIO(data)) as img:
+        if target_size is not None and img.size != (target_size[1], target_size[0]):
+            img.draft('RGB', (target_size[1], target_size[0]))
+            img = img.convert('RGB').resize((target_size[1], target_size[0]), Image.BILINEAR)
+        return np.asarray(img.convert('RGB'))
+
+
+def shard_dir_for(split_dir):
+    """Shards written by data_preprocessing.py for the split named like split_dir (train/validation/test)"""
+    return PROCESSED_DATA_DIR / 'splits' / Path(split_dir).name / 'shards'
+
+
+def write_shards(images, labels, output_dir, target_shard_mb=256, resize_to=None, quality=95,
+                 num_workers=None, seed=42, chunk_size=4096, class_names=None):
+    """
+    Write one split as sharded records.
+    Records are shuffled once with a fixed seed and dealt to shards so that
+    every shard holds a similar number of bytes and a similar class mix.
+    class_names are the names of the label indices (default: DISEASE_CLASSES).
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for old_shard in output_dir.glob('shard-*.bin'):
+        old_shard.unlink()
+
+    images = [str(path) for path in images]
+    labels = np.asarray(labels, dtype=np.int32)
+    order = np.random.default_rng(seed).permutation(len(images))
+
+    encode = partial(encode_record, resize_to=resize_to, quality=quality)
+    chunks = [order[start:start + chunk_size] for start in range(0, len(order), chunk_size)]
+
+    # Size the shard count from the first encoded chunk so memory stays bounded
+    payloads = run_parallel(encode, [images[i] for i in chunks[0]], num_workers, desc="Encoding") if chunks else []
+    average_bytes = np.mean([len(payload) for payload in payloads]) if payloads else 0
+    estimated_bytes = average_bytes * len(images)
+    num_shards = max(1, min(len(images), int(np.ceil(estimated_bytes / (target_shard_mb * 1024 * 1024)))))
+    shard_names = [f"shard-{i:05d}-of-{num_shards:05d}.bin" for i in range(num_shards)]
+
+    # Greedy balance: each record goes to the currently smallest shard
+    shard_sizes = [0] * num_shards
+    index = np.zeros(len(images), dtype=INDEX_DTYPE)
+    sources = [None] * len(images)
+    handles = [open(output_dir / name, 'wb') for name in shard_names]
+    position = 0
+    try:
+        for chunk_number, chunk in enumerate(chunks):
+            if chunk_number > 0:
+                payloads = run_parallel(encode, [images[i] for i in chunk], num_workers, desc="Encoding")
+            for record_idx, payload in zip(chunk, payloads):
+                shard = int(np.argmin(shard_sizes))
+                index[position] = (shard, shard_sizes[shard], len(payload), labels[record_idx])
+                sources[position] = images[record_idx]
+                handles[shard].write(payload)
+                shard_sizes[shard] += len(payload)
+                position += 1
+    finally:
+        for handle in handles:
+            handle.close()
+
+    # Sort by (shard, offset) so a shard's records are read front to back
+    read_order = np.lexsort((index['offset'], index['shard']))
+    index = index[read_order]
+    np.save(output_dir / 'index.npy', index)
+
+    metadata = {
+        'format_version': FORMAT_VERSION,
+        'num_records': len(images),
+        'shards': shard_names,
+        'shard_bytes': shard_sizes,
+        'encoding': 'jpeg_resized' if resize_to else 'original',
+        'image_size': list(resize_to) if resize_to else None,
+        'class_names': list(class_names or DISEASE_CLASSES),
+        'sources': [sources[i] for i in read_order],  # aligned with index.npy
+    }
+    with open(output_dir / 'shards.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    return metadata
+
+
+class ShardedSplitReader:
+    def __init__(self, split_dir):
+        self.split_dir = Path(split_dir)
+        with open(self.split_dir / 'shards.json', 'r') as f:
+            self.metadata = json.load(f)
+        self.index = np.load(self.split_dir / 'index.npy')
+        self.shard_paths = [self.split_dir / name for name in self.metadata['shards']]
+        self.labels = self.index['label']
+        # Shards written before class names were recorded used the config order
+        self.class_names = self.metadata.get('class_names', DISEASE_CLASSES)
+        self._handles = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def num_shards(self):
+        return len(self.shard_paths)
+
+    def _handle(self, shard):
+        if shard not in self._handles:
+            self._handles[shard] = open(self.shard_paths[shard], 'rb')
+        return self._handles[shard]
+
+    def read(self, i):
+        """Random access: (encoded bytes, label) of record i"""
+        shard, offset, length, label = self.index[i]
+        data = os.pread(self._handle(int(shard)).fileno(), int(length), int(offset))
+        return data, int(label)
+
+    def iter_shard(self, shard, block_size=64 * 1024 * 1024):
+        """Stream (encoded bytes, label) from one shard with large sequential reads"""
+        records = self.index[self.index['shard'] == shard]
+        with open(self.shard_paths[shard], 'rb', buffering=0) as f:
+            buffer = b''
+            buffer_start = 0
+            for _, offset, length, label in records:
+                end = int(offset) + int(length)
+                if end > buffer_start + len(buffer):
+                    # Refill from the current record onward
+                    f.seek(int(offset))
+                    buffer = f.read(max(block_size, int(length)))
+                    buffer_start = int(offset)
+                start = int(offset) - buffer_start
+                yield buffer[start:start + int(length)], int(label)
+
+    def shards_for_worker(self, worker_index=0, num_workers=1, epoch_seed=None):
+        """Shard ids for one of num_workers consumers, optionally shuffled per epoch"""
+        shards = np.arange(self.num_shards)
+        if epoch_seed is not None:
+            shards = np.random.default_rng(epoch_seed).permutation(shards)
+        return [int(shard) for shard in shards[worker_index::num_workers]]
+
+    def target_size(self, target_size=None):
+        """(height, width) batches are decoded at: target_size, else the stored size of pre-resized shards"""
+        if target_size is not None:
+            return tuple(target_size)
+        if self.metadata.get('image_size'):
+            return tuple(self.metadata['image_size'])
+        raise ValueError(f"{self.split_dir} stores original images of varying sizes; pass target_size "
+                         "(or write the shards with shard_pre_resize)")
+
+    def iter_batches(self, batch_size, worker_index=0, num_workers=1, epoch_seed=None, target_size=None):
+        """Yield (uint8 images, labels) batches decoded from this worker's shards at target_size"""
+        target_size = self.target_size(target_size)
+        images, labels = [], []
+        for shard in self.shards_for_worker(worker_index, num_workers, epoch_seed):
+            for data, label in self.iter_shard(shard):
+                images.append(decode_record(data, target_size))
+                labels.append(label)
+                if len(images) == batch_size:
+                    yield np.stack(images), np.array(labels)
+                    images, labels = [], []
+        if images:
+            yield np.stack(images), np.array(labels)
+
+    def close(self):
+        for handle in self._handles.values():
+            handle.close()
+        self._handles = {}
+
+
+class ShardSequence(keras.utils.Sequence):
+    """
+    Training/evaluation batches read from sharded records, with the
+    DirectoryIterator attributes the trainers rely on (samples, classes,
+    class_indices, reset). With shuffle, every epoch visits the shards in a
+    new order and the records of each shard in a new order, and batches are
+    cut from that sequence: batch composition changes every epoch while reads
+    stay within one shard at a time. classes reorders the labels to the
+    consumer's class order; datagen as in TensorCacheSequence.
+    """
+
+    def __init__(self, reader, batch_size=None, class_mode='sparse', shuffle=False, datagen=None, classes=None,
+                 target_size=None, seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.reader = reader
+        self.batch_size = batch_size or TRAINING_CONFIG['batch_size']
+        self.class_mode = class_mode
+        self.shuffle = shuffle
+        self.datagen = datagen
+        self.target_size = reader.target_size(target_size or (TRAINING_CONFIG['img_height'],
+                                                              TRAINING_CONFIG['img_width']))
+        self.rng = np.random.default_rng(seed)
+        self.shard_rows = [np.flatnonzero(reader.index['shard'] == shard) for shard in range(reader.num_shards)]
+        class_names = list(classes or reader.class_names)
+        self.label_map = np.array([class_names.index(name) for name in reader.class_names])
+        self.samples = len(reader)
+        self.classes = self.label_map[reader.labels]
+        self.class_indices = {name: idx for idx, name in enumerate(class_names)}
+        self.num_classes = len(class_names)
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.ceil(self.samples / self.batch_size))
+
+    def __getitem__(self, idx):
+        rows = self.order[idx * self.batch_size:(idx + 1) * self.batch_size]
+        x = np.stack([decode_record(self.reader.read(row)[0], self.target_size) for row in rows]).astype(np.float32)
+        if self.datagen is not None:
+            for i in range(len(x)):
+                x[i] = self.datagen.standardize(self.datagen.random_transform(x[i]))
+        else:
+            x *= 1. / 255
+
+        labels = self.classes[rows]
+        if self.class_mode == 'categorical':
+            y = keras.utils.to_categorical(labels, self.num_classes)
+        else:
+            y = labels.astype(np.float32)
+        return x, y
+
+    def on_epoch_end(self):
+        if not self.shuffle:
+            self.order = np.arange(self.samples)
+            return
+        self.order = np.concatenate([self.rng.permutation(self.shard_rows[shard])
+                                    for shard in self.rng.permutation(len(self.shard_rows))])
+
+    def reset(self):
+        self.on_epoch_end()
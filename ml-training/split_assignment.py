@@ -0,0 +1,118 @@
+"""
+Stable hash-based train/validation/test assignment
+A group's split comes from a salted hash of a stable key (the smallest
+content digest among its images), so it does not depend on which other
+images exist. A persistent split manifest additionally pins every image to
+the split it was first given and caches its perceptual hash, so growing the
+dataset only hashes and assigns the new images.
+"""
+import os
+import json
+import hashlib
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+SPLIT_MANIFEST_VERSION = 1
+SPLIT_NAMES = ('train', 'validation', 'test')
+
+
+def hash_split(key, test_size, val_size, salt=''):
+    """'train', 'validation' or 'test' from a uniform hash of key"""
+    value = int(hashlib.sha256(f"{salt}:{key}".encode()).hexdigest()[:16], 16) / float(1 << 64)
+    if value < test_size:
+        return 'test'
+    if value < test_size + val_size:
+        return 'validation'
+    return 'train'
+
+
+class SplitManifest:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == SPLIT_MANIFEST_VERSION:
+                self.entries = data['entries']
+
+    def save(self):
+        """Atomically persist the manifest"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': SPLIT_MANIFEST_VERSION, 'entries': self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def perceptual_hash(self, digest, method):
+        """Cached perceptual hash (int) of an image computed with method, or None"""
+        entry = self.entries.get(digest, {})
+        if entry.get('hash') is None or entry.get('hash_method') != method:
+            return None
+        return int(entry['hash'], 16)
+
+    def split_of(self, digest):
+        return self.entries.get(digest, {}).get('split')
+
+
+def assign_group_splits(digests, groups, manifest, test_size, val_size, salt=''):
+    """
+    Split name per image. Groups with previously assigned images stay in the
+    split most of those images were in; new groups are placed by hash_split
+    of their smallest digest. Returns (splits, moved) where moved counts
+    previously assigned images whose split had to change to keep a group
+    together.
+    """
+    members = {}
+    for idx, group in enumerate(groups):
+        members.setdefault(group, []).append(idx)
+
+    splits = [None] * len(digests)
+    moved = 0
+    for indices in members.values():
+        previous = [manifest.split_of(digests[i]) for i in indices]
+        pinned = Counter(split for split in previous if split)
+        if pinned:
+            # Most common earlier split; ties go to the earliest in SPLIT_NAMES
+            split = max(SPLIT_NAMES, key=lambda name: (pinned[name], -SPLIT_NAMES.index(name)))
+            moved += sum(count for name, count in pinned.items() if name != split)
+        else:
+            split = hash_split(min(digests[i] for i in indices), test_size, val_size, salt)
+        for i in indices:
+            splits[i] = split
+    return splits, moved
+
+
+def stratification_report(labels, splits, class_names, test_size, val_size, tolerance=0.05):
+    """
+    Per-class counts and fractions in each split, with warnings for classes
+    that have no images in a split, or whose fraction drifts from the target
+    by more than tolerance and by more than a uniform hash plausibly would
+    (3 binomial standard deviations, e.g. large near-duplicate groups).
+    """
+    targets = {'train': 1 - test_size - val_size, 'validation': val_size, 'test': test_size}
+    labels = np.asarray(labels)
+    splits = np.asarray(splits)
+    report = {'targets': targets, 'classes': {}, 'warnings': []}
+
+    for class_idx, class_name in enumerate(class_names):
+        in_class = labels == class_idx
+        total = int(in_class.sum())
+        if total == 0:
+            continue
+        counts = {name: int((splits[in_class] == name).sum()) for name in SPLIT_NAMES}
+        fractions = {name: counts[name] / total for name in SPLIT_NAMES}
+        report['classes'][class_name] = {'total': total, 'counts': counts, 'fractions': fractions}
+
+        for name in SPLIT_NAMES:
+            target = targets[name]
+            noise = 3 * np.sqrt(target * (1 - target) / total)
+            if target > 0 and counts[name] == 0:
+                report['warnings'].append(f"{class_name}: no images in {name}")
+            elif abs(fractions[name] - target) > max(tolerance, noise):
+                report['warnings'].append(
+                    f"{class_name}: {name} holds {fractions[name]:.1%} (target {target:.0%})"
+                )
+    return report
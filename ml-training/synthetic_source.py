@@ -0,0 +1,234 @@
+"""
+On-the-fly synthetic training batches
+Renders the synthetic disease images of create_advanced_dataset.py (or the
+simpler create_sample_images.py) straight into training batches, without
+writing JPEGs first. Batches are rendered ahead of the training loop in a
+process pool, and each one is seeded from (seed, split, batch number) only,
+so a run is reproducible whatever the worker count.
+
+SyntheticSequence is an endless source for pretraining without a dataset;
+mix_synthetic appends synthetic images to every batch of a real training
+generator (keras, memmap or tf_data backend) at TRAINING_CONFIG['synthetic_ratio'].
+"""
+import random
+import itertools
+import multiprocessing
+
+import numpy as np
+from tensorflow import keras
+
+from config import TRAINING_CONFIG, DISEASE_CLASSES
+from parallel_utils import run_parallel_stream
+
+SPLITS = {'train': 0, 'validation': 1, 'test': 2}
+
+
+def render_batch(task):
+    """
+    Worker: render one batch as (uint8 images, class indices).
+    task is (seed, split_id, batch_number, batch_size, class_names, image_size, renderer).
+    Sample i of batch b has class (b * batch_size + i) % num_classes, so
+    batches are balanced and labels are known without rendering.
+    """
+    seed, split_id, batch_number, batch_size, class_names, image_size, renderer = task
+    rng = np.random.default_rng(np.random.SeedSequence([seed, split_id, batch_number]))
+    labels = batch_labels(batch_number, batch_size, len(class_names))
+    width, height = image_size
+    images = np.empty((batch_size, height, width, 3), dtype=np.uint8)
+
+    if renderer == 'simple':
+        from create_sample_images import create_sample_image
+        # Local generators: with one worker this runs in the training process,
+        # whose global random state belongs to augmentation
+        simple_rng = random.Random(int(rng.integers(2 ** 32)))
+        simple_np_rng = np.random.RandomState(int(rng.integers(2 ** 32)))
+        for i, label in enumerate(labels):
+            images[i] = np.asarray(create_sample_image(class_names[label], image_size, simple_rng, simple_np_rng))
+    else:
+        from create_advanced_dataset import render_images
+        # One batched render per class present in the batch
+        for label in np.unique(labels):
+            rows = labels == label
+            images[rows] = render_images(class_names[label], int(rows.sum()), image_size, rng)
+    return images, labels
+
+
+def batch_labels(batch_number, batch_size, num_classes):
+    return (batch_number * batch_size + np.arange(batch_size)) % num_classes
+
+
+class SyntheticSequence(keras.utils.Sequence):
+    """
+    Synthetic batches with the DirectoryIterator attributes the training and
+    evaluation code relies on (samples, classes, class_indices, reset).
+    For the train split every call returns the next batch of an endless
+    stream, so each epoch sees new images whatever order Keras asks for
+    them in. Validation/test batches depend on the index only and are the
+    same every epoch.
+    """
+
+    def __init__(self, class_names=None, split='train', steps=None, batch_size=None, class_mode='sparse',
+                 seed=None, renderer=None, image_size=None, num_workers=None, prefetch=None, **kwargs):
+        super().__init__(**kwargs)
+        self.class_names = list(class_names or DISEASE_CLASSES)
+        self.split = split
+        self.endless = split == 'train'
+        if steps is None:
+            steps = TRAINING_CONFIG['synthetic_steps_per_epoch' if self.endless else 'synthetic_eval_steps']
+        self.steps = steps
+        self.batch_size = batch_size or TRAINING_CONFIG['batch_size']
+        self.class_mode = class_mode
+        self.seed = TRAINING_CONFIG['synthetic_seed'] if seed is None else seed
+        self.renderer = renderer or TRAINING_CONFIG['synthetic_renderer']
+        self.image_size = image_size or (TRAINING_CONFIG['img_width'], TRAINING_CONFIG['img_height'])
+        self.num_workers = num_workers or TRAINING_CONFIG['synthetic_workers']
+        self.prefetch = prefetch or TRAINING_CONFIG['synthetic_prefetch']
+
+        self.num_classes = len(self.class_names)
+        self.class_indices = {name: idx for idx, name in enumerate(self.class_names)}
+        self.samples = self.steps * self.batch_size
+        self.classes = np.concatenate([
+            batch_labels(batch_number, self.batch_size, self.num_classes) for batch_number in range(self.steps)
+        ])
+        self._stream = None
+        self._stream_next = None
+        self.position = 0
+
+    def __len__(self):
+        return self.steps
+
+    def __getitem__(self, idx):
+        if self.endless:
+            batch_number, self.position = self.position, self.position + 1
+        else:
+            batch_number = idx
+        images, labels = self.render(batch_number)
+        images = images.astype(np.float32) / 255.0
+        if self.class_mode == 'categorical':
+            return images, np.eye(self.num_classes, dtype=np.float32)[labels]
+        return images, labels.astype(np.float32)
+
+    def render(self, batch_number):
+        """uint8 images and class indices of one batch, read ahead in the background"""
+        if self._stream is None or batch_number != self._stream_next:
+            # First call or out-of-order access: restart the read-ahead at this batch
+            self.close()
+            tasks = (
+                (self.seed, SPLITS[self.split], number, self.batch_size, self.class_names, self.image_size,
+                 self.renderer)
+                for number in itertools.count(batch_number)
+            )
+            # Spawned, not forked: the training process has TensorFlow loaded
+            self._stream = run_parallel_stream(render_batch, tasks, self.num_workers, max_pending=self.prefetch,
+                                               mp_context=multiprocessing.get_context('spawn'))
+        self._stream_next = batch_number + 1
+        return next(self._stream)
+
+    def batches(self):
+        """Endless generator of batches (for tf.data)"""
+        while True:
+            yield self[self.position]
+
+    def reset(self):
+        self.position = 0
+
+    def close(self):
+        """Stop the render workers"""
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def __del__(self):
+        self.close()
+
+
+def synthetic_split(split, class_names=None, class_mode='sparse', **kwargs):
+    """A SyntheticSequence for one split, configured from TRAINING_CONFIG"""
+    print(f"🎨 {split}: rendering synthetic images on the fly ({TRAINING_CONFIG['synthetic_renderer']} renderer)")
+    return SyntheticSequence(class_names, split=split, class_mode=class_mode, **kwargs)
+
+
+def synthetic_batch_size(real_batch_size, ratio):
+    """Synthetic images to append to a real batch so they make up ratio of it"""
+    return max(1, int(round(real_batch_size * ratio / (1.0 - ratio))))
+
+
+class MixedSequence(keras.utils.Sequence):
+    """
+    Every batch of a real Sequence (DirectoryIterator, TensorCacheSequence)
+    followed by a batch of synthetic images. The synthetic batch size is
+    fixed, so the last, partial real batch gets a slightly higher share.
+    """
+
+    def __init__(self, real, synthetic, **kwargs):
+        super().__init__(**kwargs)
+        self.real = real
+        self.synthetic = synthetic
+        self.class_indices = real.class_indices
+        self.classes = real.classes
+        self.samples = real.samples + len(real) * synthetic.batch_size
+
+    def __len__(self):
+        return len(self.real)
+
+    def __getitem__(self, idx):
+        images, labels = self.real[idx][:2]
+        synthetic_images, synthetic_labels = self.synthetic[idx]
+        return (np.concatenate([images, synthetic_images]),
+                np.concatenate([labels, synthetic_labels.astype(labels.dtype)]))
+
+    def on_epoch_end(self):
+        self.real.on_epoch_end()
+
+    def reset(self):
+        self.real.reset()
+
+
+def _mix_dataset(dataset, synthetic):
+    """tf_data backend: zip the real dataset with a synthetic one and concatenate each batch"""
+    import tensorflow as tf
+
+    width, height = synthetic.image_size
+    label_shape = (None, synthetic.num_classes) if synthetic.class_mode == 'categorical' else (None,)
+    synthetic_dataset = tf.data.Dataset.from_generator(
+        synthetic.batches,
+        output_signature=(
+            tf.TensorSpec((None, height, width, 3), tf.float32),
+            tf.TensorSpec(label_shape, tf.float32),
+        )
+    )
+    mixed = tf.data.Dataset.zip((dataset, synthetic_dataset)).map(
+        lambda real, fake: (tf.concat([real[0], fake[0]], 0), tf.concat([real[1], fake[1]], 0)),
+        num_parallel_calls=tf.data.AUTOTUNE
+    ).prefetch(tf.data.AUTOTUNE)
+
+    mixed.samples = dataset.samples + int(dataset.cardinality()) * synthetic.batch_size
+    mixed.classes = dataset.classes
+    mixed.class_indices = dataset.class_indices
+    mixed.reset = dataset.reset
+    mixed.synthetic = synthetic
+    return mixed
+
+
+def mix_synthetic(train_generator, class_mode='sparse', ratio=None):
+    """
+    Add on-the-fly synthetic images to a real training generator so they make
+    up ratio (default TRAINING_CONFIG['synthetic_ratio']) of every batch.
+    Returns the generator unchanged when the ratio is 0.
+    """
+    ratio = TRAINING_CONFIG['synthetic_ratio'] if ratio is None else ratio
+    if ratio <= 0:
+        return train_generator
+    if ratio >= 1:
+        raise ValueError("synthetic_ratio 1.0 trains on synthetic images only; use synthetic_split instead")
+
+    # Same class order as the real data, so labels agree
+    class_names = sorted(train_generator.class_indices, key=train_generator.class_indices.get)
+    batch_size = synthetic_batch_size(TRAINING_CONFIG['batch_size'], ratio)
+    synthetic = SyntheticSequence(class_names, split='train', batch_size=batch_size, class_mode=class_mode)
+    print(f"🎨 Mixing {batch_size} synthetic images into every training batch "
+          f"({ratio:.0%} synthetic, {synthetic.renderer} renderer)")
+
+    if isinstance(train_generator, keras.utils.Sequence):
+        return MixedSequence(train_generator, synthetic)
+    return _mix_dataset(train_generator, synthetic)
@@ -0,0 +1,249 @@
+"""
+Memory-mapped, pre-decoded uint8 tensor cache for training and evaluation
+Each split directory (split/class_name/images) is decoded and resized once
+into an N x H x W x 3 uint8 np.memmap plus label and validity arrays. Batches
+are then sliced straight out of the page cache, which the OS shares between
+every process reading the same cache.
+
+Caches are named by split, class order and image size, so trainers with a
+different class order or image size get their own cache instead of
+rebuilding a shared one, while a changed file listing rebuilds the same
+directory rather than leaving the old cache behind. A build
+is written to a temporary directory and renamed into place; the files of a
+replaced cache are unlinked, never truncated, so a process that still maps
+them keeps reading the old data.
+
+Layout of a cache directory:
+    cache.json     key, shape and class names
+    images.u8      raw N x H x W x 3 uint8 memmap
+    labels.npy     int32 class index per row
+    valid.npy      bool, False for rows that failed to decode
+"""
+import os
+import json
+import shutil
+import hashlib
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from tensorflow import keras
+
+from config import TRAINING_CONFIG, TENSOR_CACHE_DIR, PREPROCESSING_CONFIG
+from dataset_manifest import scan_image_tree
+from parallel_utils import run_parallel
+from image_pyramid import get_pyramid
+
+CACHE_VERSION = 1
+
+# Same resampling as keras load_img, so cached pixels match flow_from_directory
+INTERPOLATION = {
+    'nearest': Image.NEAREST,
+    'bilinear': Image.BILINEAR,
+    'bicubic': Image.BICUBIC,
+}
+
+
+def list_split(split_dir, classes=None):
+    """
+    (relative paths, labels, class names, stat listing) for a split directory.
+    classes=None uses sorted subdirectory names, like flow_from_directory.
+    """
+    split_dir = Path(split_dir)
+    if classes is None:
+        classes = sorted(entry.name for entry in os.scandir(split_dir) if entry.is_dir())
+    listing = scan_image_tree(split_dir, classes, PREPROCESSING_CONFIG['valid_extensions'])
+    class_index = {class_name: idx for idx, class_name in enumerate(classes)}
+    # Same row order as flow_from_directory: by class index, then file name
+    paths = sorted(listing, key=lambda rel_path: (class_index[listing[rel_path][0]], rel_path))
+    labels = np.array([class_index[listing[path][0]] for path in paths], dtype=np.int32)
+    return paths, labels, list(classes), listing
+
+
+def cache_key(listing, class_names, image_size, interpolation):
+    """Invalidation key: every file's path, size and mtime plus class order and target size"""
+    digest = hashlib.sha256(
+        f"v{CACHE_VERSION}:{image_size[0]}x{image_size[1]}:{interpolation}:{','.join(class_names)}\n".encode()
+    )
+    for rel_path, (_, size, mtime_ns) in listing.items():
+        digest.update(f"{rel_path}:{size}:{mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _decode_into_cache(task, images_path, shape, interpolation):
+    """Worker: decode one image straight into its memmap row; returns validity"""
+    row, img_path = task
+    try:
+        with Image.open(img_path) as img:
+            img = img.convert('RGB')
+            if img.size != (shape[2], shape[1]):
+                img = img.resize((shape[2], shape[1]), INTERPOLATION[interpolation])
+            pixels = np.asarray(img, dtype=np.uint8)
+        cache = np.memmap(images_path, dtype=np.uint8, mode='r+', shape=shape)
+        cache[row] = pixels
+        cache.flush()
+        del cache
+        return True
+    except Exception:
+        return False
+
+
+def publish_cache_dir(tmp_dir, cache_dir):
+    """Rename a finished build over cache_dir; the replaced directory is deleted, not overwritten"""
+    old_dir = None
+    if cache_dir.exists():
+        old_dir = cache_dir.with_name(f".{cache_dir.name}.{os.getpid()}.old")
+        os.replace(cache_dir, old_dir)
+    os.replace(tmp_dir, cache_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class TensorCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        with open(self.cache_dir / 'cache.json', 'r') as f:
+            self.metadata = json.load(f)
+        self.images = np.memmap(
+            self.cache_dir / 'images.u8', dtype=np.uint8, mode='r', shape=tuple(self.metadata['shape'])
+        )
+        self.labels = np.load(self.cache_dir / 'labels.npy')
+        self.valid = np.load(self.cache_dir / 'valid.npy')
+        self.class_names = self.metadata['class_names']
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def build(cls, split_dir, cache_dir=None, classes=None, image_size=None, interpolation='nearest',
+              num_workers=None, rebuild=False):
+        """
+        Load the cache for split_dir, (re)building it when the split's files
+        or the target image size changed since the last build. By default the
+        cache directory is named after the split, class order and image size.
+        """
+        split_dir = Path(split_dir)
+        if image_size is None:
+            image_size = (TRAINING_CONFIG['img_height'], TRAINING_CONFIG['img_width'])
+
+        paths, labels, class_names, listing = list_split(split_dir, classes)
+        sources = [str(split_dir / rel_path) for rel_path in paths]
+        # Decode from the smallest cached downscaled copies that still cover image_size
+        pyramid = get_pyramid()
+        if pyramid is not None:
+            sources = pyramid.resolve_many(sources, image_size[::-1])
+        interpolation_id = interpolation + (':pyramid' if pyramid else '')
+        key = cache_key(listing, class_names, image_size, interpolation_id)
+        if cache_dir is None:
+            # Everything in the key except the file listing, which only triggers a rebuild in place
+            source_id = hashlib.sha256(
+                f"{split_dir.resolve()}:{image_size[0]}x{image_size[1]}:{interpolation_id}:"
+                f"{','.join(class_names)}".encode()
+            ).hexdigest()[:16]
+            cache_dir = TENSOR_CACHE_DIR / f"{split_dir.name}-{source_id}"
+        cache_dir = Path(cache_dir)
+
+        metadata_path = cache_dir / 'cache.json'
+        if not rebuild and metadata_path.exists():
+            with open(metadata_path, 'r') as f:
+                if json.load(f).get('key') == key:
+                    return cls(cache_dir)
+
+        print(f"🧊 Building tensor cache for {split_dir.name}: {len(paths)} images at {image_size[0]}x{image_size[1]}")
+        tmp_dir = cache_dir.with_name(f".{cache_dir.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        shape = (len(paths), image_size[0], image_size[1], 3)
+        images_path = tmp_dir / 'images.u8'
+        # Preallocate the (sparse) file; workers fill their rows in place
+        with open(images_path, 'wb') as f:
+            f.truncate(int(np.prod(shape)))
+
+        decode = partial(_decode_into_cache, images_path=str(images_path), shape=shape, interpolation=interpolation)
+        valid = np.array(run_parallel(
+            decode, list(enumerate(sources)),
+            num_workers, desc=f"Caching {split_dir.name}"
+        ), dtype=bool)
+
+        np.save(tmp_dir / 'labels.npy', labels)
+        np.save(tmp_dir / 'valid.npy', valid)
+        with open(tmp_dir / 'cache.json', 'w') as f:
+            json.dump({
+                'version': CACHE_VERSION,
+                'key': key,
+                'shape': list(shape),
+                'class_names': class_names,
+                'interpolation': interpolation,
+                'num_invalid': int((~valid).sum()),
+                'files': paths
+            }, f, indent=2)
+        publish_cache_dir(tmp_dir, cache_dir)
+
+        if (~valid).any():
+            print(f"⚠️  {int((~valid).sum())} images could not be decoded and are masked out")
+        return cls(cache_dir)
+
+
+class TensorCacheSequence(keras.utils.Sequence):
+    """
+    Batches from a TensorCache, mirroring the DirectoryIterator attributes the
+    training and evaluation code relies on (samples, classes, class_indices, reset).
+    datagen is the ImageDataGenerator the directory pipeline would have used;
+    without one, pixels are only rescaled to [0, 1].
+    """
+
+    def __init__(self, cache, batch_size=None, class_mode='sparse', shuffle=False, datagen=None,
+                 seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.batch_size = batch_size or TRAINING_CONFIG['batch_size']
+        self.class_mode = class_mode
+        self.shuffle = shuffle
+        self.datagen = datagen
+        self.rng = np.random.default_rng(seed)
+        self.indices = np.flatnonzero(cache.valid)
+        self.samples = len(self.indices)
+        self.classes = cache.labels[self.indices]
+        self.class_indices = {name: idx for idx, name in enumerate(cache.class_names)}
+        self.num_classes = len(cache.class_names)
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.ceil(self.samples / self.batch_size))
+
+    def __getitem__(self, idx):
+        rows = self.order[idx * self.batch_size:(idx + 1) * self.batch_size]
+        if self.shuffle:
+            # Sorted rows keep page-cache reads mostly sequential within the batch
+            batch = self.cache.images[np.sort(rows)]
+            labels = self.cache.labels[np.sort(rows)]
+        else:
+            # Contiguous rows: a zero-copy view into the memmap
+            start, stop = rows[0], rows[-1] + 1
+            if stop - start == len(rows):
+                batch = self.cache.images[start:stop]
+            else:
+                batch = self.cache.images[rows]
+            labels = self.cache.labels[rows]
+
+        x = batch.astype(np.float32)
+        if self.datagen is not None:
+            # Same per-image steps as DirectoryIterator: augment, then rescale/standardize
+            for i in range(len(x)):
+                x[i] = self.datagen.standardize(self.datagen.random_transform(x[i]))
+        else:
+            x *= 1. / 255
+
+        if self.class_mode == 'categorical':
+            y = keras.utils.to_categorical(labels, self.num_classes)
+        else:
+            y = labels.astype(np.float32)
+        return x, y
+
+    def on_epoch_end(self):
+        self.order = self.rng.permutation(self.indices) if self.shuffle else self.indices
+
+    def reset(self):
+        self.on_epoch_end()
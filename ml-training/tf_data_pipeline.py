@@ -0,0 +1,168 @@
+"""
+tf.data input pipeline for Ginger Disease Detection training
+Parallel file reads, decode and resize with autotuned parallelism, optional
+in-memory or on-disk caching of decoded images, batched augmentation that
+follows the ImageDataGenerator settings in TRAINING_CONFIG, and prefetch.
+"""
+import math
+
+import numpy as np
+import tensorflow as tf
+
+from config import TRAINING_CONFIG, TF_DATA_CACHE_DIR
+from tensor_cache import cache_key, list_split
+from image_pyramid import get_pyramid
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+# Formats tf.io.decode_image understands
+TF_DECODABLE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif'}
+
+
+def _random_affine_transforms(batch_size, height, width, config):
+    """
+    Per-image projective transforms reproducing ImageDataGenerator's
+    rotation -> shift -> shear -> zoom composition about the image centre.
+    Height shift and zoom_x act on rows, width shift and zoom_y on columns.
+    (The legacy Keras apply_affine_transform swaps the two axes; with square
+    inputs and equal shift ranges, as configured, the random transforms
+    have the same distribution either way.)
+    """
+    def uniform(limit):
+        return tf.random.uniform([batch_size], -limit, limit)
+
+    theta = uniform(float(config['rotation_range'])) * math.pi / 180
+    shear = uniform(float(config['shear_range'])) * math.pi / 180
+    # Rows shift by height_shift_range and columns by width_shift_range
+    shift_range_rows = config['height_shift_range']
+    shift_range_cols = config['width_shift_range']
+    tx = uniform(float(shift_range_rows)) * (height if shift_range_rows < 1 else 1)
+    ty = uniform(float(shift_range_cols)) * (width if shift_range_cols < 1 else 1)
+    zoom = config['zoom_range']
+    zoom_low, zoom_high = (1 - zoom, 1 + zoom) if np.isscalar(zoom) else zoom
+    zx = tf.random.uniform([batch_size], zoom_low, zoom_high)
+    zy = tf.random.uniform([batch_size], zoom_low, zoom_high)
+
+    # Composite matrix R @ T @ S @ Z over (row, col) coordinates
+    cos_t, sin_t = tf.cos(theta), tf.sin(theta)
+    cos_s, sin_s = tf.cos(shear), tf.sin(shear)
+    m00 = cos_t * zx
+    m01 = (-cos_t * sin_s - sin_t * cos_s) * zy
+    m02 = cos_t * tx - sin_t * ty
+    m10 = sin_t * zx
+    m11 = (-sin_t * sin_s + cos_t * cos_s) * zy
+    m12 = sin_t * tx + cos_t * ty
+
+    # Offset about the centre as transform_matrix_offset_center does (row centre, column centre)
+    o_x, o_y = height / 2 - 0.5, width / 2 - 0.5
+    m02 = m02 + o_x - m00 * o_x - m01 * o_y
+    m12 = m12 + o_y - m10 * o_x - m11 * o_y
+
+    # ImageProjectiveTransform maps (x=col, y=row) instead: transpose the axes
+    zeros = tf.zeros([batch_size])
+    return tf.stack([m11, m10, m12, m01, m00, m02, zeros, zeros], axis=1)
+
+
+def augment_batch(images, config=None):
+    """Augment a float32 [0, 255] image batch using TRAINING_CONFIG semantics"""
+    config = config or TRAINING_CONFIG
+    shape = tf.shape(images)
+    batch_size, height, width = shape[0], shape[1], shape[2]
+
+    transforms = _random_affine_transforms(
+        batch_size, tf.cast(height, tf.float32), tf.cast(width, tf.float32), config
+    )
+    images = tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=transforms,
+        output_shape=shape[1:3],
+        fill_value=0.0,
+        interpolation='BILINEAR',
+        fill_mode=config['fill_mode'].upper()
+    )
+
+    if config['horizontal_flip']:
+        flip = tf.random.uniform([batch_size, 1, 1, 1]) < 0.5
+        images = tf.where(flip, tf.reverse(images, axis=[2]), images)
+    if config['vertical_flip']:
+        flip = tf.random.uniform([batch_size, 1, 1, 1]) < 0.5
+        images = tf.where(flip, tf.reverse(images, axis=[1]), images)
+
+    if config.get('brightness_range'):
+        low, high = config['brightness_range']
+        factor = tf.random.uniform([batch_size, 1, 1, 1], low, high)
+        images = tf.clip_by_value(images * factor, 0.0, 255.0)
+
+    return images
+
+
+def create_dataset(split_dir, classes=None, class_mode='sparse', batch_size=None, shuffle=False,
+                   augment=False, cache=None, image_size=None, seed=None):
+    """
+    Build a batched tf.data pipeline over split_dir/class_name/images.
+    cache: None, 'memory' or 'disk' (defaults to TRAINING_CONFIG['tf_data_cache']).
+    The returned dataset also carries samples, classes, class_indices and
+    reset() so it can stand in for a flow_from_directory iterator.
+    """
+    batch_size = batch_size or TRAINING_CONFIG['batch_size']
+    if image_size is None:
+        image_size = (TRAINING_CONFIG['img_height'], TRAINING_CONFIG['img_width'])
+    if cache is None:
+        cache = TRAINING_CONFIG['tf_data_cache']
+
+    paths, labels, class_names, listing = list_split(split_dir, classes)
+    decodable = [i for i, path in enumerate(paths) if path[path.rfind('.'):].lower() in TF_DECODABLE_EXTENSIONS]
+    if len(decodable) < len(paths):
+        print(f"⚠️  Skipping {len(paths) - len(decodable)} files tf.io cannot decode in {split_dir}")
+    paths = [str(split_dir / paths[i]) for i in decodable]
+    labels = labels[decodable]
+    # Smallest cached downscaled copies that still cover image_size
+    pyramid = get_pyramid()
+    if pyramid is not None:
+        paths = pyramid.resolve_many(paths, image_size[::-1])
+    num_classes = len(class_names)
+
+    def load(path, label):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        image = tf.image.resize(image, image_size, method='nearest')
+        return tf.cast(image, tf.uint8), label
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    if shuffle and not cache:
+        # Shuffle cheap path strings before the expensive decode
+        dataset = dataset.shuffle(len(paths), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.map(load, num_parallel_calls=AUTOTUNE, deterministic=not shuffle)
+
+    if cache == 'memory':
+        dataset = dataset.cache()
+    elif cache == 'disk':
+        TF_DATA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        key = cache_key(listing, class_names, image_size, 'tf_nearest' + (':pyramid' if pyramid else ''))[:16]
+        dataset = dataset.cache(str(TF_DATA_CACHE_DIR / f"{split_dir.name}_{key}"))
+    if shuffle and cache:
+        dataset = dataset.shuffle(
+            min(len(paths), TRAINING_CONFIG['tf_data_shuffle_buffer']), seed=seed, reshuffle_each_iteration=True
+        )
+
+    dataset = dataset.batch(batch_size)
+
+    def finish(images, batch_labels):
+        images = tf.cast(images, tf.float32)
+        if augment:
+            images = augment_batch(images)
+        images = images / 255.0
+        if class_mode == 'categorical':
+            batch_labels = tf.one_hot(batch_labels, num_classes)
+        else:
+            batch_labels = tf.cast(batch_labels, tf.float32)
+        return images, batch_labels
+
+    dataset = dataset.map(finish, num_parallel_calls=AUTOTUNE, deterministic=not shuffle)
+    dataset = dataset.prefetch(AUTOTUNE)
+
+    # DirectoryIterator-compatible attributes used by the training/evaluation code
+    dataset.samples = len(paths)
+    dataset.classes = labels
+    dataset.class_indices = {name: idx for idx, name in enumerate(class_names)}
+    dataset.reset = lambda: None
+    return dataset
@@ -0,0 +1,251 @@
+"""
+Full training-state checkpoints and resume
+The best-model checkpoints only keep weights worth deploying. TrainingState
+also periodically writes everything fit() needs to carry on where it
+stopped:
+
+- model weights and optimizer variables (incl. step counter and learning rate)
+- the epoch counter and the history so far
+- EarlyStopping / ReduceLROnPlateau / (Async)ModelCheckpoint counters and bests
+- the training input position (shuffle order and RNG of the Sequence, the
+  synthetic stream position) and the global Python/NumPy RNGs that drive
+  the ImageDataGenerator augmentation
+
+Checkpoints are written at epoch boundaries, so a resumed run continues
+with the next epoch exactly as the interrupted one would have. (The
+tf_data backend reshuffles from TensorFlow's own RNG, which is not captured.)
+
+Layout of a run directory:
+    latest.json            name of the newest complete checkpoint
+    epoch_0040/
+        model.weights.h5   model weights
+        state.npz          optimizer variables and array state
+        state.json         epoch, history, callback and RNG state
+"""
+import os
+import json
+import random
+import shutil
+from pathlib import Path
+
+import numpy as np
+from tensorflow import keras
+
+from config import TRAINING_STATE_CONFIG, TRAINING_STATE_DIR
+from checkpoint_writer import AsyncModelCheckpoint
+
+STATE_VERSION = 1
+
+# Callback attributes that fit() would otherwise reset on a new run
+CALLBACK_STATE = (
+    (keras.callbacks.EarlyStopping, ('wait', 'best', 'stopped_epoch', 'best_epoch')),
+    (keras.callbacks.ReduceLROnPlateau, ('wait', 'best', 'cooldown_counter')),
+    (keras.callbacks.ModelCheckpoint, ('best',)),
+    (AsyncModelCheckpoint, ('best',)),
+)
+# Input pipeline attributes that fix the rest of the current shuffle
+PIPELINE_STATE = ('order', 'view_of', 'index_array', 'position', 'total_batches_seen', 'batch_index')
+
+
+def _pipeline_parts(data, prefix='train'):
+    """(name, object) for the training input and the sources it wraps (MixedSequence)"""
+    yield prefix, data
+    for attr in ('real', 'synthetic'):
+        if getattr(data, attr, None) is not None:
+            yield from _pipeline_parts(getattr(data, attr), f"{prefix}.{attr}")
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def latest_checkpoint(run_dir):
+    """Path of the newest complete checkpoint in run_dir, or None"""
+    latest_path = Path(run_dir) / 'latest.json'
+    if not latest_path.exists():
+        return None
+    with open(latest_path, 'r') as f:
+        checkpoint = Path(run_dir) / json.load(f)['checkpoint']
+    return checkpoint if checkpoint.exists() else None
+
+
+class TrainingState(keras.callbacks.Callback):
+    """
+    Callback writing full-state checkpoints of one training run (e.g. the
+    'cnn' or 'fine_tune' phase). callbacks are the other callbacks of the
+    run; add this one after them, so its restore runs after they reset
+    themselves in on_train_begin. With resume, initial_epoch_for() gives the
+    epoch to pass to fit(); without it, old checkpoints of the run are
+    cleared when training starts.
+    """
+
+    def __init__(self, run_name, train_data=None, callbacks=None, resume=False, every_epochs=None, keep_last=None,
+                 run_dir=None):
+        super().__init__()
+        self.run_dir = Path(run_dir or TRAINING_STATE_DIR / run_name)
+        self.train_data = train_data
+        self.tracked_callbacks = [callback for callback in callbacks or [] if callback is not self]
+        self.every_epochs = every_epochs or TRAINING_STATE_CONFIG['every_epochs']
+        self.keep_last = keep_last or TRAINING_STATE_CONFIG['keep_last']
+        self.resume_from = latest_checkpoint(self.run_dir) if resume else None
+        self.history = {}
+        self.initial_epoch = 0
+        self.last_epoch = None
+        self.finished = False
+        if self.resume_from is not None:
+            with open(self.resume_from / 'state.json', 'r') as f:
+                state = json.load(f)
+            self.history = state['history']
+            self.initial_epoch = state['epoch'] + 1
+            self.finished = state['finished']
+            print(f"🔁 Resuming {run_name} from {self.resume_from.name} (next epoch {self.initial_epoch + 1})")
+        elif resume:
+            print(f"⚠️  No checkpoint found in {self.run_dir}, starting {run_name} from scratch")
+
+    def initial_epoch_for(self, epochs):
+        """initial_epoch for fit(); a finished run (e.g. early-stopped) trains no further"""
+        return epochs if self.finished else self.initial_epoch
+
+    def merged_history(self, history):
+        """A fit() History extended with the epochs trained before the resume"""
+        for key in set(self.history) | set(history.history):
+            history.history[key] = self.history.get(key, [])[:self.initial_epoch] + list(history.history.get(key, []))
+        return history
+
+    def on_train_begin(self, logs=None):
+        if self.resume_from is not None:
+            self.restore(self.resume_from)
+            self.resume_from = None
+        elif self.initial_epoch == 0 and self.run_dir.exists():
+            shutil.rmtree(self.run_dir)
+
+    def on_epoch_end(self, epoch, logs=None):
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(float(value))
+        self.last_epoch = epoch
+        if (epoch + 1) % self.every_epochs == 0:
+            self.save(epoch)
+
+    def on_train_end(self, logs=None):
+        if self.last_epoch is not None:
+            # Final state, after EarlyStopping restored the best weights
+            self.save(self.last_epoch, finished=True)
+
+    def save(self, epoch, finished=False):
+        """Atomically write a checkpoint and drop the ones beyond keep_last"""
+        name = f"epoch_{epoch + 1:04d}"
+        tmp_dir = self.run_dir / f".{name}.tmp"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+
+        self.model.save_weights(tmp_dir / 'model.weights.h5')
+        arrays = {}
+        optimizer = self.model.optimizer
+        if optimizer is not None and optimizer.built:
+            for i, variable in enumerate(optimizer.variables):
+                arrays[f"optimizer/{i}"] = np.asarray(variable)
+
+        callback_state = []
+        for i, callback in enumerate(self.tracked_callbacks):
+            state = {}
+            for callback_class, attrs in CALLBACK_STATE:
+                if isinstance(callback, callback_class):
+                    state.update({attr: _to_json(getattr(callback, attr)) for attr in attrs if hasattr(callback, attr)})
+            if getattr(callback, 'best_weights', None) is not None:
+                for j, weight in enumerate(callback.best_weights):
+                    arrays[f"callback/{i}/best_weights/{j}"] = np.asarray(weight)
+                state['best_weights'] = len(callback.best_weights)
+            callback_state.append({'class': type(callback).__name__, 'state': state})
+
+        pipeline = {}
+        if self.train_data is not None:
+            for part_name, part in _pipeline_parts(self.train_data):
+                state = {}
+                for attr in PIPELINE_STATE:
+                    value = getattr(part, attr, None)
+                    if isinstance(value, np.ndarray):
+                        arrays[f"pipeline/{part_name}/{attr}"] = value
+                    elif isinstance(value, (int, np.integer)):
+                        state[attr] = int(value)
+                if isinstance(getattr(part, 'rng', None), np.random.Generator):
+                    state['rng'] = part.rng.bit_generator.state
+                pipeline[part_name] = state
+
+        np_state = np.random.get_state()
+        arrays['numpy_random/keys'] = np_state[1]
+        np.savez(tmp_dir / 'state.npz', **arrays)
+        with open(tmp_dir / 'state.json', 'w') as f:
+            json.dump({
+                'version': STATE_VERSION,
+                'epoch': epoch,
+                'finished': finished,
+                'history': self.history,
+                'callbacks': callback_state,
+                'pipeline': pipeline,
+                'python_random': random.getstate(),
+                'numpy_random': [np_state[0], *np_state[2:]],
+            }, f)
+
+        checkpoint_dir = self.run_dir / name
+        if checkpoint_dir.exists():
+            shutil.rmtree(checkpoint_dir)
+        os.replace(tmp_dir, checkpoint_dir)
+        latest_tmp = self.run_dir / 'latest.json.tmp'
+        with open(latest_tmp, 'w') as f:
+            json.dump({'checkpoint': name, 'epoch': epoch, 'finished': finished}, f)
+        os.replace(latest_tmp, self.run_dir / 'latest.json')
+
+        checkpoints = sorted(path for path in self.run_dir.glob('epoch_*') if path.is_dir())
+        for old in checkpoints[:-self.keep_last]:
+            shutil.rmtree(old)
+
+    def restore(self, checkpoint_dir):
+        """Load a checkpoint into the model, callbacks, input pipeline and global RNGs"""
+        with open(checkpoint_dir / 'state.json', 'r') as f:
+            state = json.load(f)
+        arrays = np.load(checkpoint_dir / 'state.npz')
+
+        optimizer_keys = sorted((key for key in arrays.files if key.startswith('optimizer/')),
+                                key=lambda key: int(key.split('/')[1]))
+        optimizer = self.model.optimizer
+        if optimizer_keys and not optimizer.built:
+            optimizer.build(self.model.trainable_variables)
+        self.model.load_weights(checkpoint_dir / 'model.weights.h5')
+        if optimizer_keys:
+            if len(optimizer.variables) != len(optimizer_keys):
+                raise ValueError(f"Checkpoint has {len(optimizer_keys)} optimizer variables, "
+                                 f"the model has {len(optimizer.variables)} (different trainable layers?)")
+            for variable, key in zip(optimizer.variables, optimizer_keys):
+                variable.assign(arrays[key])
+
+        callback_list = self.tracked_callbacks
+        for i, saved in enumerate(state['callbacks'][:len(callback_list)]):
+            callback = callback_list[i]
+            if type(callback).__name__ != saved['class']:
+                continue
+            for attr, value in saved['state'].items():
+                if attr == 'best_weights':
+                    callback.best_weights = [arrays[f"callback/{i}/best_weights/{j}"] for j in range(value)]
+                else:
+                    setattr(callback, attr, value)
+
+        if self.train_data is not None:
+            for part_name, part in _pipeline_parts(self.train_data):
+                saved = state['pipeline'].get(part_name, {})
+                for attr in PIPELINE_STATE:
+                    key = f"pipeline/{part_name}/{attr}"
+                    if key in arrays.files:
+                        setattr(part, attr, arrays[key])
+                    elif attr in saved:
+                        setattr(part, attr, saved[attr])
+                if 'rng' in saved:
+                    part.rng.bit_generator.state = saved['rng']
+
+        version, internal, gauss = state['python_random']
+        random.setstate((version, tuple(internal), gauss))
+        np_name, *np_rest = state['numpy_random']
+        np.random.set_state((np_name, arrays['numpy_random/keys'], *np_rest))
+
@@ -7,13 +7,145 @@ Validates image quality, format, and organization
 
 import os
 import sys
+import csv
+import json
+import argparse
+from functools import partial
 from pathlib import Path
 from PIL import Image
 import cv2
 import numpy as np
 
-def validate_images():
-    """Validate all images in the dataset"""
+from dataset_manifest import scan_image_tree
+from parallel_utils import run_parallel
+from image_validation import TIER_HEADER, TIER_NAMES, validate_file
+from dataset_stats import compute_dataset_stats, load_dataset_stats
+
+# Bump when the checks change so cached results are re-evaluated
+CHECKS_VERSION = 2
+VALIDATION_CACHE_PATH = Path('data/cache/validation_results.json')
+VALIDATION_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+MIN_RESOLUTION = 224
+MIN_FILE_SIZE = 1024  # 1KB
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+
+
+def check_image(img_path, tier=TIER_HEADER):
+    """Worker: image properties and the list of issues found (empty when valid)"""
+    result = validate_file(img_path, tier)
+    width, height = result['width'], result['height']
+    mode, format = result['mode'], result['format']
+    img_issues = []
+    
+    if result['failed_tier'] == TIER_HEADER:
+        img_issues.append(f"Error opening file: {result['error']}")
+    else:
+        if result['error']:
+            img_issues.append(f"Failed {TIER_NAMES[result['failed_tier']]} check: {result['error']}")
+        
+        # Check resolution
+        if width < MIN_RESOLUTION or height < MIN_RESOLUTION:
+            img_issues.append(f"Resolution too small: {width}x{height}")
+        
+        # Check format
+        if format not in ['JPEG', 'PNG']:
+            img_issues.append(f"Invalid format: {format}")
+        
+        # Check mode
+        if mode != 'RGB':
+            img_issues.append(f"Invalid color mode: {mode}")
+        
+        # Check file size
+        file_size = result['size']
+        if file_size < MIN_FILE_SIZE:
+            img_issues.append(f"File too small: {file_size} bytes")
+        elif file_size > MAX_FILE_SIZE:
+            img_issues.append(f"File too large: {file_size / (1024*1024):.1f}MB")
+    
+    return {'tier': tier, 'width': width, 'height': height, 'mode': mode, 'format': format, 'issues': img_issues}
+
+
+class ValidationCache:
+    """Per-file results keyed by relative path, reused while size and mtime match"""
+    
+    def __init__(self, path=VALIDATION_CACHE_PATH):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                if data.get('checks_version') == CHECKS_VERSION:
+                    self.entries = data['entries']
+            except (OSError, ValueError):
+                # A damaged cache only costs a re-validation
+                self.entries = {}
+    
+    def save(self):
+        """Atomically persist the cache"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'checks_version': CHECKS_VERSION, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
+    
+    def lookup(self, rel_path, size, mtime_ns, tier=TIER_HEADER):
+        """Cached result if the file is unchanged and was checked at least as deep as tier"""
+        entry = self.entries.get(rel_path)
+        if (entry is not None and entry['size'] == size and entry['mtime_ns'] == mtime_ns
+                and entry['tier'] >= tier):
+            return entry
+        return None
+
+
+def write_issue_report(issues, output_path):
+    """Write the full issue list as JSON or CSV (by file extension)"""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if output_path.suffix.lower() == '.csv':
+        with open(output_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['file', 'class', 'issue'])
+            for issue in issues:
+                for problem in issue['issues']:
+                    writer.writerow([issue['file'], issue['class'], problem])
+    else:
+        with open(output_path, 'w') as f:
+            json.dump(issues, f, indent=2)
+
+
+def print_dataset_profile(stats):
+    """Resolution, brightness and color summary from cached dataset statistics"""
+    print("\n📐 DATASET PROFILE:")
+    print("-" * 40)
+    overall = stats['global']
+    short_side = overall['histograms']['short_side']
+    below = sum(count for edge, count in zip(short_side['edges'], short_side['counts']) if edge < MIN_RESOLUTION)
+    print(f"Images profiled: {overall['count']} (computed {stats['computed'][:19]})")
+    if overall['width']['n']:
+        print(f"Mean resolution: {overall['width']['mean']:.0f}x{overall['height']['mean']:.0f}")
+        print(f"Short side < {MIN_RESOLUTION}px: {below}")
+        print(f"Mean file size: {overall['file_size_bytes']['mean'] / 1024:.0f} KB")
+    for class_name, class_stats in stats['classes'].items():
+        if not class_stats['brightness']['n']:
+            continue
+        mean = ', '.join(f"{x:.3f}" for x in class_stats['channel_mean'])
+        print(f"{class_name:20} brightness {class_stats['brightness']['mean']:.2f} "
+              f"± {class_stats['brightness']['std']:.2f}  RGB mean ({mean})")
+
+
+def validate_images(num_workers=None, output_path=None, rebuild=False, tier=TIER_HEADER, checkpoint_every=2048,
+                    stats=False):
+    """
+    Validate all images in the dataset
+    tier selects how deep each file is checked (see image_validation.py):
+    0 reads headers only, 1 also checks JPEG/PNG structure, 2 decodes pixels.
+    Files are checked in parallel; results are cached by path, size and mtime
+    so re-runs only check new or changed files. The cache is saved after every
+    checkpoint_every files, so an interrupted run resumes where it stopped.
+    The dataset profile comes from the cached statistics (dataset_stats.py);
+    with stats=True they are recomputed first if the dataset changed.
+    """
     print("🔍 Validating Ginger Disease Dataset Images...")
     print("=" * 60)
     
@@ -23,6 +155,36 @@ def validate_images():
         'soft_rot', 'yellow_disease', 'root_knot_nematode'
     ]
     
+    cache = ValidationCache()
+    if rebuild:
+        cache.entries = {}
+    
+    # Single scandir pass for every class, with size and mtime for the cache
+    listing = scan_image_tree(data_dir, classes, VALIDATION_EXTENSIONS)
+    pending = [
+        rel_path for rel_path, (_, size, mtime_ns) in listing.items()
+        if cache.lookup(rel_path, size, mtime_ns, tier) is None
+    ]
+    print(f"🗂️  {len(listing)} images, {len(listing) - len(pending)} cached, "
+          f"{len(pending)} to check ({TIER_NAMES[tier]} tier)")
+    
+    for start in range(0, len(pending), checkpoint_every):
+        batch = pending[start:start + checkpoint_every]
+        results = run_parallel(
+            partial(check_image, tier=tier), [str(data_dir / rel_path) for rel_path in batch], num_workers,
+            desc=f"Validating {start + len(batch)}/{len(pending)}"
+        )
+        for rel_path, result in zip(batch, results):
+            class_name, size, mtime_ns = listing[rel_path]
+            cache.entries[rel_path] = {'class': class_name, 'size': size, 'mtime_ns': mtime_ns, **result}
+        # Checkpoint so an interrupted run resumes from here
+        cache.save()
+    
+    # Forget files that no longer exist
+    if set(cache.entries) - set(listing):
+        cache.entries = {rel_path: cache.entries[rel_path] for rel_path in listing}
+        cache.save()
+    
     total_images = 0
     valid_images = 0
     issues = []
@@ -35,71 +197,24 @@ def validate_images():
             print(f"  ❌ Directory not found: {class_dir}")
             continue
         
-        # Get all image files
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']:
-            image_files.extend(class_dir.glob(ext))
-        
-        class_count = len(image_files)
+        class_files = [rel_path for rel_path, entry in listing.items() if entry[0] == class_name]
+        class_count = len(class_files)
         class_valid = 0
         
         print(f"  📊 Found {class_count} images")
         
-        for img_path in image_files:
+        for rel_path in class_files:
             total_images += 1
-            
-            try:
-                # Check if file can be opened
-                with Image.open(img_path) as img:
-                    # Check image properties
-                    width, height = img.size
-                    mode = img.mode
-                    format = img.format
-                    
-                    # Validate properties
-                    is_valid = True
-                    img_issues = []
-                    
-                    # Check resolution
-                    if width < 224 or height < 224:
-                        is_valid = False
-                        img_issues.append(f"Resolution too small: {width}x{height}")
-                    
-                    # Check format
-                    if format not in ['JPEG', 'PNG']:
-                        is_valid = False
-                        img_issues.append(f"Invalid format: {format}")
-                    
-                    # Check mode
-                    if mode != 'RGB':
-                        is_valid = False
-                        img_issues.append(f"Invalid color mode: {mode}")
-                    
-                    # Check file size
-                    file_size = img_path.stat().st_size
-                    if file_size < 1024:  # Less than 1KB
-                        is_valid = False
-                        img_issues.append(f"File too small: {file_size} bytes")
-                    elif file_size > 10 * 1024 * 1024:  # More than 10MB
-                        is_valid = False
-                        img_issues.append(f"File too large: {file_size / (1024*1024):.1f}MB")
-                    
-                    if is_valid:
-                        class_valid += 1
-                        valid_images += 1
-                    else:
-                        issues.append({
-                            'file': str(img_path),
-                            'class': class_name,
-                            'issues': img_issues
-                        })
-                        
-            except Exception as e:
+            entry = cache.entries[rel_path]
+            if entry['issues']:
                 issues.append({
-                    'file': str(img_path),
+                    'file': str(data_dir / rel_path),
                     'class': class_name,
-                    'issues': [f"Error opening file: {str(e)}"]
+                    'issues': entry['issues']
                 })
+            else:
+                class_valid += 1
+                valid_images += 1
         
         print(f"  ✅ Valid: {class_valid}/{class_count}")
         
@@ -138,6 +253,10 @@ def validate_images():
         if len(issues) > 10:
             print(f"... and {len(issues) - 10} more issues")
     
+    if output_path:
+        write_issue_report(issues, output_path)
+        print(f"📝 Full issue list ({len(issues)} images) written to {output_path}")
+    
     # Recommendations
     print("\n💡 RECOMMENDATIONS:")
     print("-" * 40)
@@ -159,13 +278,17 @@ def validate_images():
         print("2. Ready for preprocessing pipeline")
         print("3. Consider adding more images for better training")
     
-    # Dataset size recommendations
+    dataset_stats = compute_dataset_stats(data_dir, num_workers) if stats else load_dataset_stats(data_dir)
+    if dataset_stats:
+        print_dataset_profile(dataset_stats)
+    
+    # Dataset size recommendations (counts from the listing above, no rescan)
     print("\n📈 DATASET SIZE RECOMMENDATIONS:")
     print("-" * 40)
     for class_name in classes:
         class_dir = data_dir / class_name
         if class_dir.exists():
-            class_count = len(list(class_dir.glob('*.jpg')) + list(class_dir.glob('*.png')))
+            class_count = sum(1 for entry in listing.values() if entry[0] == class_name)
             if class_count < 50:
                 print(f"{class_name}: {class_count} images (⚠️  Need more - target: 100+)")
             elif class_count < 100:
@@ -226,6 +349,19 @@ def create_sample_images():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description='Validate the ginger disease dataset images')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: PREPROCESSING_CONFIG)')
+    parser.add_argument('--output', default='data/metadata/validation_issues.json',
+                        help='Full issue list, JSON or CSV by extension')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Ignore cached results and re-check every file')
+    parser.add_argument('--tier', type=int, choices=sorted(TIER_NAMES), default=TIER_HEADER,
+                        help='0: headers only, 1: + JPEG/PNG structure, 2: + full decode')
+    parser.add_argument('--stats', action='store_true',
+                        help='Refresh the cached dataset statistics and print the profile')
+    args = parser.parse_args()
+    
     print("🔍 GingerlyAI Image Validation Tool")
     print("=" * 60)
     
@@ -237,7 +373,8 @@ def main():
         return
     
     # Validate images
-    valid_count, total_count, issues = validate_images()
+    valid_count, total_count, issues = validate_images(args.workers, args.output, args.rebuild, args.tier,
+                                                       stats=args.stats)
     
     # If no images found, offer to create samples
     if total_count == 0:
@@ -246,7 +383,7 @@ def main():
         if response == 'y':
             create_sample_images()
             print("\n🔄 Re-validating after creating sample images...")
-            validate_images()
+            validate_images(args.workers, args.output, tier=args.tier)
 
 if __name__ == "__main__":
     main()